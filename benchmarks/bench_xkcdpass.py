@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Benchmarks for the hot paths of xkcdpass: loading and filtering wordlists,
+generating single passphrases, bulk output and acrostics.
+
+Runs offline against the wordlists shipped in xkcdpass/static and writes
+the results as JSON. With --baseline, the results are compared against an
+earlier run and the exit status is 1 if any metric regressed by more than
+--tolerance.
+
+    python benchmarks/bench_xkcdpass.py -o baseline.json
+    python benchmarks/bench_xkcdpass.py --baseline baseline.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+from xkcdpass import xkcd_password as xp  # noqa: E402
+
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(xp.__file__)),
+                          "static")
+
+# metric name suffixes where a larger value is better; for all other
+# metrics (times, memory) smaller is better
+HIGHER_IS_BETTER = ("_per_second",)
+
+
+def best_of(func, number, repeat):
+    """
+    Return the best time per call of func, in seconds.
+    """
+    return min(timeit.Timer(func).repeat(repeat=repeat, number=number)) / number
+
+
+def bench_load(wordfile, repeat):
+    """
+    Time a cold load of wordfile through generate_wordlist and measure its
+    peak memory use.
+    """
+    def load():
+        return xp.generate_wordlist(wordfile=wordfile, min_length=1,
+                                    max_length=99, cache=None)
+
+    seconds = best_of(load, 1, repeat)
+
+    tracemalloc.start()
+    wordlist = load()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return wordlist, {"load_seconds": seconds, "load_peak_bytes": peak}
+
+
+def bench_generation(wordlist, number, repeat):
+    """
+    Time single passphrases for each case method and with random
+    delimiters, acrostics, and bulk output through emit_passwords.
+    """
+    results = {}
+    for case in sorted(xp.CASE_METHODS):
+        results["single_{0}_us".format(case)] = 1e6 * best_of(
+            lambda: xp.generate_xkcdpassword(wordlist, case=case),
+            number, repeat)
+
+    results["single_random_delimiters_us"] = 1e6 * best_of(
+        lambda: xp.generate_xkcdpassword(wordlist, random_delimiters=True),
+        number, repeat)
+
+    acrostic = "".join(sorted(set(w[0] for w in wordlist[:2000])))[:6]
+    results["acrostic_us"] = 1e6 * best_of(
+        lambda: xp.generate_xkcdpassword(wordlist, acrostic=acrostic),
+        number, repeat)
+
+    count = number * 20
+    options = argparse.Namespace(
+        interactive=False, numwords=6, count=count, acrostic=False,
+        delimiter=" ", separator=u"\n", valid_delimiters="",
+        random_delimiters=False, case="lower")
+
+    def emit():
+        stdout = sys.stdout
+        sys.stdout = io.StringIO()
+        try:
+            xp.emit_passwords(wordlist, options)
+        finally:
+            sys.stdout = stdout
+
+    results["bulk_per_second"] = count / best_of(emit, 1, repeat)
+    return results
+
+
+def run(wordfiles, number, repeat):
+    """
+    Run all benchmarks, returning the results as a dictionary.
+    """
+    results = {}
+    for name in wordfiles:
+        sys.stderr.write("benchmarking {0}\n".format(name))
+        wordlist, metrics = bench_load(os.path.join(STATIC_DIR, name), repeat)
+        metrics.update(bench_generation(wordlist, number, repeat))
+        results[name] = metrics
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """
+    Return a list of (wordfile, metric, baseline value, current value)
+    for each metric that is worse than its baseline by more than the
+    tolerance (a fraction).
+    """
+    regressions = []
+    for name, metrics in sorted(current["results"].items()):
+        base_metrics = baseline["results"].get(name, {})
+        for metric, value in sorted(metrics.items()):
+            base = base_metrics.get(metric)
+            if not base:
+                continue
+            if metric.endswith(HIGHER_IS_BETTER):
+                worse = value < base * (1 - tolerance)
+            else:
+                worse = value > base * (1 + tolerance)
+            if worse:
+                regressions.append((name, metric, base, value))
+    return regressions
+
+
+def main(argv=None):
+    """ Mainline code for the benchmark suite. """
+
+    if argv is None:
+        argv = sys.argv
+
+    parser = argparse.ArgumentParser(
+        prog=os.path.basename(argv[0]),
+        description="Benchmark the xkcdpass hot paths.")
+    parser.add_argument(
+        "-w", "--wordfile",
+        dest="wordfiles", action="append", metavar="WORDFILE",
+        help=("Benchmark WORDFILE from xkcdpass/static; may be given "
+              "several times (default: all of them)."))
+    parser.add_argument(
+        "-o", "--output",
+        dest="output", default=None, metavar="FILE",
+        help="Write the results as JSON to FILE (default: stdout).")
+    parser.add_argument(
+        "--baseline",
+        dest="baseline", default=None, metavar="FILE",
+        help="Compare the results against an earlier run saved in FILE.")
+    parser.add_argument(
+        "--tolerance",
+        dest="tolerance", type=float, default=0.25, metavar="FRACTION",
+        help="Allowed slowdown against the baseline (default: 0.25).")
+    parser.add_argument(
+        "-n", "--number",
+        dest="number", type=int, default=1000, metavar="N",
+        help="Calls per timing of single passphrase generation.")
+    parser.add_argument(
+        "-r", "--repeat",
+        dest="repeat", type=int, default=5, metavar="R",
+        help="Timings per benchmark; the best one is reported.")
+    options = parser.parse_args(argv[1:])
+
+    wordfiles = options.wordfiles or sorted(
+        name for name in os.listdir(STATIC_DIR)
+        if os.path.isfile(os.path.join(STATIC_DIR, name)) and
+        not name.endswith(xp.compiled.COMPILED_SUFFIX))
+    current = run(wordfiles, options.number, options.repeat)
+
+    text = json.dumps(current, indent=2, sort_keys=True)
+    if options.output:
+        with io.open(options.output, "w", encoding="utf-8") as f:
+            f.write(text + u"\n")
+    else:
+        print(text)
+
+    if options.baseline:
+        with io.open(options.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, options.tolerance)
+        for name, metric, base, value in regressions:
+            sys.stderr.write("REGRESSION {0} {1}: {2:.6g} -> {3:.6g}\n".format(
+                name, metric, base, value))
+        if regressions:
+            return 1
+        sys.stderr.write("No regressions against {0}\n".format(
+            options.baseline))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -11,13 +11,15 @@ setup(
     description='Generate secure multiword passwords/passphrases, inspired by XKCD',
     long_description=open('README.rst', encoding='utf-8').read(),
     #packages=['xkcdpass'],
-    packages=find_namespace_packages(exclude=["examples", "*.tests", "*.tests.*", "tests.*", "tests"]),
+    packages=find_namespace_packages(exclude=["examples", "benchmarks", "*.tests", "*.tests.*", "tests.*", "tests"]),
     zip_safe=False,
     license='BSD',
     include_package_data=True,
     entry_points={
         'console_scripts': [
             'xkcdpass = xkcdpass.xkcd_password:main',
+            'xkcdpass-compile = xkcdpass.compiled:main',
+            'xkcdpass-denylist = xkcdpass.denylists:main',
         ],
     },
     tests_require=['mock'] if sys.version_info[0] == 2 else None,
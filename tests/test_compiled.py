@@ -0,0 +1,69 @@
+# encoding: utf-8
+""" Unit test for `compiled` module. """
+
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from xkcdpass import compiled
+from xkcdpass import xkcd_password
+
+
+WORDFILE = 'xkcdpass/static/legacy'
+
+
+class CompiledWordlistTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.wordfile = os.path.join(self.tmpdir, 'legacy')
+        shutil.copy(WORDFILE, self.wordfile)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_roundtrip(self):
+        words = [u"zebra", u"émile", u"ant", u"ant", u"bee"]
+        view = compiled.CompiledWordlist(compiled.pack_words(words))
+        self.assertEqual(list(view), [u"ant", u"bee", u"zebra", u"émile"])
+        self.assertEqual(view[-1], u"émile")
+        self.assertEqual(view.window(4, 5), [u"zebra", u"émile"])
+        self.assertEqual(view.window(6, 9), [])
+        self.assertEqual(view.histogram, (0, 0, 0, 2, 0, 2))
+        self.assertIn(u"émile", view)
+        self.assertIn(u"ant", view)
+        self.assertNotIn(u"cat", view)
+        self.assertNotIn(u"zebras", view)
+
+    def test_generate_wordlist_prefers_compiled_sibling(self):
+        expected = xkcd_password.generate_wordlist(
+            wordfile=self.wordfile, min_length=5, max_length=8, cache=None)
+        dest = compiled.compile_wordfile(self.wordfile)
+
+        self.assertEqual(xkcd_password.locate_wordfile(self.wordfile), dest)
+        self.assertEqual(
+            xkcd_password.locate_wordfile(self.wordfile,
+                                          prefer_compiled=False),
+            self.wordfile)
+
+        words = xkcd_password.generate_wordlist(
+            wordfile=self.wordfile, min_length=5, max_length=8, cache=None)
+        self.assertEqual(sorted(words), sorted(expected))
+
+        filtered = xkcd_password.generate_wordlist(
+            wordfile=dest, min_length=5, max_length=8, valid_chars='[a-z]',
+            cache=None)
+        self.assertTrue(all(re.match('^[a-z]+$', w) for w in filtered))
+        self.assertLess(len(filtered), len(words))
+
+    def test_stale_sibling_is_ignored(self):
+        dest = compiled.compile_wordfile(self.wordfile)
+        stat = os.stat(dest)
+        os.utime(self.wordfile, (stat.st_atime, stat.st_mtime + 10))
+        self.assertEqual(xkcd_password.locate_wordfile(self.wordfile),
+                         self.wordfile)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+""" Unit test for `compressed` module. """
+
+from subprocess import PIPE, Popen
+import bz2
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from xkcdpass import xkcd_password
+
+
+class CompressedWordfileTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = xkcd_password.WordlistCache(maxsize=2)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_compressed_wordfiles(self):
+        data = b"alpha\nbravo\ncharlie\n"
+        for base, suffix, opener in (("gzip_words", ".gz", gzip.GzipFile),
+                                     ("bzip2_words", ".bz2", bz2.BZ2File)):
+            path = os.path.join(self.tmpdir, base + suffix)
+            with opener(path, 'wb') as f:
+                f.write(data)
+            # found both by its own name and without the suffix
+            for name in (path, os.path.join(self.tmpdir, base)):
+                self.assertEqual(xkcd_password.locate_wordfile(name), path)
+                self.assertEqual(
+                    xkcd_password.generate_wordlist(wordfile=name,
+                                                    cache=self.cache),
+                    ["alpha", "bravo", "charlie"])
+
+    def test_wordfile_from_stdin(self):
+        process = Popen([sys.executable, "-m", "xkcdpass.xkcd_password",
+                         "-w", "-", "-n", "3", "-c", "2", "-d", "_"],
+                        stdin=PIPE, stdout=PIPE)
+        output = process.communicate(b"alpha\nbravo\ncharlie\n")[0]
+        passwds = output.decode("utf-8").split()
+        self.assertEqual(len(passwds), 2)
+        for passwd in passwds:
+            self.assertTrue(set(passwd.split("_")) <=
+                            set(["alpha", "bravo", "charlie"]))
+
+        process = Popen([sys.executable, "-m", "xkcdpass.xkcd_password",
+                         "-w", "-", "-V"], stdin=PIPE, stdout=PIPE)
+        output = process.communicate(b"alpha\nbravo\ncharlie\n")[0]
+        self.assertEqual(process.returncode, 0)
+        self.assertIn("your word list contains 3 words.",
+                      output.decode("utf-8"))
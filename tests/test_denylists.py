@@ -0,0 +1,99 @@
+# encoding: utf-8
+""" Unit test for `denylists` module. """
+
+import errno
+import gzip
+import io
+import itertools
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    # python2.7 support via external lib
+    import mock
+
+from xkcdpass import denylists
+from xkcdpass import xkcd_password
+
+
+WORDS = [u"alpha", u"bravo", u"charlie"]
+
+
+class DenylistTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        phrases = [u" ".join(p) for p in itertools.product(WORDS, repeat=2)]
+        # every two word phrase but "charlie charlie", among other lines
+        lines = phrases[:-1] + [u"x{0}".format(i) for i in range(3000)]
+        self.corpus = os.path.join(self.tmpdir, "breach.txt.gz")
+        with gzip.open(self.corpus, "wb") as f:
+            f.write(u"\n".join(lines + [u"Alpha Alpha  "]).encode("utf-8"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_external_sort_matches_single_run(self):
+        merged = denylists.build_denylist(self.corpus, run_size=1000)
+        single = denylists.build_denylist(
+            self.corpus, os.path.join(self.tmpdir, "single.xkdl"))
+        with io.open(merged, "rb") as f, io.open(single, "rb") as g:
+            self.assertEqual(f.read(), g.read())
+        self.assertEqual(merged, self.corpus + denylists.DENYLIST_SUFFIX)
+
+    def test_membership(self):
+        denylist = denylists.load_denylist(self.corpus)
+        self.assertTrue(denylists.is_denylist(denylist.path))
+        self.assertEqual(len(denylist), 8 + 3000)
+        self.assertIn(u"alpha bravo", denylist)
+        self.assertIn(u"BRAVO Charlie", denylist)
+        self.assertIn(u"x2999", denylist)
+        self.assertNotIn(u"charlie charlie", denylist)
+        self.assertNotIn(u"x3000", denylist)
+        self.assertEqual(len(pickle.loads(pickle.dumps(denylist))), 3008)
+
+    def test_read_only_corpus_directory(self):
+        build = denylists.build_denylist
+
+        def build_elsewhere(source, dest=None, run_size=denylists.RUN_SIZE):
+            if dest == self.corpus + denylists.DENYLIST_SUFFIX:
+                raise OSError(errno.EROFS, "Read-only file system", dest)
+            return build(source, dest, run_size)
+
+        with mock.patch.object(denylists, "build_denylist",
+                               side_effect=build_elsewhere):
+            denylist = denylists.load_denylist(self.corpus)
+        self.assertIsNone(denylist.path)
+        self.assertIn(u"alpha bravo", denylist)
+        self.assertNotIn(u"charlie charlie", denylist)
+        self.assertEqual(len(pickle.loads(pickle.dumps(denylist))), 3008)
+        self.assertFalse(os.path.exists(
+            self.corpus + denylists.DENYLIST_SUFFIX))
+
+    def test_generation_skips_denied_passphrases(self):
+        denylist = denylists.load_denylist(self.corpus)
+        self.assertEqual(
+            set(xkcd_password.generate_xkcdpasswords(
+                WORDS, 20, numwords=2, case="upper", denylist=denylist)),
+            set([u"CHARLIE CHARLIE"]))
+        self.assertEqual(
+            xkcd_password.generate_xkcdpassword(WORDS, numwords=2,
+                                                denylist=denylist),
+            u"charlie charlie")
+
+        attempts = xkcd_password.DENYLIST_MAX_ATTEMPTS
+        xkcd_password.DENYLIST_MAX_ATTEMPTS = 100
+        try:
+            self.assertRaises(SystemExit,
+                              xkcd_password.generate_xkcdpassword,
+                              WORDS, numwords=1, denylist=set(WORDS))
+        finally:
+            xkcd_password.DENYLIST_MAX_ATTEMPTS = attempts
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+""" Unit test for `numpy_backend` module. """
+
+import unittest
+
+from xkcdpass import numpy_backend
+from xkcdpass import xkcd_password
+
+
+@unittest.skipUnless(numpy_backend.available(), "NumPy is not installed")
+class NumpyBackendTests(unittest.TestCase):
+    def setUp(self):
+        self.wordlist_small = xkcd_password.generate_wordlist(
+            wordfile='tests/test_list.txt',
+            valid_chars='[a-z]')
+
+    def test_random_indices_shape_and_range(self):
+        pool = xkcd_password.EntropyPool()
+        indices = numpy_backend.random_indices(7, (100, 5), pool)
+        self.assertEqual(indices.shape, (100, 5))
+        self.assertTrue(((indices >= 0) & (indices < 7)).all())
+
+    def test_alternating_case(self):
+        result = xkcd_password.generate_xkcdpasswords(
+            self.wordlist_small, 20, numwords=4, case="alternating",
+            backend="numpy")
+        self.assertEqual(len(result), 20)
+        for passwd in result:
+            words = passwd.split(" ")
+            self.assertTrue(words[0].isupper() and words[2].isupper())
+            self.assertTrue(words[1].islower() and words[3].islower())
+
+    def test_random_delimiters(self):
+        result = xkcd_password.generate_xkcdpasswords(
+            self.wordlist_small, 20, numwords=3, random_delimiters=True,
+            valid_delimiters=["1", "2"], backend="numpy")
+        for passwd in result:
+            self.assertEqual(sum(passwd.count(d) for d in "12"), 2)
+
+    def test_word_arrays_of_changed_lists(self):
+        wordlist = ["apple", "berry"]
+        self.assertEqual(list(numpy_backend.word_arrays(wordlist)["upper"]),
+                         ["APPLE", "BERRY"])
+        wordlist[0] = "cherry"
+        self.assertEqual(list(numpy_backend.word_arrays(wordlist)["upper"]),
+                         ["CHERRY", "BERRY"])
+        words = tuple(wordlist)
+        self.assertIs(numpy_backend.word_arrays(words),
+                      numpy_backend.word_arrays(words))
+
+
+if __name__ == '__main__':
+    unittest.main()
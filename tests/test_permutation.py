@@ -0,0 +1,94 @@
+# encoding: utf-8
+""" Unit test for `permutation` module. """
+
+import hashlib
+import hmac
+import unittest
+
+from xkcdpass import permutation
+from xkcdpass import xkcd_password
+
+
+WORDS = ["alpha", "bravo", "charlie", "delta"]
+
+
+class PermutationTests(unittest.TestCase):
+    def test_permutes_range(self):
+        for size in (1, 2, 3, 7, 64, 1000, 1025):
+            order = permutation.KeyspacePermutation(size, b"key")
+            self.assertEqual(sorted(order[i] for i in range(size)),
+                             list(range(size)))
+        self.assertNotEqual(
+            [permutation.KeyspacePermutation(1000, b"key")[i]
+             for i in range(10)],
+            [permutation.KeyspacePermutation(1000, b"other key")[i]
+             for i in range(10)])
+
+        # ranges wider than one HMAC-SHA256 block per half
+        order = permutation.KeyspacePermutation(10 ** 200, b"key")
+        self.assertTrue(0 <= order[12345] < 10 ** 200)
+        self.assertEqual(order[12345], order[12345])
+        self.assertRaises(IndexError, order.__getitem__, 10 ** 200)
+        self.assertRaises(ValueError, permutation.KeyspacePermutation, 0,
+                          b"key")
+
+    def test_round_function_is_hmac_sha256(self):
+        key = b"k" * 100
+        inner, outer = permutation._hmac_states(key, b"\x03")
+        inner.update(b"message")
+        outer.update(inner.digest())
+        self.assertEqual(
+            outer.digest(),
+            hmac.new(key, b"\x03message", hashlib.sha256).digest())
+
+    def test_shards(self):
+        self.assertEqual(permutation.parse_shard("3/16"), (3, 16))
+        for shard in ("0/2", "3/2", "1", "a/b"):
+            self.assertRaises(ValueError, permutation.parse_shard, shard)
+        self.assertEqual([permutation.shard_size(10, (k, 3))
+                          for k in (1, 2, 3)], [4, 3, 3])
+        self.assertEqual(permutation.shard_size(2, (3, 3)), 0)
+
+    def test_shards_cover_keyspace_once(self):
+        options = dict(numwords=2, random_delimiters=True,
+                       valid_delimiters="-+", case="random", pad_digits=1)
+        layout = xkcd_password.KeyspaceLayout(WORDS, **options)
+        self.assertEqual(layout.size,
+                         xkcd_password.passphrase_keyspace(WORDS, **options))
+        passwds = []
+        for k in (1, 2, 3):
+            passwds.extend(xkcd_password.iter_permuted_xkcdpasswords(
+                WORDS, b"key", shard=(k, 3), **options))
+        self.assertEqual(len(passwds), layout.size)
+        self.assertEqual(len(set(passwds)), layout.size)
+
+        first = list(xkcd_password.iter_permuted_xkcdpasswords(
+            WORDS, b"key", 5, shard=(2, 3), **options))
+        self.assertEqual(list(xkcd_password.iter_permuted_xkcdpasswords(
+            WORDS, b"key", 3, shard=(2, 3), start=2, **options)), first[2:])
+
+    def test_words_only_differing_in_case_count_once(self):
+        wordlist = ["alpha", "Alpha", "bravo", "1984"]
+        for case, size in (("lower", 9), ("upper", 9), ("capitalize", 9),
+                           ("alternating", 9), ("random", 25),
+                           ("as-is", 16)):
+            passwds = list(xkcd_password.iter_permuted_xkcdpasswords(
+                wordlist, b"key", numwords=2, case=case))
+            self.assertEqual(len(passwds), size, case)
+            self.assertEqual(len(set(passwds)), size, case)
+
+    def test_acrostic_denylist_and_exhaustion(self):
+        passwds = list(xkcd_password.iter_permuted_xkcdpasswords(
+            WORDS, b"key", acrostic="ab", delimiter="-",
+            denylist=set(["alpha-bravo"])))
+        self.assertEqual(passwds, [])
+        self.assertRaises(
+            ValueError, list, xkcd_password.iter_permuted_xkcdpasswords(
+                WORDS, b"key", 17, numwords=2))
+        self.assertRaises(
+            ValueError, list, xkcd_password.iter_permuted_xkcdpasswords(
+                WORDS, b"key", 1, case="random-chars"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+""" Unit test for `server` module. """
+
+import json
+import socket
+import sys
+import threading
+import unittest
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    # python2.7 support via external lib
+    import mock
+
+from xkcdpass import xkcd_password
+
+try:
+    import asyncio
+    from xkcdpass import server
+except (ImportError, SyntaxError):
+    # Python 2 has no asyncio
+    server = None
+
+
+@unittest.skipIf(server is None, "asyncio is not available")
+class PassphraseServiceTests(unittest.TestCase):
+    def setUp(self):
+        self.wordlist_small = xkcd_password.generate_wordlist(
+            wordfile='tests/test_list.txt',
+            valid_chars='[a-z]')
+        self.service = server.PassphraseService({"small": self.wordlist_small})
+
+    def test_single_passphrase(self):
+        status, response, generated = self.service.handle(
+            "GET", "/passphrase?numwords=3&delimiter=-&case=upper")
+        self.assertEqual(status, 200)
+        self.assertEqual(generated, 1)
+        words = response["passphrase"].split("-")
+        self.assertEqual(len(words), 3)
+        self.assertTrue(all(w.isupper() for w in words))
+
+    def test_batch_from_json_body(self):
+        body = json.dumps({"count": 5, "acrostic": "face"}).encode("utf-8")
+        status, response, generated = self.service.handle(
+            "POST", "/passphrase", body)
+        self.assertEqual(status, 200)
+        self.assertEqual(generated, 5)
+        for passwd in response["passphrases"]:
+            self.assertEqual("".join(w[0] for w in passwd.split()), "face")
+
+    def test_invalid_requests(self):
+        for target in ("/passphrase?case=sideways",
+                       "/passphrase?numwords=lots",
+                       "/passphrase?wordlist=missing",
+                       "/passphrase?acrostic=0"):
+            status, response, generated = self.service.handle("GET", target)
+            self.assertEqual(status, 400)
+            self.assertIn("error", response)
+        self.assertEqual(self.service.handle("GET", "/nowhere")[0], 404)
+
+        for options in ({"acrostic": 5}, {"delimiter": 3}, {"case": ["x"]},
+                        {"wordlist": []}, {"valid_delimiters": 7},
+                        {"valid_delimiters": ["-", 1]}, {"count": [1]},
+                        {"numwords": 1000, "count": 10000}):
+            status, response, generated = self.service.handle(
+                "POST", "/passphrase", json.dumps(options).encode("utf-8"))
+            self.assertEqual(status, 400, options)
+            self.assertIn("error", response)
+
+    def test_unexpected_errors(self):
+        with mock.patch.object(server.xp, "generate_xkcdpasswords",
+                               side_effect=RuntimeError("boom")), \
+                mock.patch.object(sys, "stderr"):
+            status, response, generated = self.service.handle(
+                "GET", "/passphrase")
+        self.assertEqual(status, 500)
+        self.assertEqual(response, {"error": "Internal server error"})
+
+    def test_requests_over_a_connection(self):
+        loop = asyncio.new_event_loop()
+        listener = loop.run_until_complete(asyncio.start_server(
+            self.service._serve_connection, "127.0.0.1", 0))
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+        try:
+            client = socket.create_connection(
+                listener.sockets[0].getsockname()[:2])
+            body = b'{"case": ["x"]}'
+            client.sendall(b"POST /passphrase HTTP/1.1\r\n"
+                           b"Content-Length: 15\r\n"
+                           b"Connection: close\r\n\r\n" + body)
+            response = b""
+            while True:
+                data = client.recv(4096)
+                if not data:
+                    break
+                response += data
+            client.close()
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            listener.close()
+            loop.run_until_complete(listener.wait_closed())
+            loop.close()
+        self.assertTrue(response.startswith(b"HTTP/1.1 400 Bad Request"))
+        self.assertEqual(self.service.stats.requests, 1)
+        self.assertEqual(self.service.stats.errors, 1)
+
+    def test_stats(self):
+        self.service.stats.record(0.0001, 200, 1)
+        self.service.stats.record(0.0003, 400, 0)
+        status, report, generated = self.service.handle("GET", "/stats")
+        self.assertEqual(status, 200)
+        self.assertEqual(report["requests"], 2)
+        self.assertEqual(report["errors"], 1)
+        self.assertEqual(report["passphrases"], 1)
+        self.assertEqual(report["latency_us"]["max"], 300.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
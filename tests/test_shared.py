@@ -0,0 +1,102 @@
+""" Unit test for `shared` module. """
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    # python2.7 support via external lib
+    import mock
+
+from xkcdpass import compiled
+from xkcdpass import shared
+from xkcdpass import xkcd_password
+
+
+WORDFILE = 'xkcdpass/static/legacy'
+
+
+class SharedWordlistTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.saved_dir = shared.SHARED_DIR
+        shared.SHARED_DIR = self.tmpdir
+
+    def tearDown(self):
+        shared.SHARED_DIR = self.saved_dir
+        shutil.rmtree(self.tmpdir)
+
+    def test_publish_and_attach(self):
+        words = [u"delta", u"alpha", u"charlie", u"bravo"]
+        key = shared.publish_wordlist(words)
+        self.assertEqual(key, shared.publish_wordlist(reversed(words)))
+        attached = shared.attach_wordlist(key)
+        self.assertEqual(list(attached),
+                         sorted(words, key=compiled.sort_key))
+        shared.release_wordlist(key)
+        self.assertIsNone(shared.attach_wordlist(key))
+
+    def test_shared_wordlist_matches_generate_wordlist(self):
+        expected = xkcd_password.generate_wordlist(
+            wordfile=WORDFILE, min_length=5, max_length=8)
+        first = shared.shared_wordlist(
+            wordfile=WORDFILE, min_length=5, max_length=8)
+        second = shared.shared_wordlist(
+            wordfile=WORDFILE, min_length=5, max_length=8)
+        self.assertEqual(list(first), expected)
+        self.assertEqual(list(second), expected)
+        self.assertIn(expected[42], second)
+
+        # some words contain spaces
+        result = xkcd_password.generate_xkcdpassword(
+            second, acrostic="face", delimiter="|")
+        self.assertEqual("".join(w[0] for w in result.split("|")), "face")
+
+    def test_standard_input_is_not_shared(self):
+        self.assertRaises(ValueError, shared.wordlist_key, "-")
+        self.assertRaises(ValueError, shared.shared_wordlist,
+                          wordfile=WORDFILE + ",-")
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "needs POSIX permissions")
+    def test_rejects_tampered_files(self):
+        words = [u"delta", u"alpha", u"charlie", u"bravo"]
+        key = shared.publish_wordlist(words)
+        [(path, digest)] = shared._published(key)
+        self.assertEqual(os.stat(os.path.dirname(path)).st_mode & 0o777,
+                         0o700)
+
+        os.chmod(path, 0o666)
+        self.assertIsNone(shared.attach_wordlist(key))
+        os.chmod(path, 0o600)
+        self.assertIsNotNone(shared.attach_wordlist(key))
+
+        with open(path, "r+b") as f:
+            f.seek(-2, os.SEEK_END)
+            f.write(b"x")
+        self.assertIsNone(shared.attach_wordlist(key))
+        # published again over the tampered file
+        self.assertEqual(shared.publish_wordlist(words), key)
+        self.assertEqual(list(shared.attach_wordlist(key)),
+                         sorted(words, key=compiled.sort_key))
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "needs POSIX permissions")
+    def test_rejects_directory_of_others(self):
+        # as if created first by another user
+        os.mkdir(shared._dir_path())
+        os.chmod(shared._dir_path(), 0o777)
+        self.assertRaises(OSError, shared.publish_wordlist, [u"alpha"])
+        with mock.patch.object(sys, 'stderr') as stderr:
+            wordlist = shared.shared_wordlist(
+                wordfile=WORDFILE, min_length=5, max_length=8)
+        self.assertEqual(wordlist, xkcd_password.generate_wordlist(
+            wordfile=WORDFILE, min_length=5, max_length=8))
+        self.assertIn("WARNING: Can't share the wordlist",
+                      stderr.write.call_args_list[0][0][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
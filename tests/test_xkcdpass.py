@@ -3,8 +3,13 @@
 from subprocess import PIPE, Popen
 import argparse
 import io
+import itertools
+import math
+import os
 import re
+import shutil
 import sys
+import tempfile
 import unittest
 try:
     import unittest.mock as mock
@@ -31,9 +36,104 @@ class XkcdPasswordTests(unittest.TestCase):
     def test_loadwordfile(self):
         self.assertEqual(len(self.wordlist_full), 29611)
 
+    def test_wordlist_is_length_ordered(self):
+        lengths = [len(word) for word in self.wordlist_full]
+        self.assertEqual(lengths, sorted(lengths))
+        self.assertEqual(min(lengths), 5)
+        self.assertEqual(max(lengths), 8)
+
+    def test_word_length_counts(self):
+        options = argparse.Namespace(
+            wordfile=WORDFILE, valid_chars='.', min_length=5, max_length=8)
+        counts = xkcd_password.word_length_counts(self.wordlist_full, options)
+        self.assertEqual(sorted(counts), [5, 6, 7, 8])
+        self.assertEqual(sum(counts.values()), len(self.wordlist_full))
+        small_counts = xkcd_password.word_length_counts(
+            self.wordlist_small, argparse.Namespace())
+        self.assertEqual(sum(small_counts.values()), len(self.wordlist_small))
+
+    def test_compact_wordlist(self):
+        compact = xkcd_password.generate_wordlist(
+            wordfile=WORDFILE, min_length=5, max_length=8, compact=True)
+        self.assertIsInstance(compact, xkcd_password.CompactWordlist)
+        self.assertEqual(list(compact), self.wordlist_full)
+        self.assertEqual(len(compact), len(self.wordlist_full))
+        self.assertEqual(compact[-1], self.wordlist_full[-1])
+        self.assertEqual(compact[10:13], self.wordlist_full[10:13])
+        self.assertIn(self.wordlist_full[100], compact)
+        self.assertNotIn(self.wordlist_full[100][:-1] + "#", compact)
+        self.assertIs(compact, xkcd_password.generate_wordlist(
+            wordfile=WORDFILE, min_length=5, max_length=8, compact=True))
+
+        # some words contain spaces
+        result = xkcd_password.generate_xkcdpassword(
+            compact, acrostic="face", delimiter="|")
+        self.assertEqual("".join(w[0] for w in result.split("|")), "face")
+        self.assertTrue(all(w in compact for w in
+                            xkcd_password.choose_words(compact, 5)))
+
     def test_regex(self):
         self.assertNotIn("__$$$__", self.wordlist_small)
 
+    def test_word_filter_matches_regex(self):
+        words = self.wordlist_full + [u"a-b", u"x]y", u"caf\xe9", u"AB", u"12"]
+        for valid_chars in ("[a-z]", "[A-Za-z0-9]", "[^aeiou]", "[a-z\\-]",
+                            "[]a-z]", "[a-f\\xe9]", "[\\w]", "(ab|c)"):
+            regexp = re.compile("^{0}{{1,9}}$".format(valid_chars))
+            self.assertEqual(
+                xkcd_password.word_filter(valid_chars, 1, 9)(words),
+                [w for w in words if regexp.match(w)],
+                valid_chars)
+        self.assertIs(xkcd_password.word_filter("[a-z]", 1, 9),
+                      xkcd_password.word_filter("[a-z]", 1, 9))
+
+    def test_multi_character_valid_chars(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            wordfile = os.path.join(tmpdir, "words")
+            with io.open(wordfile, "w", encoding="utf-8") as f:
+                f.write(u"ab\nabab\nababab\nabababab\nabc\n")
+            # the repetitions count groups, not characters
+            self.assertEqual(
+                xkcd_password.generate_wordlist(
+                    wordfile=wordfile, min_length=2, max_length=3,
+                    valid_chars='(ab)', cache=None),
+                ["abab", "ababab"])
+            self.assertEqual(
+                xkcd_password.generate_wordlist(
+                    wordfile=wordfile, min_length=2, max_length=4,
+                    valid_chars='[ab]', cache=None),
+                ["ab", "abab"])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_substring_matcher(self):
+        # overlapping substrings, where only failure links find "hers"
+        # inside "ushers" and "she" inside "ashes"
+        substrings = ["he", "she", "his", "hers", "Ab", "rrr"]
+        matcher = xkcd_password.SubstringMatcher(substrings)
+        words = self.wordlist_full + [u"ushers", u"ASHES", u"r"]
+        self.assertEqual(
+            matcher.exclude(words),
+            [w for w in words
+             if not any(s.lower() in w.lower() for s in substrings)])
+        self.assertTrue(matcher.search(u"Cabal"))
+        self.assertFalse(matcher.search(u"rr"))
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "substrings")
+            with io.open(path, "w", encoding="utf-8") as f:
+                f.write(u"\n".join(substrings) + u"\n\n")
+            filtered = xkcd_password.generate_wordlist(
+                wordfile=WORDFILE, min_length=5, max_length=8,
+                exclude_substrings=path)
+            self.assertEqual(filtered, matcher.exclude(self.wordlist_full))
+            self.assertIs(xkcd_password.substring_matcher(path),
+                          xkcd_password.substring_matcher(path))
+        finally:
+            shutil.rmtree(tmpdir)
+
     def test_acrostic(self):
         word = "face"
         result = xkcd_password.generate_xkcdpassword(
@@ -41,6 +141,30 @@ class XkcdPasswordTests(unittest.TestCase):
             acrostic=word)
         self.assertEqual("".join(map(lambda x: x[0], result.split())), word)
 
+    def test_prefix_acrostic(self):
+        result = xkcd_password.generate_xkcdpassword(
+            self.wordlist_full,
+            acrostic="th,e,qu",
+            delimiter="|")
+        # some words of the legacy list contain spaces ("et al.")
+        words = result.split("|")
+        self.assertEqual(len(words), 3)
+        for word, prefix in zip(words, ["th", "e", "qu"]):
+            self.assertTrue(word.startswith(prefix))
+
+    def test_prefix_index(self):
+        index = xkcd_password.prefix_index(self.wordlist_full)
+        self.assertIs(index, xkcd_password.prefix_index(self.wordlist_full))
+        # shared by every copy of the cached wordlist
+        self.assertIs(index, xkcd_password.prefix_index(
+            xkcd_password.generate_wordlist(wordfile=WORDFILE, min_length=5,
+                                            max_length=8)))
+        for prefix in ("a", "qu", "zz", "xyzzy", ""):
+            expected = [w for w in self.wordlist_full if w.startswith(prefix)]
+            self.assertEqual(index.count(prefix), len(expected))
+            self.assertEqual(sorted(index.candidates(prefix)),
+                             sorted(expected))
+
     def test_delim(self):
         tdelim = "_"
         result = xkcd_password.generate_xkcdpassword(
@@ -162,6 +286,42 @@ class TestEmitPasswords(unittest.TestCase):
         self.assertEqual(
             output.count(expected_separator), expected_separator_count)
 
+    def test_emits_count_with_jobs(self):
+        """ Should emit `count` passwords when using worker processes. """
+        self.options.count = 25
+        self.options.jobs = 2
+        with self.stdout_patcher as mock_stdout:
+            xkcd_password.emit_passwords(
+                wordlist=self.wordlist_small,
+                options=self.options)
+        output = mock_stdout.getvalue()
+        self.assertEqual(output.count(self.options.separator), 25)
+
+    def test_emits_at_most_max_bytes(self):
+        """ Should stop before the output exceeds `max_bytes`. """
+        self.options.count = 100
+        self.options.max_bytes = 200
+        with self.stdout_patcher as mock_stdout:
+            xkcd_password.emit_passwords(
+                wordlist=self.wordlist_small,
+                options=self.options)
+        output = mock_stdout.getvalue()
+        self.assertLessEqual(len(output.encode("utf-8")), 200)
+        self.assertTrue(output.endswith(self.options.separator))
+        self.assertGreater(output.count(self.options.separator), 0)
+
+    def test_emits_to_output_file(self):
+        """ Should write passwords to the `output` file. """
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.options.count = 7
+        self.options.output = os.path.join(tmpdir, "passwords.txt")
+        xkcd_password.emit_passwords(
+            wordlist=self.wordlist_small,
+            options=self.options)
+        with io.open(self.options.output, encoding="utf-8") as f:
+            self.assertEqual(len(f.read().splitlines()), 7)
+
     def test_emits_no_separator_when_specified_separator_empty(self):
         """ Should emit no separator when empty separator specified. """
         self.options.count = 1
@@ -175,6 +335,445 @@ class TestEmitPasswords(unittest.TestCase):
         self.assertEqual(output.find(unwanted_separator), -1)
 
 
+class TestValidateOptions(unittest.TestCase):
+    """ Test cases for function `validate_options`. """
+
+    def setUp(self):
+        self.parser = xkcd_password.XkcdPassArgumentParser(prog="xkcdpass")
+
+    def validate(self, *args):
+        options = self.parser.parse_args(["-w", WORDFILE] + list(args))
+        xkcd_password.validate_options(self.parser, options)
+
+    def test_rejects_fewer_than_one_word(self):
+        for numwords in ("0", "-1"):
+            self.assertRaises(SystemExit, self.validate, "-n", numwords)
+        self.validate("-n", "1")
+
+    def test_rejects_output_in_interactive_mode(self):
+        self.assertRaises(SystemExit, self.validate,
+                          "-i", "-o", "passwords.txt")
+
+
+class TestBatchGeneration(unittest.TestCase):
+    """ Test cases for bulk passphrase generation. """
+
+    def setUp(self):
+        self.wordlist_small = xkcd_password.generate_wordlist(
+            wordfile='tests/test_list.txt',
+            valid_chars='[a-z]')
+
+    def test_generates_count_passwords(self):
+        result = xkcd_password.generate_xkcdpasswords(
+            self.wordlist_small, 100, numwords=4, delimiter="_")
+        self.assertEqual(len(result), 100)
+        for passwd in result:
+            words = passwd.split("_")
+            self.assertEqual(len(words), 4)
+            self.assertTrue(all(w in self.wordlist_small for w in words))
+
+    def test_acrostic_and_random_delimiters(self):
+        result = xkcd_password.generate_xkcdpasswords(
+            self.wordlist_small, 10, acrostic="face", random_delimiters=True,
+            valid_delimiters=["-", "+"])
+        for passwd in result:
+            words = re.split("[-+]", passwd)
+            self.assertEqual("".join(w[0] for w in words), "face")
+
+    def test_iter_passwords(self):
+        stream = xkcd_password.iter_xkcdpasswords(
+            self.wordlist_small, numwords=2)
+        first = [next(stream) for i in range(5000)]
+        self.assertEqual(len(first), 5000)
+        self.assertTrue(all(len(p.split()) == 2 for p in first))
+        self.assertEqual(
+            len(list(xkcd_password.iter_xkcdpasswords(
+                self.wordlist_small, count=3))), 3)
+
+    def test_numpy_backend_or_fallback(self):
+        result = xkcd_password.generate_xkcdpasswords(
+            self.wordlist_small, 5, numwords=3, backend="numpy")
+        self.assertEqual(len(result), 5)
+        self.assertTrue(all(len(p.split()) == 3 for p in result))
+        self.assertRaises(ValueError, xkcd_password.generate_xkcdpasswords,
+                          self.wordlist_small, 5, backend="fortran")
+
+    def test_parallel_generation(self):
+        chunks = list(xkcd_password.generate_xkcdpasswords_parallel(
+            self.wordlist_small, 45, jobs=2, chunk_size=10, numwords=3,
+            delimiter="-"))
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 10, 10, 5])
+        for passwd in sum(chunks, []):
+            words = passwd.split("-")
+            self.assertEqual(len(words), 3)
+            self.assertTrue(all(w in self.wordlist_small for w in words))
+
+    def test_passphrase_pipeline(self):
+        pipeline = xkcd_password.PassphrasePipeline(
+            case="upper", delimiter="-", leet=True, pad_digits=2,
+            pad_symbols=1)
+        self.assertTrue(re.match(r"^73453-0571[0-9]{3}[^0-9A-Za-z]$",
+                                 pipeline.apply(["tease", "ostia"])))
+        for passwd in pipeline.apply_batch([["a", "b"]] * 20):
+            self.assertTrue(re.match(r"^4-B[0-9]{2}[^0-9A-Za-z]$", passwd))
+        self.assertEqual(pipeline.keyspace_factor(3), 900)
+
+        pipeline = xkcd_password.PassphrasePipeline(case="random-chars")
+        rows = [["abc", "de"], ["f"], []]
+        result = pipeline.apply_batch(rows, delimiters=[["+"], [], []])
+        self.assertEqual([p.lower() for p in result], ["abc+de", "f", ""])
+
+        result = xkcd_password.generate_xkcdpasswords(
+            self.wordlist_small, 10, numwords=3, case="first", pad_digits=3)
+        for passwd in result:
+            self.assertTrue(re.match(r"^([A-Z][a-z]* ){2}[A-Z][a-z]*[0-9]{3}$",
+                                     passwd))
+
+    def test_case_variants(self):
+        wordlist = ("tease", "Ostia", "dumb")
+        variants = xkcd_password.case_variants(wordlist)
+        self.assertIs(xkcd_password.case_variants(wordlist), variants)
+        self.assertEqual(variants["upper"], ["TEASE", "OSTIA", "DUMB"])
+        self.assertEqual(variants["capitalize"], ["Tease", "Ostia", "Dumb"])
+        self.assertEqual(variants["random"],
+                         variants["lower"] + variants["upper"])
+
+        for case in ("alternating", "first", "random"):
+            pipeline = xkcd_password.PassphrasePipeline(case=case)
+            rows, cased = pipeline.choose_rows(wordlist, 4, 50)
+            self.assertTrue(cased)
+            self.assertEqual(len(rows), 50)
+            for row in rows:
+                lower = [w.lower() for w in row]
+                self.assertTrue(set(lower) <= set(variants["lower"]))
+                if case == "random":
+                    self.assertTrue(all(w in (w.lower(), w.upper())
+                                        for w in row))
+                else:
+                    self.assertEqual(row, xkcd_password.set_case(lower, case))
+
+        # small draws from a large wordlist are cased word by word
+        pipeline = xkcd_password.PassphrasePipeline(case="upper")
+        wordlist = tuple("word{0}".format(i) for i in range(100))
+        rows, cased = pipeline.choose_rows(wordlist, 2, 3)
+        self.assertFalse(cased)
+        self.assertIsNone(
+            xkcd_password.wordlist_derived(wordlist, "case_variants"))
+        xkcd_password.case_variants(wordlist)
+        rows, cased = pipeline.choose_rows(wordlist, 2, 3)
+        self.assertTrue(cased)
+        self.assertTrue(all(w.isupper() for row in rows for w in row))
+
+    def test_lists_changed_in_place(self):
+        # structures derived from lists are not cached, as lists may change
+        wordlist = ["apple", "berry"]
+        self.assertEqual(xkcd_password.generate_xkcdpasswords(
+            wordlist, 1, acrostic="ab"), ["apple berry"])
+        wordlist[0] = "avocado"
+        self.assertEqual(xkcd_password.generate_xkcdpasswords(
+            wordlist, 1, acrostic="ab"), ["avocado berry"])
+        wordlist[:] = [w.upper() for w in wordlist]
+        self.assertEqual(xkcd_password.generate_xkcdpasswords(
+            wordlist, 1, acrostic="AB", case="as-is"), ["AVOCADO BERRY"])
+
+        # nor are those of generate_wordlist() copies that were changed
+        words = xkcd_password.generate_wordlist(
+            wordfile='tests/test_list.txt', valid_chars='[a-z]')
+        index = xkcd_password.prefix_index(words)
+        self.assertIs(xkcd_password.prefix_index(words), index)
+        words[0] = "zzzzz"
+        self.assertEqual(xkcd_password.prefix_index(words).count("zz"), 1)
+
+    def test_unique_passwords(self):
+        wordlist = self.wordlist_small[:5]
+        keyspace = xkcd_password.passphrase_keyspace(wordlist, numwords=3)
+        self.assertEqual(keyspace, 125)
+        with mock.patch.object(sys, 'stderr') as stderr:
+            result = xkcd_password.generate_xkcdpasswords(
+                wordlist, keyspace, numwords=3, unique=True)
+            # "Apple" and "apple" are counted apart but read the same
+            self.assertRaises(SystemExit,
+                              xkcd_password.generate_xkcdpasswords,
+                              ["apple", "Apple", "berry"], 3, numwords=1,
+                              unique=True)
+        self.assertEqual(len(set(result)), keyspace)
+        self.assertIn("WARNING", stderr.write.call_args_list[0][0][0])
+        self.assertRaises(ValueError, xkcd_password.generate_xkcdpasswords,
+                          wordlist, keyspace + 1, numwords=3, unique=True)
+
+        chunks = xkcd_password.generate_xkcdpasswords_parallel(
+            wordlist, 50, jobs=2, chunk_size=20, numwords=3, unique=True)
+        result = sum(chunks, [])
+        self.assertEqual(len(result), 50)
+        self.assertEqual(len(set(result)), 50)
+
+    def test_total_length_limits(self):
+        wordlist = ["ab", "cde", "fghi", "jk", "lmnop"]
+        sampler = xkcd_password.total_length_sampler(
+            wordlist, numwords=3, delimiter="-",
+            min_total_length=10, max_total_length=11)
+        expected = sorted(
+            "-".join(words) for words in itertools.product(wordlist, repeat=3)
+            if 10 <= len("-".join(words)) <= 11)
+        self.assertEqual(sampler.count, len(expected))
+        self.assertEqual(sorted("".join(sampler.decode(r))
+                                for r in range(sampler.count)), expected)
+
+        result = xkcd_password.generate_xkcdpasswords(
+            wordlist, 200, numwords=3, delimiter="-", case="upper",
+            min_total_length=10, max_total_length=11)
+        self.assertTrue(all(p.lower() in expected for p in result))
+        self.assertEqual(
+            xkcd_password.passphrase_keyspace(
+                wordlist, numwords=3, delimiter="-",
+                min_total_length=10, max_total_length=11),
+            len(expected))
+        self.assertRaises(SystemExit, xkcd_password.generate_xkcdpassword,
+                          wordlist, numwords=3, max_total_length=7)
+
+        # words are counted by their length in case; Python 2 keeps the
+        # sharp s in upper case
+        wordlist = [u"stra\xdfe", u"abcdef", u"ghijkl"]
+        expands = len(u"\xdf".upper()) == 2
+        for case, keyspace in (("upper", 4 if expands else 9), ("lower", 9),
+                               ("random", 25 if expands else 36),
+                               ("alternating", 6 if expands else 9)):
+            result = xkcd_password.generate_xkcdpasswords(
+                wordlist, 100, numwords=2, case=case, max_total_length=13)
+            self.assertTrue(all(len(p) <= 13 for p in result), case)
+            self.assertEqual(xkcd_password.passphrase_keyspace(
+                wordlist, numwords=2, case=case, max_total_length=13),
+                keyspace, case)
+        if expands:
+            self.assertEqual(
+                len(xkcd_password.generate_xkcdpassword(
+                    wordlist, numwords=2, case="upper", min_total_length=15)),
+                15)
+        wordlist = ["ab", "cde", "fghi", "jk", "lmnop"]
+
+        # the padding counts towards the limits and the keyspace
+        options = argparse.Namespace(
+            numwords=3, acrostic=False, delimiter="-", pad_digits=2,
+            min_total_length=12, max_total_length=13)
+        with mock.patch.object(sys, 'stdout') as stdout:
+            xkcd_password.verbose_reports(wordlist, options)
+        output = "".join(call[0][0] for call in stdout.write.call_args_list)
+        self.assertIn("Limited to 12 to 13 characters in total, there are "
+                      "{0} possible".format(len(expected) * 100), output)
+        options.max_total_length = 9
+        with mock.patch.object(sys, 'stdout'):
+            self.assertRaises(SystemExit, xkcd_password.verbose_reports,
+                              wordlist, options)
+
+    def test_fingerprint_set(self):
+        seen = xkcd_password.FingerprintSet(capacity=4)
+        items = ["passphrase {0}".format(i) for i in range(1000)]
+        self.assertEqual(seen.new_items(items + items[:10]), items)
+        self.assertEqual(len(seen), 1000)
+        self.assertIn(items[500], seen)
+        self.assertNotIn("passphrase 1000", seen)
+        self.assertFalse(seen.add(items[0]))
+        self.assertTrue(seen.add("passphrase 1000"))
+
+    def test_randbelow_many_is_in_range(self):
+        pool = xkcd_password.EntropyPool(chunk_size=64)
+        for bound in (1, 2, 3, 255, 256, 257, 7776, 2 ** 40 + 1):
+            values = pool.randbelow_many(bound, 500)
+            self.assertEqual(len(values), 500)
+            self.assertTrue(all(0 <= v < bound for v in values))
+        self.assertEqual(set(pool.randbelow_many(3, 1000)), set([0, 1, 2]))
+
+    def test_weighted_choice(self):
+        table = xkcd_password.AliasTable([3, 1, 0, 4])
+        self.assertEqual(table.probabilities, [0.375, 0.125, 0.0, 0.5])
+        self.assertAlmostEqual(table.shannon_entropy(), 1.40563906)
+        self.assertAlmostEqual(table.min_entropy(), 1.0)
+
+        pool = xkcd_password.EntropyPool()
+        draws = table.sample_many(pool, 8000)
+        counts = [draws.count(i) for i in range(4)]
+        self.assertEqual(counts[2], 0)
+        self.assertTrue(2600 < counts[0] < 3400)
+        self.assertTrue(3600 < counts[3] < 4400)
+
+        weights = {"tease": 1, "ostia": 0.5, "dumb": 0}
+        for passwd in xkcd_password.generate_xkcdpasswords(
+                ["tease", "ostia", "dumb"], 50, numwords=2, case="random",
+                weights=weights):
+            self.assertTrue(re.match(r"^(tease|ostia) (tease|ostia)$",
+                                     passwd.lower()))
+        self.assertEqual(
+            xkcd_password.passphrase_keyspace(
+                ["tease", "ostia", "dumb"], numwords=2, weights=weights), 4)
+
+
+class TestStats(unittest.TestCase):
+    """ Test cases for the instrumentation of the hot paths. """
+
+    def setUp(self):
+        self.events = []
+        self.stats = xkcd_password.enable_stats(
+            hook=lambda kind, name, value: self.events.append((kind, name)))
+        self.addCleanup(xkcd_password.disable_stats)
+
+    def test_collects_timers_and_counters(self):
+        wordlist = xkcd_password.generate_wordlist(
+            wordfile='tests/test_list.txt', valid_chars='[a-z]', cache=None)
+        xkcd_password.generate_xkcdpassword(wordlist, random_delimiters=True)
+        report = self.stats.report()
+        for stage in ("locate", "read", "filter", "choose", "transform"):
+            self.assertIn(stage, report["timers"])
+        counters = report["counters"]
+        self.assertEqual(counters["words_accepted"], len(wordlist))
+        self.assertEqual(counters["words_scanned"],
+                         counters["words_accepted"] +
+                         counters["words_rejected"])
+        self.assertGreater(counters["rng_bytes"], 0)
+        self.assertIn(("count", "rng_bytes"), self.events)
+        self.assertIn("Counters:", self.stats.format_report())
+
+    def test_disabled_collects_nothing(self):
+        xkcd_password.disable_stats()
+        xkcd_password.generate_xkcdpasswords(
+            xkcd_password.generate_wordlist(wordfile='tests/test_list.txt'),
+            10)
+        self.assertEqual(self.stats.report(), {"timers": {}, "counters": {}})
+
+    def test_main_disables_stats_on_errors(self):
+        xkcd_password.disable_stats()
+        with mock.patch.object(sys, 'stderr'):
+            self.assertNotEqual(xkcd_password.main(
+                ["xkcdpass", "--stats", "-w", WORDFILE, "-n", "0"]), 0)
+        self.assertIsNone(xkcd_password.STATS)
+
+
+class TestWordlistCache(unittest.TestCase):
+    """ Test cases for the wordlist cache used by `generate_wordlist`. """
+
+    def setUp(self):
+        self.cache = xkcd_password.WordlistCache(maxsize=2)
+        self.tmpdir = tempfile.mkdtemp()
+        self.wordfile = os.path.join(self.tmpdir, 'words')
+        with io.open(self.wordfile, 'w', encoding='utf-8') as f:
+            f.write(u"alpha\nbravo\ncharlie\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_repeated_calls_hit_cache(self):
+        first = xkcd_password.generate_wordlist(
+            wordfile=self.wordfile, cache=self.cache)
+        second = xkcd_password.generate_wordlist(
+            wordfile=self.wordfile, cache=self.cache)
+        self.assertEqual(sorted(first), sorted(second))
+        self.assertIsNot(first, second)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_modified_wordfile_is_reloaded(self):
+        xkcd_password.generate_wordlist(
+            wordfile=self.wordfile, cache=self.cache)
+        with io.open(self.wordfile, 'a', encoding='utf-8') as f:
+            f.write(u"delta\n")
+        words = xkcd_password.generate_wordlist(
+            wordfile=self.wordfile, cache=self.cache)
+        self.assertIn("delta", words)
+        self.assertEqual(self.cache.stats()["misses"], 2)
+
+    def test_lru_eviction_and_clear(self):
+        for max_length in (5, 6, 7):
+            xkcd_password.generate_wordlist(
+                wordfile=self.wordfile, max_length=max_length,
+                cache=self.cache)
+        self.assertEqual(len(self.cache), 2)
+        self.cache.clear()
+        self.assertEqual(self.cache.stats(),
+                         {"hits": 0, "misses": 0, "size": 0, "maxsize": 2})
+
+
+class TestParallelLoad(unittest.TestCase):
+    """ Test cases for loading several wordfiles in parallel. """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.wordfile = os.path.join(self.tmpdir, 'words')
+        with io.open(self.wordfile, 'w', encoding='utf-8') as f:
+            f.write(u"alpha\nbravo\ncharlie\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_parallel_load_of_several_wordfiles(self):
+        other = os.path.join(self.tmpdir, 'other')
+        with io.open(other, 'w', encoding='utf-8') as f:
+            f.write(u"bravo\ndelta\nab\nzulu\n")
+        wordfile = ",".join([self.wordfile, other])
+        expected = ["zulu", "alpha", "bravo", "delta", "charlie"]
+        for workers, executor in ((1, "thread"), (0, "thread"),
+                                  (2, "process")):
+            self.assertEqual(
+                xkcd_password.generate_wordlist(
+                    wordfile=wordfile, min_length=3, max_length=9,
+                    cache=None, workers=workers, executor=executor),
+                expected)
+
+
+class TestSourcedWordlist(unittest.TestCase):
+    """ Test cases for wordlists that remember their source wordfiles. """
+
+    def setUp(self):
+        self.cache = xkcd_password.WordlistCache(maxsize=2)
+        self.tmpdir = tempfile.mkdtemp()
+        self.wordfile = os.path.join(self.tmpdir, 'words')
+        with io.open(self.wordfile, 'w', encoding='utf-8') as f:
+            f.write(u"alpha\nbravo\ncharlie\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_sourced_wordlist(self):
+        other = os.path.join(self.tmpdir, 'other')
+        with io.open(other, 'w', encoding='utf-8') as f:
+            f.write(u"bravo\ndelta\nzulu\n")
+        first = xkcd_password.sourced_wordlist(
+            wordfile=self.wordfile, min_length=4, cache=self.cache)
+        both = xkcd_password.sourced_wordlist(
+            wordfile=",".join([self.wordfile, other]), min_length=4,
+            cache=self.cache)
+        # the loaded source is reused rather than read again
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertIs(both.members[0], first.members[0])
+        self.assertEqual(list(both),
+                         ["alpha", "bravo", "charlie", "zulu", "delta"])
+        self.assertEqual(both.names, [self.wordfile, other])
+        self.assertEqual([list(m) for m in both.members],
+                         [[0, 1, 2], [3, 1, 4]])
+        self.assertIn("zulu", both)
+        self.assertEqual(both.source_weights(), [1, 2, 1, 1, 1])
+        self.assertEqual(both.source_weights(balanced=True),
+                         [1.0 / 3, 2.0 / 3, 1.0 / 3, 1.0 / 3, 1.0 / 3])
+
+        pattern = [other, "1"]
+        for passwd in xkcd_password.generate_xkcdpasswords(
+                both, 20, sources=pattern):
+            word, other_word = passwd.split()
+            self.assertIn(word, ["bravo", "delta", "zulu"])
+            self.assertIn(other_word, ["alpha", "bravo", "charlie"])
+        self.assertEqual(xkcd_password.passphrase_keyspace(
+            both, sources=pattern), 9)
+        self.assertEqual(xkcd_password.passphrase_entropy(
+            both, 6, sources=",".join(pattern)),
+            (2 * math.log(3, 2), 2 * math.log(3, 2)))
+        shannon, min_entropy = xkcd_password.passphrase_entropy(
+            both, 2, sources="proportional")
+        self.assertAlmostEqual(min_entropy, 2 * math.log(3, 2))
+        self.assertTrue(min_entropy < shannon < 2 * math.log(5, 2))
+        self.assertEqual(len(xkcd_password.generate_xkcdpassword(
+            both, numwords=4, sources="balanced").split()), 4)
+        self.assertRaises(ValueError, xkcd_password.generate_xkcdpasswords,
+                          list(both), 1, sources="balanced")
+
+
 # class TestEntropyInformation(unittest.TestCase):
 #     """ Test cases for function `emit_passwords`. """
 
@@ -190,6 +789,7 @@ class TestEmitPasswords(unittest.TestCase):
 
 
 if __name__ == '__main__':
-    test_cases = [XkcdPasswordTests, TestEmitPasswords, ]  # TestEntropyInformation]
+    test_cases = [XkcdPasswordTests, TestEmitPasswords, TestBatchGeneration,
+                  TestStats, TestWordlistCache, ]  # TestEntropyInformation]
     suites = [unittest.TestLoader().loadTestsFromTestCase(test_case) for test_case in test_cases]
     unittest.TextTestRunner(verbosity=2).run(unittest.TestSuite(suites))
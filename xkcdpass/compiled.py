@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Precompiled binary wordlist format.
+
+A compiled wordlist holds every distinct word of a wordfile, sorted by
+length and then alphabetically, in a single UTF-8 blob together with an
+offset table and a histogram of word lengths.  Because words of the same
+length are contiguous, any --min/--max window is a single slice of the
+blob, so loading a compiled file needs no per-line parsing.
+
+Layout (all integers are little-endian uint32):
+
+    header      magic (8 bytes), word count, histogram size, blob size,
+                reserved
+    histogram   number of words of each length 0 .. histogram size - 1
+    offsets     word count + 1 byte offsets into the blob
+    blob        the words, each followed by a newline
+"""
+
+from __future__ import print_function
+
+import argparse
+import mmap
+import os
+import os.path
+import struct
+import sys
+
+from array import array
+from io import open
+
+MAGIC = b"XKCDWL\x00\x01"
+COMPILED_SUFFIX = ".xkwl"
+
+_HEADER = struct.Struct("<8sIIII")
+
+# called tostring() and fromstring() on Python 2
+_array_tobytes = getattr(array, "tobytes", None) or array.tostring
+_array_frombytes = getattr(array, "frombytes", None) or array.fromstring
+
+
+def _uint32_array(data):
+    """
+    Return a sequence of uint32 values read from little-endian data.
+    """
+    if sys.byteorder == "little" and hasattr(memoryview, "cast"):
+        return data.cast("B").cast("I")
+    values = array("I")
+    _array_frombytes(values, data.tobytes())
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def sort_key(word):
+    """
+    Canonical word order of compiled wordlists: by length, then by word.
+    """
+    return (len(word), word)
+
+
+def pack_words(words):
+    """
+    Serialize an iterable of words into the compiled wordlist format.
+    """
+    words = sorted(set(words), key=sort_key)
+    histogram = array("I", [0] * ((len(words[-1]) + 1) if words else 0))
+    offsets = array("I", [0])
+    chunks = []
+    position = 0
+    for word in words:
+        encoded = word.encode("utf-8") + b"\n"
+        chunks.append(encoded)
+        position += len(encoded)
+        offsets.append(position)
+        histogram[len(word)] += 1
+    blob = b"".join(chunks)
+
+    if sys.byteorder != "little":
+        histogram.byteswap()
+        offsets.byteswap()
+    header = _HEADER.pack(MAGIC, len(words), len(histogram), len(blob), 0)
+    return b"".join([header, _array_tobytes(histogram),
+                     _array_tobytes(offsets), blob])
+
+
+def is_compiled(path):
+    """
+    Return True if the file at path is a compiled wordlist.
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except (IOError, OSError):
+        return False
+
+
+class CompiledWordlist(object):
+    """
+    Read-only view of a compiled wordlist held in any buffer (bytes, mmap,
+    shared memory).  Words are decoded on access.
+    """
+
+    def __init__(self, buf):
+        magic, count, hist_size, blob_size, _ = _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a compiled xkcdpass wordlist")
+        try:
+            self._buf = memoryview(buf)
+        except TypeError:
+            # Python 2's mmap lacks the buffer interface of memoryview
+            self._buf = memoryview(buf[:])
+        self.count = count
+
+        start = _HEADER.size
+        self.histogram = tuple(
+            _uint32_array(self._buf[start:start + 4 * hist_size]))
+        start += 4 * hist_size
+        self._offsets = _uint32_array(
+            self._buf[start:start + 4 * (count + 1)])
+        self._blob_start = start + 4 * (count + 1)
+
+        # index of the first word of each length
+        self._bucket_starts = [0]
+        for n in self.histogram:
+            self._bucket_starts.append(self._bucket_starts[-1] + n)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("wordlist index out of range")
+        start = self._blob_start + self._offsets[index]
+        end = self._blob_start + self._offsets[index + 1] - 1
+        return self._buf[start:end].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        return iter(self.words(0, self.count))
+
+    def __contains__(self, word):
+        # binary search within the bucket of words of the same length
+        first, last = self.window_range(len(word), len(word))
+        while first < last:
+            middle = (first + last) // 2
+            if self[middle] < word:
+                first = middle + 1
+            else:
+                last = middle
+        return first < self.count and self[first] == word
+
+    def words(self, first, last):
+        """
+        Decode the words with indices first <= i < last in one pass.
+        """
+        if first >= last:
+            return []
+        start = self._blob_start + self._offsets[first]
+        end = self._blob_start + self._offsets[last] - 1
+        return self._buf[start:end].tobytes().decode("utf-8").split("\n")
+
+    def window_range(self, min_length, max_length):
+        """
+        Return the (first, last) index range of words whose length lies
+        between min_length and max_length inclusive.
+        """
+        top = len(self.histogram) - 1
+        low = max(0, min(min_length, top + 1))
+        high = max(low - 1, min(max_length, top))
+        return self._bucket_starts[low], self._bucket_starts[high + 1]
+
+    def window(self, min_length, max_length):
+        """
+        Return the words whose length lies between min_length and
+        max_length inclusive.
+        """
+        return self.words(*self.window_range(min_length, max_length))
+
+    def length_counts(self, min_length, max_length):
+        """
+        Return a {length: number of words} mapping for the given window.
+        """
+        return dict((n, count) for n, count in enumerate(self.histogram)
+                    if count and min_length <= n <= max_length)
+
+
+def load_compiled(path):
+    """
+    Memory-map a compiled wordlist file. The mapping is read-only, so its
+    pages are shared between all processes loading the same file.
+    """
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return CompiledWordlist(buf)
+
+
+def compiled_sibling(path):
+    """
+    Return the path of an up-to-date compiled version of the wordfile at
+    path, or None if there is none.
+    """
+    candidate = path + COMPILED_SUFFIX
+    try:
+        if os.stat(candidate).st_mtime >= os.stat(path).st_mtime:
+            return candidate
+    except (IOError, OSError):
+        pass
+    return None
+
+
+def compile_wordfile(wordfile, dest=None):
+    """
+    Compile a plain text (or compressed) wordfile, writing it next to the
+    source unless a destination path is given.  Returns the destination
+    path.
+    """
+    from xkcdpass import compressed
+
+    if dest is None:
+        dest = wordfile + COMPILED_SUFFIX
+
+    with compressed.open_wordfile(wordfile) as wlf:
+        packed = pack_words(line.strip() for line in wlf)
+
+    tmp = dest + ".tmp"
+    with open(tmp, "wb") as out:
+        out.write(packed)
+    getattr(os, "replace", os.rename)(tmp, dest)
+    return dest
+
+
+def main(argv=None):
+    """ Compile one or more wordfiles. """
+    from xkcdpass.xkcd_password import locate_wordfile
+
+    if argv is None:
+        argv = sys.argv
+
+    parser = argparse.ArgumentParser(
+        prog=os.path.basename(argv[0]),
+        description="Compile wordfiles into the binary xkcdpass format.")
+    parser.add_argument(
+        "wordfiles", nargs="+", metavar="WORDFILE",
+        help="Wordfile name or path to compile, or - for standard input.")
+    parser.add_argument(
+        "-o", "--output",
+        dest="output", default=None, metavar="OUTPUT",
+        help=("Write the compiled wordlist to OUTPUT (only with a single"
+              " WORDFILE). Default: WORDFILE" + COMPILED_SUFFIX))
+    options = parser.parse_args(argv[1:])
+
+    if options.output and len(options.wordfiles) > 1:
+        parser.error("--output can only be used with a single WORDFILE")
+    if "-" in options.wordfiles and not options.output:
+        parser.error("--output is required to compile standard input")
+
+    for name in options.wordfiles:
+        wordfile = locate_wordfile(name, prefer_compiled=False)
+        if wordfile is None:
+            sys.stderr.write("Wordfile not found: {0}\n".format(name))
+            return 1
+        print(compile_wordfile(wordfile, options.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,92 @@
+# encoding: utf-8
+
+"""
+Compressed wordfiles and wordfiles read from standard input.
+
+Wordfiles compressed with gzip, bzip2, xz or, when the zstandard package
+(or the compression.zstd module of Python 3.14) is installed, Zstandard
+are recognised by their leading magic bytes and decompressed as they are
+read, line by line, so they are never expanded on disk or in memory.  The
+wordfile name "-" stands for standard input, which is read as plain text.
+"""
+
+import bz2
+import codecs
+import gzip
+import io
+import sys
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    from compression import zstd
+except ImportError:
+    try:
+        import zstandard as zstd
+    except ImportError:
+        zstd = None
+
+
+# the wordfile name of standard input
+STDIN = "-"
+
+# (name, magic bytes, file name suffix, opener taking a path)
+FORMATS = [
+    ("gzip", b"\x1f\x8b", ".gz", gzip.GzipFile),
+    ("bzip2", b"BZh", ".bz2", bz2.BZ2File),
+    ("xz", b"\xfd7zXZ\x00", ".xz", lzma and lzma.LZMAFile),
+    ("zstd", b"\x28\xb5\x2f\xfd", ".zst", zstd and zstd.open),
+]
+
+SUFFIXES = tuple(suffix for _, _, suffix, _ in FORMATS)
+
+
+def compression(path):
+    """
+    Return the name of the compression format of the file at path, or
+    None if it is not compressed (or is standard input).
+    """
+    if path == STDIN:
+        return None
+    with io.open(path, "rb") as f:
+        head = f.read(6)
+    for name, magic, _, _ in FORMATS:
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def open_binary(path):
+    """
+    Open the file at path (or standard input for "-") for reading bytes,
+    decompressing it on the fly if it is compressed.
+    """
+    if path == STDIN:
+        # leave standard input open for the rest of the program
+        return io.open(sys.stdin.fileno(), "rb", closefd=False)
+
+    name = compression(path)
+    if name is None:
+        return io.open(path, "rb")
+    opener = dict((fmt[0], fmt[3]) for fmt in FORMATS)[name]
+    if opener is None:
+        raise SystemExit(
+            "Error: Reading the {0} compressed file {1} requires the"
+            " '{2}' module.\n".format(
+                name, path, "zstandard" if name == "zstd" else "lzma"))
+    return opener(path)
+
+
+def open_wordfile(path):
+    """
+    Open the wordfile at path (or standard input for "-") as UTF-8 text,
+    decompressing it on the fly if it is compressed.
+    """
+    f = open_binary(path)
+    if sys.version_info[0] == 2 and not isinstance(f, io.BufferedReader):
+        # Python 2's decompressing files lack the read1() of TextIOWrapper
+        return codecs.getreader("utf-8")(f)
+    return io.TextIOWrapper(f, encoding="utf-8")
@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Denylists of breached passphrases.
+
+A denylist index holds a 64-bit hash of every distinct line of a source
+corpus (one passphrase per line, plain or compressed), sorted, in a flat
+file that is memory-mapped on load.  Checking a passphrase is a binary
+search over the mapping, so only the few pages it touches are read and
+the corpus is never loaded into memory.
+
+The builder streams the corpus once, sorting runs of hashes that fit in
+memory and spilling them to temporary files, then merges the runs into
+the index.  Lines are compared without surrounding whitespace and with
+ASCII letters in lower case; a hash collision (about n / 2**64 per
+lookup) can only cause a harmless regeneration.
+
+Layout (all integers are little-endian uint64):
+
+    header      magic (8 bytes), hash count, reserved
+    hashes      the sorted distinct hashes
+"""
+
+from __future__ import print_function
+
+import argparse
+import errno
+import hashlib
+import heapq
+import mmap
+import os
+import os.path
+import struct
+import sys
+import tempfile
+
+from array import array
+from bisect import bisect_left
+from io import open
+
+try:
+    from xkcdpass import compressed
+except ImportError:
+    # running this file directly as a script
+    import compressed
+
+MAGIC = b"XKCDDL\x00\x01"
+DENYLIST_SUFFIX = ".xkdl"
+
+# number of hashes sorted in memory at once while building an index
+RUN_SIZE = 1 << 20
+
+# number of hashes read or written per I/O call
+BLOCK_SIZE = 1 << 14
+
+_HEADER = struct.Struct("<8sQQ")
+_HASH = struct.Struct("<Q")
+_TYPECODE = next(code for code in "LQ" if array(code).itemsize == 8)
+
+# called tostring() and fromstring() on Python 2
+_array_tobytes = getattr(array, "tobytes", None) or array.tostring
+_array_frombytes = getattr(array, "frombytes", None) or array.fromstring
+
+
+def phrase_hash(phrase):
+    """
+    Return the 64-bit hash of a passphrase (str) or corpus line (bytes).
+    """
+    if not isinstance(phrase, bytes):
+        phrase = phrase.encode("utf-8")
+    digest = hashlib.sha256(phrase.strip().lower()).digest()
+    return _HASH.unpack_from(digest)[0]
+
+
+def _write_hashes(f, hashes):
+    """
+    Write a sorted iterable of hashes to f in blocks. Returns the count.
+    """
+    count = 0
+    block = array(_TYPECODE)
+    for value in hashes:
+        block.append(value)
+        if len(block) == BLOCK_SIZE:
+            count += _flush(f, block)
+            block = array(_TYPECODE)
+    return count + _flush(f, block)
+
+
+def _flush(f, block):
+    if sys.byteorder != "little":
+        block.byteswap()
+    f.write(_array_tobytes(block))
+    return len(block)
+
+
+def _read_hashes(f):
+    """
+    Yield the hashes written to f by `_write_hashes()`, from the start.
+    """
+    f.seek(0)
+    while True:
+        data = f.read(8 * BLOCK_SIZE)
+        if not data:
+            return
+        block = array(_TYPECODE)
+        _array_frombytes(block, data)
+        if sys.byteorder != "little":
+            block.byteswap()
+        for value in block:
+            yield value
+
+
+def _distinct(hashes):
+    previous = None
+    for value in hashes:
+        if value != previous:
+            yield value
+            previous = value
+
+
+def build_denylist(source, dest=None, run_size=RUN_SIZE):
+    """
+    Build the index of the corpus at source (a path, possibly compressed,
+    or "-" for standard input), reading it once. The index is written next
+    to the source unless a destination path is given. Returns the
+    destination path.
+    """
+    if dest is None:
+        dest = source + DENYLIST_SUFFIX
+    directory = os.path.dirname(os.path.abspath(dest))
+
+    runs = []
+    try:
+        run = array(_TYPECODE)
+        with compressed.open_binary(source) as corpus:
+            for line in corpus:
+                run.append(phrase_hash(line))
+                if len(run) == run_size:
+                    runs.append(tempfile.TemporaryFile(dir=directory))
+                    _write_hashes(runs[-1], _distinct(sorted(run)))
+                    run = array(_TYPECODE)
+        if runs:
+            runs.append(tempfile.TemporaryFile(dir=directory))
+            _write_hashes(runs[-1], _distinct(sorted(run)))
+            hashes = _distinct(heapq.merge(*[_read_hashes(f) for f in runs]))
+        else:
+            hashes = _distinct(sorted(run))
+
+        tmp = dest + ".tmp"
+        with open(tmp, "wb") as out:
+            out.write(_HEADER.pack(MAGIC, 0, 0))
+            count = _write_hashes(out, hashes)
+            out.seek(0)
+            out.write(_HEADER.pack(MAGIC, count, 0))
+        getattr(os, "replace", os.rename)(tmp, dest)
+    finally:
+        for f in runs:
+            f.close()
+    return dest
+
+
+class _LittleEndianHashes(object):
+    """
+    Sequence of the uint64 values of little-endian data, decoded on
+    access, for hosts where a memoryview cast would use the wrong order.
+    """
+
+    def __init__(self, data):
+        self._data = data
+
+    def __len__(self):
+        return len(self._data) // 8
+
+    def __getitem__(self, index):
+        return _HASH.unpack_from(self._data, 8 * index)[0]
+
+
+class Denylist(object):
+    """
+    Read-only view of a denylist index held in any buffer. Supports len()
+    and `in` for passphrases.
+    """
+
+    def __init__(self, buf, path=None):
+        magic, count, _ = _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise ValueError("Not an xkcdpass denylist index")
+        self.path = path
+        self.count = count
+        self._buf = buf
+        try:
+            data = memoryview(buf)[_HEADER.size:_HEADER.size + 8 * count]
+        except TypeError:
+            # Python 2's mmap only has the old buffer interface
+            data = buffer(buf, _HEADER.size, 8 * count)
+        if sys.byteorder == "little" and hasattr(memoryview, "cast"):
+            self._hashes = data.cast("B").cast(_TYPECODE)
+        else:
+            self._hashes = _LittleEndianHashes(data)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, phrase):
+        value = phrase_hash(phrase)
+        i = bisect_left(self._hashes, value)
+        return i < self.count and self._hashes[i] == value
+
+    def __reduce__(self):
+        # reopen the mapping in worker processes instead of copying it
+        if self.path is None:
+            return (Denylist, (bytes(self._buf),))
+        return (load_denylist, (self.path,))
+
+
+def is_denylist(path):
+    """
+    Return True if the file at path is a denylist index.
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except (IOError, OSError):
+        return False
+
+
+def denylist_index(path):
+    """
+    Return the path of a denylist index for path: path itself if it is
+    an index, else an up-to-date PATH.xkdl next to the corpus, which is
+    built first if needed. Returns None if the index can't be written
+    there (e.g. a read-only directory).
+    """
+    if is_denylist(path):
+        return path
+    candidate = path + DENYLIST_SUFFIX
+    try:
+        if os.stat(candidate).st_mtime >= os.stat(path).st_mtime:
+            return candidate
+    except (IOError, OSError):
+        pass
+    if not os.access(path, os.R_OK):
+        # let opening the corpus report the error
+        return build_denylist(path, candidate)
+    try:
+        return build_denylist(path, candidate)
+    except (IOError, OSError) as e:
+        if e.errno not in (errno.EACCES, errno.EPERM, errno.EROFS):
+            raise
+        return None
+
+
+def _memory_denylist(path):
+    """
+    Build the index of the corpus at path in a temporary file and return
+    it as a Denylist held in memory.
+    """
+    fd, tmp = tempfile.mkstemp(suffix=DENYLIST_SUFFIX)
+    os.close(fd)
+    try:
+        build_denylist(path, tmp)
+        with open(tmp, "rb") as f:
+            return Denylist(f.read())
+    finally:
+        os.unlink(tmp)
+
+
+def load_denylist(path):
+    """
+    Memory-map the denylist index for path (see `denylist_index()`). If
+    no index can be written next to a corpus, it is indexed in memory
+    for this process only.
+    """
+    index = denylist_index(path)
+    if index is None:
+        return _memory_denylist(path)
+    path = index
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size <= _HEADER.size:
+            # an empty corpus; mmap can't map empty trailing data anyway
+            return Denylist(f.read(), path)
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return Denylist(buf, path)
+
+
+def main(argv=None):
+    """ Build denylist indexes from breached passphrase corpora. """
+
+    if argv is None:
+        argv = sys.argv
+
+    parser = argparse.ArgumentParser(
+        prog=os.path.basename(argv[0]),
+        description=("Build denylist indexes of breached passphrases for"
+                     " xkcdpass --denylist."))
+    parser.add_argument(
+        "corpora", nargs="+", metavar="CORPUS",
+        help=("File of passphrases, one per line, optionally compressed,"
+              " or - for standard input."))
+    parser.add_argument(
+        "-o", "--output",
+        dest="output", default=None, metavar="OUTPUT",
+        help=("Write the index to OUTPUT (only with a single CORPUS)."
+              " Default: CORPUS" + DENYLIST_SUFFIX))
+    options = parser.parse_args(argv[1:])
+
+    if options.output and len(options.corpora) > 1:
+        parser.error("--output can only be used with a single CORPUS")
+    if compressed.STDIN in options.corpora and not options.output:
+        parser.error("--output is required to index standard input")
+
+    for corpus in options.corpora:
+        if corpus != compressed.STDIN and not os.path.isfile(corpus):
+            sys.stderr.write("Corpus not found: {0}\n".format(corpus))
+            return 1
+        print(build_denylist(corpus, options.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
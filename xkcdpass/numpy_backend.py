@@ -0,0 +1,143 @@
+# encoding: utf-8
+
+"""
+Optional NumPy-vectorized passphrase generation.
+
+Word indices for a whole block of passphrases are drawn as one
+(count, numwords) matrix by vectorized rejection sampling over a bulk
+block of random bytes, and case and delimiters are applied with array
+operations.  `available()` is False when NumPy is not installed, in
+which case callers use the pure Python implementation.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# number of passphrases generated per block
+BATCH_SIZE = 65536
+
+_UNSIGNED_TYPES = ((8, "uint8"), (16, "uint16"), (32, "uint32"),
+                   (64, "uint64"))
+
+_word_arrays_cache = {}
+
+
+def available():
+    """
+    Return True if NumPy can be used.
+    """
+    return numpy is not None
+
+
+def random_indices(n, shape, pool):
+    """
+    Return an array of the given shape of random integers in [0, n),
+    drawn from the bytes of an `EntropyPool` by rejection sampling.
+    """
+    total = 1
+    for dim in shape:
+        total *= dim
+    if n == 1:
+        return numpy.zeros(shape, dtype=numpy.intp)
+
+    bits = (n - 1).bit_length()
+    for width, name in _UNSIGNED_TYPES:
+        if bits <= width:
+            dtype = numpy.dtype(name)
+            break
+    else:
+        raise ValueError("Cannot draw indices of more than 64 bits")
+    mask = dtype.type((1 << bits) - 1)
+
+    out = numpy.empty(total, dtype=numpy.intp)
+    filled = 0
+    while filled < total:
+        # a masked draw is accepted with probability above 1/2
+        wanted = total - filled
+        raw = numpy.frombuffer(
+            pool.read(dtype.itemsize * (wanted + wanted // 2 + 8)),
+            dtype=dtype) & mask
+        accepted = raw[raw < n][:wanted]
+        out[filled:filled + len(accepted)] = accepted
+        filled += len(accepted)
+    return out.reshape(shape)
+
+
+def word_arrays(wordlist):
+    """
+    Return a dictionary of object arrays holding the words of wordlist as
+    they are, lower, upper and capitalized. The arrays of the most
+    recently used wordlists are cached, unless they are lists, which may
+    be changed in place.
+    """
+    # a generate_wordlist() copy of a cached tuple counts as the tuple
+    source = getattr(wordlist, "source", None)
+    if source is not None and tuple(wordlist) == source:
+        wordlist = source
+    cached = _word_arrays_cache.get(id(wordlist))
+    if cached is not None and cached[0] is wordlist:
+        return cached[1]
+
+    words = list(wordlist)
+    arrays = {
+        "as-is": numpy.array(words, dtype=object),
+        "lower": numpy.array([w.lower() for w in words], dtype=object),
+        "upper": numpy.array([w.upper() for w in words], dtype=object),
+        "capitalize": numpy.array([w.capitalize() for w in words],
+                                  dtype=object),
+    }
+    arrays["first"] = arrays["capitalize"]
+
+    if isinstance(wordlist, list):
+        return arrays
+    if len(_word_arrays_cache) >= 4:
+        _word_arrays_cache.clear()
+    _word_arrays_cache[id(wordlist)] = (wordlist, arrays)
+    return arrays
+
+
+def passphrase_batches(wordlist,
+                       count,
+                       pool,
+                       numwords=6,
+                       delimiter=" ",
+                       random_delimiters=False,
+                       valid_delimiters=(" ",),
+                       case="lower"):
+    """
+    Yield lists of passphrases, count in total (or without end if count
+    is None), generated a block at a time with the options of
+    `generate_xkcdpassword()`.
+    """
+    arrays = word_arrays(wordlist)
+    delimiters = numpy.array(list(valid_delimiters), dtype=object)
+
+    while count is None or count > 0:
+        batch = BATCH_SIZE if count is None else min(count, BATCH_SIZE)
+        if count is not None:
+            count -= batch
+
+        indices = random_indices(len(wordlist), (batch, numwords), pool)
+        if case == "alternating":
+            words = arrays["lower"][indices]
+            words[:, ::2] = arrays["upper"][indices[:, ::2]]
+        elif case == "random":
+            flips = random_indices(2, (batch, numwords), pool)
+            words = numpy.where(flips == 1,
+                                arrays["upper"][indices],
+                                arrays["lower"][indices])
+        else:
+            words = arrays[case][indices]
+
+        if not random_delimiters or numwords < 2:
+            yield [delimiter.join(row) for row in words.tolist()]
+            continue
+
+        parts = numpy.empty((batch, 2 * numwords - 1), dtype=object)
+        parts[:, ::2] = words
+        parts[:, 1::2] = delimiters[
+            random_indices(len(delimiters), (batch, numwords - 1), pool)]
+        yield ["".join(row) for row in parts.tolist()]
@@ -0,0 +1,143 @@
+# encoding: utf-8
+
+"""
+Keyed pseudorandom permutations of integer ranges.
+
+A KeyspacePermutation shuffles the integers 0 .. size - 1 in an order
+fixed by a secret key, without storing anything: index i maps to a
+single value computed on demand.  It is a Feistel network over the
+smallest number of bits covering the range, split into halves that
+differ by at most a bit (as in NIST's FF1), whose round
+function is HMAC-SHA256 of the key.  Values falling outside the range
+are encrypted again until one falls inside (cycle walking), which takes
+fewer than two passes on average because the network's domain is less
+than twice the range.
+
+Numbering the possible passphrases and walking them in this order
+yields every passphrase at most once, with no record of those already
+generated; nodes sharing a key can split the indices into disjoint
+shards to generate unique passphrases without coordinating.
+"""
+
+import hashlib
+import struct
+
+from binascii import hexlify, unhexlify
+
+FEISTEL_ROUNDS = 8
+
+# bytes of round function output per HMAC-SHA256 block
+_BLOCK_BYTES = hashlib.sha256().digest_size
+
+
+if hasattr(int, "to_bytes"):
+    def _int_to_bytes(value, length):
+        return value.to_bytes(length, "big")
+
+    def _bytes_to_int(data):
+        return int.from_bytes(data, "big")
+else:
+    def _int_to_bytes(value, length):
+        return unhexlify("{0:0{1}x}".format(value, 2 * length))
+
+    def _bytes_to_int(data):
+        return int(hexlify(data), 16)
+
+
+def _hmac_states(key, prefix):
+    """
+    Return the inner and outer SHA-256 states of HMAC-SHA256 keyed by key
+    after the message prefix, to be copied rather than recomputed for
+    every message; the hmac module's wrappers cost more than the hashing
+    of the short messages of a Feistel round.
+    """
+    block_size = hashlib.sha256().block_size
+    if len(key) > block_size:
+        key = hashlib.sha256(key).digest()
+    key = bytearray(key.ljust(block_size, b"\0"))
+    inner = hashlib.sha256(bytes(bytearray(b ^ 0x36 for b in key)) + prefix)
+    outer = hashlib.sha256(bytes(bytearray(b ^ 0x5c for b in key)))
+    return inner, outer
+
+
+class KeyspacePermutation(object):
+    """
+    A permutation of range(size) keyed by key (bytes): permutation[i] is
+    the value at position i of the pseudorandom order.
+    """
+
+    def __init__(self, size, key, rounds=FEISTEL_ROUNDS):
+        if size < 1:
+            raise ValueError("Can't permute an empty range")
+        if not key:
+            raise ValueError("The permutation key can't be empty")
+        if rounds % 2:
+            raise ValueError("The number of rounds must be even")
+        self.size = size
+        bits = max(1, (size - 1).bit_length())
+        # the left half has _half bits on even rounds and _other on odd
+        # ones; after an even number of rounds, the halves are back
+        self._half, self._other = bits // 2, bits - bits // 2
+        self._masks = [(1 << (self._other if r % 2 else self._half)) - 1
+                       for r in range(rounds)]
+        self._length = (self._other + 7) // 8
+        self._blocks = (self._length + _BLOCK_BYTES - 1) // _BLOCK_BYTES
+        # the round function of round r is HMAC-SHA256(key, r || block ||
+        # right half), concatenated over as many blocks as needed
+        self._rounds = [_hmac_states(key, struct.pack(">B", r))
+                        for r in range(rounds)]
+
+    def __len__(self):
+        return self.size
+
+    def _round(self, states, value):
+        inner, outer = states
+        data = _int_to_bytes(value, self._length)
+        digest = b""
+        for block in range(self._blocks):
+            h = inner.copy()
+            h.update(struct.pack(">I", block) + data)
+            g = outer.copy()
+            g.update(h.digest())
+            digest += g.digest()
+        return _bytes_to_int(digest[:self._length])
+
+    def _encrypt(self, value):
+        other = self._other
+        left, right = value >> other, value & ((1 << other) - 1)
+        for states, mask in zip(self._rounds, self._masks):
+            left, right = right, (left ^ self._round(states, right)) & mask
+        return (left << other) | right
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("permutation index out of range")
+        value = self._encrypt(index)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+
+def parse_shard(shard):
+    """
+    Parse a shard "K/N" (the K-th of N, from 1) into a (K, N) tuple.
+    """
+    try:
+        number, shards = (int(part) for part in shard.split("/"))
+    except ValueError:
+        raise ValueError("Invalid shard: {0} (expected K/N)".format(shard))
+    if not 1 <= number <= shards:
+        raise ValueError("Invalid shard: {0} (K must be between 1 and N)"
+                         .format(shard))
+    return number, shards
+
+
+def shard_size(size, shard):
+    """
+    Return the number of indices of range(size) in shard (K, N): those
+    congruent to K - 1 modulo N.
+    """
+    number, shards = shard
+    return max(0, (size - number + shards) // shards)
@@ -0,0 +1,363 @@
+# encoding: utf-8
+
+"""
+`xkcdpass serve`: a small HTTP service handing out passphrases as JSON.
+
+Wordlists are loaded and indexed once at startup, so a request only costs
+the generation of its passphrases. Built on asyncio from the standard
+library only (Python 3).
+
+Endpoints:
+
+    GET  /passphrase?numwords=6&count=3&case=upper&delimiter=-
+    POST /passphrase   with the same options as a JSON object
+    GET  /stats        request, latency and throughput counters
+
+Options: wordlist, numwords, count, acrostic, case, delimiter,
+random_delimiters, valid_delimiters.
+"""
+
+from __future__ import print_function
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import traceback
+
+from collections import deque
+
+try:
+    from urllib.parse import parse_qsl, urlsplit
+except ImportError:
+    from urlparse import parse_qsl, urlsplit
+
+from xkcdpass import xkcd_password as xp
+
+
+# upper bound on passphrases per request
+MAX_COUNT = 10000
+
+# upper bound on words drawn per request (count * numwords), so that no
+# request holds up the event loop for long
+MAX_WORDS = 100000
+
+# number of recent request latencies kept for percentiles
+LATENCY_WINDOW = 10000
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found",
+            405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+    """ An invalid request, reported to the client with status 400. """
+
+
+class ServiceStats(object):
+    """
+    Request, error and passphrase counters with a window of recent
+    latencies.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.passphrases = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, seconds, status, passphrases):
+        self.requests += 1
+        if status != 200:
+            self.errors += 1
+        self.passphrases += passphrases
+        self.latencies.append(seconds)
+
+    def report(self):
+        """
+        Return the counters as a JSON-serializable dictionary. Latencies
+        are in microseconds.
+        """
+        uptime = time.time() - self.started
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            rank = min(len(latencies) - 1, int(p / 100.0 * len(latencies)))
+            return round(latencies[rank] * 1e6, 1)
+
+        return {
+            "uptime_seconds": round(uptime, 3),
+            "requests": self.requests,
+            "errors": self.errors,
+            "passphrases": self.passphrases,
+            "requests_per_second": round(self.requests / uptime, 3),
+            "passphrases_per_second": round(self.passphrases / uptime, 3),
+            "latency_us": {
+                "mean": (round(sum(latencies) / len(latencies) * 1e6, 1)
+                         if latencies else None),
+                "p50": percentile(50),
+                "p90": percentile(90),
+                "p99": percentile(99),
+                "max": percentile(100),
+            },
+        }
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ("1", "true", "yes", "on")
+
+
+def _parse_str(options, name, default):
+    value = options.get(name, default)
+    if not isinstance(value, str):
+        raise RequestError("{0} must be a string".format(name))
+    return value
+
+
+def _parse_int(options, name, default, low, high):
+    try:
+        value = int(options.get(name, default))
+    except (TypeError, ValueError):
+        raise RequestError("{0} must be an integer".format(name))
+    if not low <= value <= high:
+        raise RequestError(
+            "{0} must be between {1} and {2}".format(name, low, high))
+    return value
+
+
+class PassphraseService(object):
+    """
+    Generates passphrases for requests from preloaded wordlists, given as
+    a {name: wordlist} dictionary. The first name is the default.
+    """
+
+    def __init__(self, wordlists, default=None):
+        # read-only, so that their indexes are built once (see
+        # `xkcd_password.wordlist_derived()`)
+        self.wordlists = dict(
+            (name, tuple(words) if isinstance(words, list) else words)
+            for name, words in wordlists.items())
+        self.default = default or next(iter(wordlists))
+        self.stats = ServiceStats()
+        for wordlist in self.wordlists.values():
+            xp.prefix_index(wordlist)
+
+    def passphrases(self, options):
+        """
+        Return a response dictionary for a passphrase request.
+        """
+        name = _parse_str(options, "wordlist", self.default)
+        if name not in self.wordlists:
+            raise RequestError("Unknown wordlist: {0}".format(name))
+        wordlist = self.wordlists[name]
+
+        case = _parse_str(options, "case", "lower")
+        if case not in xp.CASE_METHODS:
+            raise RequestError("Unknown case: {0}".format(case))
+
+        acrostic = False
+        if options.get("acrostic"):
+            acrostic = _parse_str(options, "acrostic", None)
+            index = xp.prefix_index(wordlist)
+            for prefix in xp.acrostic_prefixes(acrostic):
+                if not index.count(prefix):
+                    raise RequestError(
+                        "No words found starting with " + prefix)
+
+        # a string of delimiters, or a list of them
+        valid_delimiters = options.get("valid_delimiters")
+        if isinstance(valid_delimiters, str):
+            valid_delimiters = list(valid_delimiters)
+        elif valid_delimiters and (
+                not isinstance(valid_delimiters, list) or
+                not all(isinstance(d, str) for d in valid_delimiters)):
+            raise RequestError(
+                "valid_delimiters must be a string or a list of strings")
+        valid_delimiters = valid_delimiters or xp.DEFAULT_DELIMITERS
+
+        count = _parse_int(options, "count", 1, 1, MAX_COUNT)
+        numwords = _parse_int(options, "numwords", 6, 1, 1000)
+        if count * numwords > MAX_WORDS:
+            raise RequestError("count * numwords must be at most {0}"
+                               .format(MAX_WORDS))
+        passwds = xp.generate_xkcdpasswords(
+            wordlist,
+            count,
+            numwords=numwords,
+            acrostic=acrostic,
+            delimiter=_parse_str(options, "delimiter", " "),
+            random_delimiters=_parse_bool(
+                options.get("random_delimiters", False)),
+            valid_delimiters=valid_delimiters,
+            case=case)
+
+        if "count" in options:
+            return {"passphrases": passwds}
+        return {"passphrase": passwds[0]}
+
+    def handle(self, method, target, body=b""):
+        """
+        Handle a request, returning (status, response dictionary,
+        number of passphrases generated).
+        """
+        url = urlsplit(target)
+        if url.path == "/stats":
+            if method != "GET":
+                return 405, {"error": "Use GET"}, 0
+            return 200, self.stats.report(), 0
+
+        if url.path != "/passphrase":
+            return 404, {"error": "Not found"}, 0
+
+        try:
+            if method == "GET":
+                options = dict(parse_qsl(url.query))
+            elif method == "POST":
+                options = json.loads(body.decode("utf-8")) if body else {}
+                if not isinstance(options, dict):
+                    raise RequestError("Expected a JSON object")
+            else:
+                return 405, {"error": "Use GET or POST"}, 0
+            response = self.passphrases(options)
+        except (RequestError, ValueError) as exc:
+            return 400, {"error": str(exc)}, 0
+        except SystemExit as exc:
+            # the generator's errors for the command line
+            return 400, {"error": str(exc).strip()}, 0
+        except Exception:
+            traceback.print_exc()
+            return 500, {"error": "Internal server error"}, 0
+
+        return 200, response, len(response.get("passphrases", [None]))
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = \
+                        request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                body = b""
+                length = int(headers.get("content-length") or 0)
+                if length:
+                    body = await reader.readexactly(length)
+
+                start = time.perf_counter()
+                status, response, generated = self.handle(method, target,
+                                                          body)
+                payload = json.dumps(response).encode("utf-8")
+                keep_alive = (
+                    version == "HTTP/1.1" and
+                    headers.get("connection", "").lower() != "close")
+                writer.write(
+                    "HTTP/1.1 {0} {1}\r\n"
+                    "Content-Type: application/json\r\n"
+                    "Content-Length: {2}\r\n"
+                    "Connection: {3}\r\n\r\n".format(
+                        status, _REASONS[status], len(payload),
+                        "keep-alive" if keep_alive else "close"
+                    ).encode("latin-1") + payload)
+                self.stats.record(time.perf_counter() - start, status,
+                                  generated)
+
+                if not keep_alive:
+                    break
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def serve(self, host="127.0.0.1", port=8000):
+        """
+        Serve requests until interrupted.
+        """
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        server = loop.run_until_complete(
+            asyncio.start_server(self._serve_connection, host, port))
+        sys.stderr.write("Serving passphrases on http://{0}:{1}/\n".format(
+            host, port))
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+            loop.close()
+
+
+def main(argv=None):
+    """ Mainline code for `xkcdpass serve`. """
+
+    if argv is None:
+        argv = sys.argv
+
+    parser = argparse.ArgumentParser(
+        prog="{0} serve".format(os.path.basename(argv[0])),
+        description="Serve passphrases over HTTP as JSON.")
+    parser.add_argument(
+        "--host",
+        dest="host", default="127.0.0.1", metavar="HOST",
+        help="Listen on HOST (default: 127.0.0.1).")
+    parser.add_argument(
+        "--port",
+        dest="port", type=int, default=8000, metavar="PORT",
+        help="Listen on PORT (default: 8000).")
+    parser.add_argument(
+        "-w", "--wordfile",
+        dest="wordfiles", action="append", metavar="WORDFILE",
+        help=(
+            "Preload WORDFILE; may be given several times. Requests pick "
+            "one with the 'wordlist' option (default: the first)."))
+    parser.add_argument(
+        "--min",
+        dest="min_length", type=int, default=5, metavar="MIN_LENGTH",
+        help="Use words with at least MIN_LENGTH characters.")
+    parser.add_argument(
+        "--max",
+        dest="max_length", type=int, default=9, metavar="MAX_LENGTH",
+        help="Use words with at most MAX_LENGTH characters.")
+    parser.add_argument(
+        "-v", "--valid-chars",
+        dest="valid_chars", default=".", metavar="VALID_CHARS",
+        help="Use words matching the regex pattern VALID_CHARS.")
+    parser.add_argument(
+        "--exclude-substrings",
+        dest="exclude_substrings", default=None, metavar="FILE",
+        help="Leave out words containing any substring listed in FILE.")
+    options = parser.parse_args(argv[2:])
+
+    wordfiles = options.wordfiles or [xp.DEFAULT_WORDFILE]
+    wordlists = {}
+    for name in wordfiles:
+        wordlists[name] = xp.generate_wordlist(
+            wordfile=name,
+            min_length=options.min_length,
+            max_length=options.max_length,
+            valid_chars=options.valid_chars,
+            exclude_substrings=options.exclude_substrings)
+
+    PassphraseService(wordlists, default=wordfiles[0]).serve(
+        options.host, options.port)
+    return 0
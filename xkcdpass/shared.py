@@ -0,0 +1,243 @@
+# encoding: utf-8
+
+"""
+Wordlists shared between processes.
+
+The first process to need a filtered wordlist publishes it, in the
+compiled wordlist format, as a named memory-mapped file under SHARED_DIR
+(/dev/shm where available). Other processes, such as the workers of a
+gunicorn or uwsgi server, attach to the same mapping without parsing or
+copying anything, so the words are held in memory once per host.
+
+Words are stored in the canonical order of compiled wordlists (by length,
+then alphabetically), so every process sees the same wordlist regardless
+of its hash seed.
+
+The files live in a directory of SHARED_DIR private to the user (mode
+0700), and their names carry the hash of their contents. A wordlist is
+attached only if the directory and the file belong to the user, neither
+is writable by others and the contents match the hash, so that another
+local user can't plant a wordlist by creating the file first.
+"""
+
+import hashlib
+import mmap
+import os
+import os.path
+import stat
+import sys
+import tempfile
+
+from xkcdpass import compiled
+from xkcdpass import compressed
+from xkcdpass import xkcd_password as xp
+
+
+if os.path.isdir("/dev/shm"):
+    SHARED_DIR = "/dev/shm"
+else:
+    SHARED_DIR = tempfile.gettempdir()
+
+KEY_PREFIX = "xkcdpass-"
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def _owned(st):
+    # owned by this user and writable by no one else; there are no user
+    # ids to compare without os.getuid(), as on Windows
+    if not hasattr(os, "getuid"):
+        return True
+    return st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+
+def _dir_path():
+    if hasattr(os, "getuid"):
+        return os.path.join(SHARED_DIR, KEY_PREFIX + str(os.getuid()))
+    return os.path.join(SHARED_DIR, KEY_PREFIX + "shared")
+
+
+def _private_dir():
+    """
+    Return this user's directory under SHARED_DIR, created if need be, or
+    None if it isn't private (e.g. another user created it first).
+    """
+    path = _dir_path()
+    try:
+        os.mkdir(path, 0o700)
+    except OSError:
+        pass
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(st.st_mode) or not _owned(st):
+        return None
+    if hasattr(os, "getuid") and st.st_mode & 0o077:
+        return None
+    return path
+
+
+def _path(directory, key, digest):
+    return os.path.join(directory, "{0}.{1}{2}".format(
+        key, digest, compiled.COMPILED_SUFFIX))
+
+
+def _load_verified(path, digest):
+    """
+    Memory-map the compiled wordlist at path if it is a regular file of
+    this user's and its contents hash to digest, else return None.
+    """
+    flags = os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0) | \
+        getattr(os, "O_BINARY", 0)
+    try:
+        fd = os.open(path, flags)
+    except (IOError, OSError):
+        return None
+    try:
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode) or not _owned(st) or \
+           not st.st_size:
+            return None
+        buf = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    except (IOError, OSError, ValueError):
+        return None
+    finally:
+        os.close(fd)
+    if _digest(buf) != digest:
+        buf.close()
+        return None
+    return compiled.CompiledWordlist(buf)
+
+
+def content_key(packed):
+    """
+    Return the key of a packed wordlist, derived from its contents.
+    """
+    return KEY_PREFIX + _digest(packed)
+
+
+def wordlist_key(wordfile=None, min_length=5, max_length=9, valid_chars='.',
+                 exclude_substrings=None):
+    """
+    Return the key under which the wordlist generated from these options
+    is shared. The key is derived from the wordfiles' signatures (path,
+    modification time and size) and the filtering options rather than
+    from the words, so that it can be computed without loading them; the
+    hash of the words themselves is in the name of the published file
+    and checked on attach. Raises ValueError for standard input ("-"),
+    which has no signature, and for wordfiles that can't be found.
+    """
+    if wordfile is None:
+        wordfile = xp.DEFAULT_WORDFILE
+    paths = [xp.locate_wordfile(wf) for wf in wordfile.split(',')]
+    if compressed.STDIN in paths:
+        raise ValueError("Can't share a wordlist read from standard input")
+    if None in paths:
+        raise ValueError("Wordfile not found: {0}".format(wordfile))
+    signatures = tuple(xp.wordfile_signature(path) for path in paths)
+    options = (signatures, min_length, max_length, valid_chars)
+    if exclude_substrings is not None:
+        options += (xp.substrings_key(exclude_substrings),)
+    options = repr(options)
+    return KEY_PREFIX + hashlib.sha256(options.encode("utf-8")).hexdigest()[:32]
+
+
+def publish_wordlist(words, key=None):
+    """
+    Publish words for other processes to attach to, under key or, by
+    default, a key derived from the contents. Returns the key. Raises
+    OSError if SHARED_DIR holds no private directory for this user.
+    """
+    packed = compiled.pack_words(words)
+    if key is None:
+        key = content_key(packed)
+    directory = _private_dir()
+    if directory is None:
+        raise OSError("Not a private directory of this user: " +
+                      _dir_path())
+    digest = _digest(packed)
+    path = _path(directory, key, digest)
+    if _load_verified(path, digest) is not None:
+        return key
+
+    # write to a private file and rename it into place, so that other
+    # processes never see a partially written wordlist
+    fd, tmp = tempfile.mkstemp(prefix=key, dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(packed)
+        getattr(os, "replace", os.rename)(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return key
+
+
+def _published(key):
+    """
+    Return the (path, digest) of the files published under key.
+    """
+    directory = _private_dir()
+    if directory is None:
+        return []
+    prefix, suffix = key + ".", compiled.COMPILED_SUFFIX
+    try:
+        names = sorted(os.listdir(directory))
+    except (IOError, OSError):
+        return []
+    return [(os.path.join(directory, name), name[len(prefix):-len(suffix)])
+            for name in names
+            if name.startswith(prefix) and name.endswith(suffix)]
+
+
+def attach_wordlist(key):
+    """
+    Return a read-only view of the wordlist published under key, or None
+    if there is none that checks out.
+    """
+    for path, digest in _published(key):
+        wordlist = _load_verified(path, digest)
+        if wordlist is not None:
+            return wordlist
+    return None
+
+
+def release_wordlist(key):
+    """
+    Remove the wordlist published under key. Processes already attached
+    to it keep their mapping.
+    """
+    for path, _ in _published(key):
+        try:
+            os.unlink(path)
+        except (IOError, OSError):
+            pass
+
+
+def shared_wordlist(wordfile=None, min_length=5, max_length=9,
+                    valid_chars='.', exclude_substrings=None):
+    """
+    Like `generate_wordlist()`, but attach to a wordlist published by
+    another process if there is one, and publish it otherwise.
+    """
+    key = wordlist_key(wordfile, min_length, max_length, valid_chars,
+                       exclude_substrings)
+    wordlist = attach_wordlist(key)
+    if wordlist is None:
+        words = xp.generate_wordlist(wordfile=wordfile,
+                                     min_length=min_length,
+                                     max_length=max_length,
+                                     valid_chars=valid_chars,
+                                     exclude_substrings=exclude_substrings,
+                                     cache=None)
+        try:
+            publish_wordlist(words, key)
+        except (IOError, OSError) as e:
+            sys.stderr.write("WARNING: Can't share the wordlist ({0}); "
+                             "using a private copy.\n".format(e))
+            return words
+        wordlist = attach_wordlist(key)
+    return wordlist
@@ -4,15 +4,37 @@
 from __future__ import print_function
 
 import argparse
+import errno
+import heapq
 import math
+import multiprocessing
+import multiprocessing.pool
 import os
 import os.path
 import random
 import re
 import sys
-
+import threading
+import time
+import weakref
+
+from array import array
+from binascii import hexlify, unhexlify
+from bisect import bisect_left
+from collections import OrderedDict
 from io import open
 
+try:
+    from xkcdpass import compiled, compressed, denylists, numpy_backend
+    from xkcdpass import permutation
+except ImportError:
+    # running this file directly as a script
+    import compiled
+    import compressed
+    import denylists
+    import numpy_backend
+    import permutation
+
 __LICENSE__ = """
 Copyright (c) 2011 - 2023, Steven Tobin and Contributors.
 All rights reserved.
@@ -59,12 +81,268 @@ except AttributeError as ex:
 if sys.version_info[0] >= 3:
     raw_input = input
     xrange = range
+    unichr = chr
 
 
 DEFAULT_WORDFILE = "eff-long"
 DEFAULT_DELIMITERS = [" ", "!", "@", "#", "$", "%", "^", "&", "*", "(", ")",
                       "0", "1", "2", "3", "4", "5", "6", "7", "8", "9"]
 
+# number of passphrases generated per block by the batch API
+BATCH_SIZE = 4096
+
+# implementations of the batch API; "numpy" needs NumPy to be installed
+BACKENDS = ("python", "numpy")
+
+# number of passphrases generated per task by parallel generation
+PARALLEL_CHUNK_SIZE = 20000
+
+# kinds of worker pool used to load several wordfiles concurrently
+LOAD_EXECUTORS = ("thread", "process")
+
+# consecutive passphrases found in a denylist before giving up
+DENYLIST_MAX_ATTEMPTS = 100000
+
+# length of the permutation keys drawn by --permutation-key new
+PERMUTATION_KEY_BYTES = 16
+
+
+_clock = getattr(time, "perf_counter", time.time)
+
+
+class Stats(object):
+    """
+    Timers and counters for the stages of wordlist loading and passphrase
+    generation, collected while enabled with `enable_stats()`.
+
+    Hooks are called as hook(kind, name, value) for every update, where
+    kind is "time" (value in seconds) or "count".
+    """
+
+    def __init__(self):
+        self.timers = {}
+        self.calls = {}
+        self.counters = {}
+        self.hooks = []
+        self._lock = threading.Lock()
+
+    def add_time(self, stage, seconds):
+        with self._lock:
+            self.timers[stage] = self.timers.get(stage, 0.0) + seconds
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+        for hook in self.hooks:
+            hook("time", stage, seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+        for hook in self.hooks:
+            hook("count", name, n)
+
+    def report(self):
+        """
+        Return the collected timers and counters as a dictionary.
+        """
+        return {
+            "timers": dict((stage, {"seconds": self.timers[stage],
+                                    "calls": self.calls[stage]})
+                           for stage in self.timers),
+            "counters": dict(self.counters),
+        }
+
+    def format_report(self):
+        """
+        Return a human readable breakdown of the collected statistics.
+        """
+        lines = ["Timings:"]
+        for stage in sorted(self.timers, key=self.timers.get, reverse=True):
+            lines.append("  {0:<20} {1:12.6f} s  ({2} calls)".format(
+                stage, self.timers[stage], self.calls[stage]))
+        lines.append("Counters:")
+        for name in sorted(self.counters):
+            lines.append("  {0:<20} {1:12d}".format(name, self.counters[name]))
+        return "\n".join(lines) + "\n"
+
+
+# the active Stats collector, or None when instrumentation is disabled;
+# instrumented code checks this once per call, not per word
+STATS = None
+
+
+def enable_stats(hook=None):
+    """
+    Start collecting statistics, optionally passing every update to
+    hook(kind, name, value). Returns the Stats collector.
+    """
+    global STATS
+    STATS = Stats()
+    if hook is not None:
+        STATS.hooks.append(hook)
+    return STATS
+
+
+def disable_stats():
+    """
+    Stop collecting statistics, returning the Stats collected so far.
+    """
+    global STATS
+    stats, STATS = STATS, None
+    return stats
+
+
+def random_bytes(n):
+    """
+    Return n random bytes from the OS CSPRNG, or from the weak generator
+    if one was explicitly allowed.
+    """
+    if rng is random.SystemRandom:
+        return os.urandom(n)
+    return bytes(bytearray(rng().getrandbits(8) for i in xrange(n)))
+
+
+def _bytes_to_int(data):
+    return int(hexlify(data), 16) if data else 0
+
+
+def _draw_typecodes():
+    # "Q" needs Python 3; "L" is 64 bits wide on most 64-bit Unix builds
+    typecodes = {}
+    for code in ("B", "H", "I", "L", "Q"):
+        try:
+            typecodes.setdefault(8 * array(code).itemsize, code)
+        except ValueError:
+            pass
+    return sorted(typecodes.items())
+
+
+# array typecodes able to hold an unbiased draw of up to 8, 16, 32, 64 bits
+_DRAW_TYPECODES = _draw_typecodes()
+
+# array.frombytes() is called fromstring() on Python 2
+_array_frombytes = getattr(array, "frombytes", None) or array.fromstring
+
+_entropy_pools = weakref.WeakSet()
+
+
+class EntropyPool(object):
+    """
+    Buffered source of secure randomness.
+
+    Bytes are read from `random_bytes` in large chunks and turned into
+    uniformly distributed indices by rejection sampling, so drawing many
+    words costs a handful of system calls rather than one per word.
+    """
+
+    def __init__(self, chunk_size=65536):
+        self.chunk_size = chunk_size
+        self.bytes_consumed = 0
+        self._buffer = b""
+        self._pos = 0
+        self._pid = os.getpid()
+        _entropy_pools.add(self)
+
+    def reset(self):
+        """
+        Discard any buffered bytes.
+        """
+        self._buffer = b""
+        self._pos = 0
+        self._pid = os.getpid()
+
+    def read(self, n):
+        """
+        Return n random bytes.
+        """
+        if self._pos + n > len(self._buffer):
+            self._buffer = (self._buffer[self._pos:] +
+                            random_bytes(max(n, self.chunk_size)))
+            self._pos = 0
+        data = self._buffer[self._pos:self._pos + n]
+        self._pos += n
+        self.bytes_consumed += n
+        if STATS is not None:
+            STATS.count("rng_bytes", n)
+        return data
+
+    def randbelow(self, n):
+        """
+        Return a random integer in the range [0, n).
+        """
+        if n <= 0:
+            raise ValueError("randbelow() requires a positive bound")
+        bits = (n - 1).bit_length()
+        mask = (1 << bits) - 1
+        nbytes = (bits + 7) // 8
+        while True:
+            value = _bytes_to_int(self.read(nbytes)) & mask
+            if value < n:
+                return value
+
+    def randbelow_many(self, n, k):
+        """
+        Return a list of k random integers in the range [0, n).
+        """
+        if n <= 0:
+            raise ValueError("randbelow_many() requires a positive bound")
+        if n == 1:
+            return [0] * k
+        bits = (n - 1).bit_length()
+        for width, typecode in _DRAW_TYPECODES:
+            if bits <= width:
+                break
+        else:
+            return [self.randbelow(n) for i in xrange(k)]
+
+        mask = (1 << bits) - 1
+        itemsize = width // 8
+        if n == mask + 1:
+            # every masked draw is accepted
+            draws = array(typecode)
+            _array_frombytes(draws, self.read(itemsize * k))
+            return [v & mask for v in draws]
+
+        values = []
+        while len(values) < k:
+            # a masked draw is accepted with probability above 1/2
+            wanted = k - len(values)
+            draws = array(typecode)
+            _array_frombytes(draws,
+                             self.read(itemsize * (wanted + wanted // 2 + 8)))
+            values.extend([v & mask for v in draws if v & mask < n])
+        del values[k:]
+        return values
+
+    def choice(self, seq):
+        """
+        Return a random element from the non-empty sequence seq.
+        """
+        return seq[self.randbelow(len(seq))]
+
+
+def _reset_entropy_pools():
+    # a forked child must not replay bytes buffered by its parent
+    for pool in list(_entropy_pools):
+        pool.reset()
+
+
+_FORK_HOOKS = hasattr(os, "register_at_fork")
+if _FORK_HOOKS:
+    os.register_at_fork(after_in_child=_reset_entropy_pools)
+
+_thread_state = threading.local()
+
+
+def entropy_pool():
+    """
+    Return the EntropyPool of the current thread.
+    """
+    pool = getattr(_thread_state, "pool", None)
+    if pool is None:
+        pool = _thread_state.pool = EntropyPool()
+    elif not _FORK_HOOKS and pool._pid != os.getpid():
+        pool.reset()
+    return pool
+
 
 def validate_options(parser, options):
     """
@@ -74,15 +352,113 @@ def validate_options(parser, options):
     if options.max_length < options.min_length:
         raise SystemExit("Error: Maximum word length can't be less than minimum word length.\n")
 
+    if options.numwords < 1:
+        raise SystemExit("Error: The number of words must be at least 1.\n")
+
     if not locate_wordfile(options.wordfile):
         raise SystemExit("Wordfile not found. Is the path correct?\n")
 
-
-def locate_wordfile(wordfile=None):
+    exclude_substrings = getattr(options, "exclude_substrings", None)
+    if exclude_substrings and not os.path.isfile(exclude_substrings):
+        raise SystemExit("Error: Substrings file not found. Is the path correct?\n")
+
+    denylist = getattr(options, "denylist", None)
+    if denylist and not os.path.isfile(denylist):
+        raise SystemExit("Error: Denylist not found. Is the path correct?\n")
+
+    if options.interactive and options.wordfile and \
+       compressed.STDIN in options.wordfile.split(","):
+        raise SystemExit("Error: Can't read the wordfile from standard input in interactive mode.\n")
+
+    if options.interactive and getattr(options, "output", None):
+        raise SystemExit("Error: --output can't be combined with --interactive.\n")
+
+    min_total = getattr(options, "min_total_length", None)
+    max_total = getattr(options, "max_total_length", None)
+    if min_total is not None and max_total is not None and \
+       max_total < min_total:
+        raise SystemExit("Error: Maximum total length can't be less than minimum total length.\n")
+
+    weights = getattr(options, "weights", None)
+    if weights and not os.path.isfile(weights):
+        raise SystemExit("Error: Weights file not found. Is the path correct?\n")
+    if weights and (options.acrostic or min_total is not None or
+                    max_total is not None):
+        raise SystemExit("Error: --weights can't be combined with --acrostic or total length limits.\n")
+
+    sources = source_policy(getattr(options, "sources", None))
+    if sources not in (None, "merged") and \
+       (weights or options.acrostic or min_total is not None or
+            max_total is not None):
+        raise SystemExit("Error: --sources can't be combined with --weights, --acrostic or total length limits.\n")
+    if isinstance(sources, tuple):
+        names = (options.wordfile or DEFAULT_WORDFILE).split(",")
+        for source in sources:
+            if source not in names and not (
+                    source.isdigit() and 1 <= int(source) <= len(names)):
+                raise SystemExit("Error: Unknown source in --sources: {0}\n"
+                                 .format(source))
+
+    key = getattr(options, "permutation_key", None)
+    try:
+        permutation.parse_shard(getattr(options, "shard", "1/1"))
+    except ValueError as exc:
+        raise SystemExit("Error: {0}.\n".format(exc))
+    if not key and (getattr(options, "shard", "1/1") != "1/1" or
+                    getattr(options, "shard_start", 0)):
+        raise SystemExit("Error: --shard and --shard-start need a --permutation-key.\n")
+    if key and key != "new":
+        try:
+            if not unhexlify(key):
+                raise ValueError
+        except (TypeError, ValueError):
+            raise SystemExit("Error: The permutation key must be a non-empty hexadecimal string or 'new'.\n")
+    if key and (weights or min_total is not None or max_total is not None or
+                options.unique or options.interactive or options.jobs != 1 or
+                options.case == "random-chars" or
+                sources not in (None, "merged") and
+                not isinstance(sources, tuple)):
+        raise SystemExit("Error: --permutation-key can't be combined with --weights, total length limits, --unique, --interactive, --jobs, --case random-chars or the proportional and balanced --sources.\n")
+    if getattr(options, "shard_start", 0) < 0:
+        raise SystemExit("Error: The shard start can't be negative.\n")
+
+    if getattr(options, "pad_digits", 0) < 0 or \
+       getattr(options, "pad_symbols", 0) < 0:
+        raise SystemExit("Error: Padding length can't be negative.\n")
+
+    if options.jobs < 0 or getattr(options, "load_jobs", 1) < 0:
+        raise SystemExit("Error: Number of jobs can't be negative.\n")
+
+    if getattr(options, "backend", "python") == "numpy" and \
+       not numpy_backend.available():
+        sys.stderr.write("WARNING: NumPy is not installed, "
+                         "using the 'python' backend.\n")
+
+
+def locate_wordfile(wordfile=None, prefer_compiled=True):
     """
     Locate a wordfile from provided name/path. Return a path to wordfile
     either from static directory, the provided path or use a default.
+    A compressed copy (e.g. NAME.gz) is found in place of a missing NAME,
+    and "-" (standard input) is returned as is.
+
+    If prefer_compiled is set, an up-to-date compiled sibling (see
+    `xkcdpass.compiled`) is returned in place of a plain text wordfile.
     """
+    stats = STATS
+    if stats is not None:
+        start = _clock()
+        try:
+            return _locate_wordfile(wordfile, prefer_compiled)
+        finally:
+            stats.add_time("locate", _clock() - start)
+    return _locate_wordfile(wordfile, prefer_compiled)
+
+
+def _locate_wordfile(wordfile, prefer_compiled):
+    if wordfile == compressed.STDIN:
+        return wordfile
+
     common_word_files = []
     static_dir = os.path.join(
         os.path.dirname(os.path.abspath(__file__)),
@@ -101,40 +477,772 @@ def locate_wordfile(wordfile=None):
         "/usr/share/dict/words"])
 
     for wfile in common_word_files:
-        if os.path.isfile(wfile):
-            return wfile
+        # the wordfile itself, or a compressed copy of it
+        for candidate in (wfile,) + tuple(wfile + suffix
+                                          for suffix in compressed.SUFFIXES):
+            if os.path.isfile(candidate):
+                if prefer_compiled:
+                    return compiled.compiled_sibling(candidate) or candidate
+                return candidate
+        if prefer_compiled and \
+           os.path.isfile(wfile + compiled.COMPILED_SUFFIX):
+            return wfile + compiled.COMPILED_SUFFIX
+
+
+class WordlistCache(object):
+    """
+    Bounded LRU cache of filtered wordlists.
+
+    Entries are keyed on the resolved wordfile paths, their modification
+    times and sizes, and the filtering options, so an edited wordfile is
+    picked up on the next call while repeated calls with unchanged inputs
+    skip reading and filtering the files entirely.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Return the cached value for key, or None if it is not cached.
+        """
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            # re-insert to mark as most recently used
+            self._entries[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Store value under key, evicting the least recently used entries
+        beyond maxsize.
+        """
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Drop all cached wordlists and reset the statistics.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Return a dictionary of hit/miss statistics.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+
+WORDLIST_CACHE = WordlistCache()
+WORDFILE_INDEX_CACHE = WordlistCache(maxsize=16)
+DERIVED_CACHE = WordlistCache(maxsize=16)
+
+
+def wordfile_signature(path):
+    """
+    Identify the current contents of a wordfile by its real path,
+    modification time and size.
+    """
+    st = os.stat(path)
+    mtime = getattr(st, "st_mtime_ns", st.st_mtime)
+    return (os.path.realpath(path), mtime, st.st_size)
+
+
+class CompactWordlist(object):
+    """
+    Read-only wordlist stored as one string plus an array('I') of offsets
+    instead of a list of separate string objects, using a fraction of the
+    memory. Supports len(), indexing, iteration and `in` like a list.
+    """
+
+    def __init__(self, words):
+        words = list(words)
+        # every word is preceded and followed by a newline
+        self._blob = "\n" + "\n".join(words) + "\n"
+        offsets = array("I", [1])
+        position = 1
+        for word in words:
+            position += len(word) + 1
+            offsets.append(position)
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in xrange(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("wordlist index out of range")
+        return self._blob[self._offsets[index]:self._offsets[index + 1] - 1]
+
+    def __iter__(self):
+        if not len(self):
+            return iter(())
+        return iter(self._blob[1:-1].split("\n"))
+
+    def __contains__(self, word):
+        return "\n" not in word and ("\n" + word + "\n") in self._blob
+
+    def __repr__(self):
+        return "<CompactWordlist of {0} words>".format(len(self))
+
+
+class WordLengthIndex(object):
+    """
+    The distinct words of a wordfile, bucketed by length, so that any
+    --min/--max window is a concatenation of buckets rather than a rescan.
+    Words within a bucket are sorted, giving the same canonical order as
+    compiled wordlists. Buckets are kept as CompactWordlists.
+    """
+
+    def __init__(self, words):
+        buckets = {}
+        for word in set(words):
+            buckets.setdefault(len(word), []).append(word)
+        self.buckets = dict((n, CompactWordlist(sorted(bucket)))
+                            for n, bucket in buckets.items())
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+    def window(self, min_length, max_length):
+        """
+        Return the words whose length lies between min_length and
+        max_length inclusive.
+        """
+        words = []
+        for n in sorted(self.buckets):
+            if min_length <= n <= max_length:
+                words.extend(self.buckets[n])
+        return words
+
+    def length_counts(self, min_length, max_length):
+        """
+        Return a {length: number of words} mapping for the given window.
+        """
+        return dict((n, len(bucket)) for n, bucket in self.buckets.items()
+                    if min_length <= n <= max_length)
+
+
+def wordfile_index(wordfile, cache=WORDFILE_INDEX_CACHE):
+    """
+    Return a length index for the wordfile at the given path: a view of the
+    file itself for compiled wordlists, or a WordLengthIndex built from a
+    single read of a plain text wordfile, decompressed as it is read if it
+    is compressed (see `xkcdpass.compressed`).
+    """
+    key = None
+    if cache is not None:
+        key = wordfile_signature(wordfile)
+        index = cache.get(key)
+        if index is not None:
+            return index
+
+    stats = STATS
+    if stats is not None:
+        start = _clock()
+
+    if wordfile != compressed.STDIN and compiled.is_compiled(wordfile):
+        index = compiled.load_compiled(wordfile)
+    else:
+        with compressed.open_wordfile(wordfile) as wlf:
+            index = WordLengthIndex(line.strip() for line in wlf)
+
+    if stats is not None:
+        stats.add_time("read", _clock() - start)
+        stats.count("words_read", len(index))
+
+    if cache is not None:
+        cache.put(key, index)
+    return index
+
+
+FILTER_CACHE = WordlistCache(maxsize=32)
+
+# a valid_chars pattern that is a single character class, e.g. "[a-z]"
+_CHAR_CLASS = re.compile(r"\[(\^?)(\]?(?:\\.|[^\\\]])*)\]\Z", re.DOTALL)
+_CLASS_ESCAPE = re.compile(r"x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|[^0-9A-Za-z]",
+                           re.DOTALL)
+
+
+def _class_chars(body):
+    """
+    Return the frozenset of characters listed in the body of a character
+    class, or None if it uses anything but literals, escaped punctuation,
+    \\xHH and \\uHHHH escapes and ranges.
+    """
+    # (character, escaped) tokens, so that an escaped "-" is a literal
+    tokens = []
+    i = 0
+    while i < len(body):
+        if body[i] == "\\":
+            escape = _CLASS_ESCAPE.match(body, i + 1)
+            if escape is None:
+                return None
+            text = escape.group()
+            tokens.append((unichr(int(text[1:], 16)) if len(text) > 1
+                           else text, True))
+            i = escape.end()
+        elif body[i] == "[" or body[i:i + 2] in ("&&", "--", "||", "~~"):
+            # nested sets and set operations, reserved by the re module
+            return None
+        else:
+            tokens.append((body[i], False))
+            i += 1
+
+    chars = set()
+    i = 0
+    while i < len(tokens):
+        if i + 2 < len(tokens) and tokens[i + 1] == ("-", False):
+            first, last = ord(tokens[i][0]), ord(tokens[i + 2][0])
+            if first > last:
+                # leave reporting the bad range to the re module
+                return None
+            chars.update(unichr(c) for c in xrange(first, last + 1))
+            i += 3
+        else:
+            chars.add(tokens[i][0])
+            i += 1
+    return frozenset(chars)
+
+
+def _ascii_chars(first, last):
+    return frozenset(unichr(c) for c in xrange(ord(first), ord(last) + 1))
+
+
+# predicates equivalent to membership of common character sets, using
+# string methods that run in C; isascii() needs Python 3.7
+_CHARSET_PREDICATES = []
+if hasattr(str, "isascii"):
+    _CHARSET_PREDICATES = [
+        (_ascii_chars("a", "z"),
+         lambda w: w.isascii() and w.isalpha() and w.islower()),
+        (_ascii_chars("A", "Z"),
+         lambda w: w.isascii() and w.isalpha() and w.isupper()),
+        (_ascii_chars("a", "z") | _ascii_chars("A", "Z"),
+         lambda w: w.isascii() and w.isalpha()),
+        (_ascii_chars("0", "9"),
+         lambda w: w.isascii() and w.isdigit()),
+        (_ascii_chars("a", "z") | _ascii_chars("A", "Z") |
+         _ascii_chars("0", "9"),
+         lambda w: w.isascii() and w.isalnum()),
+        (_ascii_chars(u"\x00", u"\x7f"), str.isascii),
+    ]
+
+
+def word_filter(valid_chars, min_length=5, max_length=9):
+    """
+    Return a function taking a list of words and returning those that
+    match "^{valid_chars}{min_length,max_length}$", as generate_wordlist
+    does. When valid_chars matches a single character ('.' or a character
+    class), words are expected to already lie within the length window.
+
+    A valid_chars that is a single character class, such as '[a-z]' or
+    '[^0-9]', is checked with a set or string methods instead of the
+    regular expression. Filters are cached in FILTER_CACHE.
+    """
+    key = (valid_chars, min_length, max_length)
+    word_filter = FILTER_CACHE.get(key)
+    if word_filter is not None:
+        return word_filter
+
+    chars = None
+    match = _CHAR_CLASS.match(valid_chars)
+    if match is not None:
+        chars = _class_chars(match.group(2))
+
+    if chars is None:
+        regexp_match = re.compile("^{0}{{{1},{2}}}$".format(
+            valid_chars, min_length, max_length)).match
+
+        def word_filter(words):
+            return [w for w in words if regexp_match(w) is not None]
+    elif match.group(1):
+        def word_filter(words):
+            return list(filter(chars.isdisjoint, words))
+    else:
+        for charset, predicate in _CHARSET_PREDICATES:
+            if chars == charset:
+                break
+        else:
+            predicate = chars.issuperset
+
+        def word_filter(words):
+            return list(filter(predicate, words))
+
+    FILTER_CACHE.put(key, word_filter)
+    return word_filter
+
+
+class SubstringMatcher(object):
+    """
+    Aho-Corasick automaton telling whether words contain any of a set of
+    substrings, ignoring case, in a single pass over each word.
+
+    The automaton is stored as a DFA: each state is a dict mapping the
+    characters of the substrings to the next state, with the failure
+    links folded in, so every character of a word costs one dict lookup.
+    Its size grows with the number of trie states times the number of
+    distinct characters, which is small for thousands of substrings.
+    """
+
+    def __init__(self, substrings):
+        substrings = sorted(set(s.lower() for s in substrings if s))
+        self.count = len(substrings)
+
+        # the trie of the substrings, its states numbered breadth-first
+        goto = [{}]
+        terminal = [False]
+        for substring in substrings:
+            state = 0
+            for c in substring:
+                following = goto[state].get(c)
+                if following is None:
+                    following = len(goto)
+                    goto[state][c] = following
+                    goto.append({})
+                    terminal.append(False)
+                state = following
+            terminal[state] = True
+
+        # fold the failure links into complete transition tables; states
+        # are visited breadth-first, so the tables of shorter suffixes are
+        # built before they are copied
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = list(goto[0].values())
+        for state in queue:
+            delta[state] = dict(delta[fail[state]])
+            delta[state].update(goto[state])
+            terminal[state] = terminal[state] or terminal[fail[state]]
+            for c, following in goto[state].items():
+                fail[following] = delta[fail[state]].get(c, 0)
+                queue.append(following)
+
+        # every state ending a substring is the same MATCH sentinel, so a
+        # scan stops as soon as it reaches one
+        self._match = {}
+        nodes = [{} for _ in goto]
+        for state, transitions in enumerate(delta):
+            for c, following in transitions.items():
+                nodes[state][c] = (self._match if terminal[following]
+                                   else nodes[following])
+        self._root = nodes[0]
+
+    def __len__(self):
+        return self.count
+
+    def search(self, word):
+        """
+        Return True if word contains any of the substrings.
+        """
+        root, match = self._root, self._match
+        node = root
+        for c in word.lower():
+            node = node.get(c, root)
+            if node is match:
+                return True
+        return False
+
+    def exclude(self, words):
+        """
+        Return the words that contain none of the substrings.
+        """
+        root, match = self._root, self._match
+        kept = []
+        for word in words:
+            node = root
+            for c in word.lower():
+                node = node.get(c, root)
+                if node is match:
+                    break
+            else:
+                kept.append(word)
+        return kept
+
+
+def substrings_key(exclude_substrings):
+    """
+    Return a hashable key identifying exclude_substrings: the signature of
+    a file of substrings, or the sorted distinct substrings of a list.
+    """
+    if exclude_substrings is None:
+        return None
+    if isinstance(exclude_substrings, str):
+        return wordfile_signature(exclude_substrings)
+    return tuple(sorted(set(exclude_substrings)))
+
+
+def substring_matcher(exclude_substrings):
+    """
+    Return the (cached) SubstringMatcher of exclude_substrings: a path to
+    a file of substrings, one per line and possibly compressed, or a list
+    of substrings.
+    """
+    key = ("substrings", substrings_key(exclude_substrings))
+    matcher = FILTER_CACHE.get(key)
+    if matcher is not None:
+        return matcher
+
+    if isinstance(exclude_substrings, str):
+        with compressed.open_wordfile(exclude_substrings) as f:
+            matcher = SubstringMatcher(line.strip() for line in f)
+    else:
+        matcher = SubstringMatcher(exclude_substrings)
+    FILTER_CACHE.put(key, matcher)
+    return matcher
+
+
+def _load_window(wordfile, min_length, max_length, valid_chars, cached,
+                 exclude_substrings=None):
+    """
+    Return (number of words scanned, [(length, sorted words), ...]) for the
+    words of the wordfile at the given path within the length window that
+    match valid_chars and contain none of exclude_substrings. A top-level
+    function so that process pools can run it.
+    """
+    index = wordfile_index(wordfile, WORDFILE_INDEX_CACHE if cached else None)
+    stats = STATS
+    if stats is not None:
+        start = _clock()
+    if valid_chars != '.':
+        matching = word_filter(valid_chars, min_length, max_length)
+    if exclude_substrings is not None:
+        excluding = substring_matcher(exclude_substrings)
+    if valid_chars == '.' or _CHAR_CLASS.match(valid_chars) is not None:
+        lengths = index.length_counts(min_length, max_length)
+    else:
+        # a valid_chars such as '(ab)' may match several characters, so
+        # the length window says nothing about which words match
+        lengths = index.length_counts(0, sys.maxsize)
+    buckets = []
+    for n in sorted(lengths):
+        bucket = index.window(n, n)
+        if valid_chars != '.':
+            bucket = matching(bucket)
+        if exclude_substrings is not None and bucket:
+            bucket = excluding.exclude(bucket)
+        if bucket:
+            buckets.append((n, bucket))
+    if stats is not None:
+        stats.add_time("filter", _clock() - start)
+    return len(index), buckets
+
+
+def _load_windows(wordfiles, min_length, max_length, valid_chars, cached,
+                  workers, executor, exclude_substrings=None):
+    """
+    Run _load_window for every wordfile, in a pool of workers threads or
+    processes when there are several files and workers is not 1.
+    """
+    args = [(wf, min_length, max_length, valid_chars, cached,
+             exclude_substrings) for wf in wordfiles]
+    if workers == 1 or len(wordfiles) < 2:
+        return [_load_window(*a) for a in args]
+
+    if executor not in LOAD_EXECUTORS:
+        raise ValueError("Unknown executor: {0}".format(executor))
+    # worker processes may not share our standard input
+    if executor == "thread" or compressed.STDIN in wordfiles:
+        pool = multiprocessing.pool.ThreadPool(workers or len(wordfiles))
+        try:
+            return pool.map(_load_window_star, args, chunksize=1)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    pool = multiprocessing.Pool(workers or min(len(wordfiles),
+                                               multiprocessing.cpu_count()))
+    try:
+        results = pool.map(_load_window_joined, args, chunksize=1)
+    finally:
+        pool.terminate()
+        pool.join()
+    return [(scanned, [(n, joined.split("\n")) for n, joined in buckets])
+            for scanned, buckets in results]
+
+
+def _load_window_star(args):
+    return _load_window(*args)
+
+
+def _load_window_joined(args):
+    # one string per bucket pickles far faster than a list of words
+    scanned, buckets = _load_window(*args)
+    return scanned, [(n, "\n".join(bucket)) for n, bucket in buckets]
+
+
+def _merge_windows(windows):
+    """
+    Merge the per-file [(length, sorted words), ...] windows into a single
+    deduplicated list in canonical order. Each file's bucket of a length
+    is already sorted, so buckets are merged rather than re-sorted.
+    """
+    by_length = {}
+    for buckets in windows:
+        for n, bucket in buckets:
+            by_length.setdefault(n, []).append(bucket)
+
+    words = []
+    append = words.append
+    for n in sorted(by_length):
+        buckets = by_length[n]
+        if len(buckets) == 1:
+            words.extend(buckets[0])
+            continue
+        last = None
+        for word in heapq.merge(*buckets):
+            if word != last:
+                append(word)
+                last = word
+    return words
 
 
 def generate_wordlist(wordfile=None,
                       min_length=5,
                       max_length=9,
-                      valid_chars='.'):
+                      valid_chars='.',
+                      cache=WORDLIST_CACHE,
+                      compact=False,
+                      workers=1,
+                      executor="thread",
+                      exclude_substrings=None):
     """
     Generate a word list from either a kwarg wordfile, or a system default
     valid_chars is a regular expression match condition (default - all chars)
-    """
+    Words containing any of exclude_substrings (a file of substrings, one
+    per line, or a list), ignoring case, are left out; see
+    `SubstringMatcher`.
+
+    Results are memoized in `cache` (a WordlistCache, or None to disable
+    caching); every call returns a fresh list, a `Wordlist` when cached.
+    With compact=True, a shared read-only CompactWordlist is returned
+    instead.
+
+    Several comma-separated wordfiles are read and filtered concurrently by
+    a pool of workers (0 or None: one per file) of the given executor kind,
+    "thread" or "process", unless workers is 1.
 
-    words = set()
+    Compressed wordfiles are decompressed as they are read. The wordfile
+    "-" is read from standard input, and then nothing is cached.
+    """
 
-    regexp = re.compile("^{0}{{{1},{2}}}$".format(valid_chars,
-                                                  min_length,
-                                                  max_length))
     if wordfile is None:
         wordfile = DEFAULT_WORDFILE
-    for wf in wordfile.split(','):
-        wf = locate_wordfile(wf)
-        # read words from file into wordlist
-        with open(wf, encoding='utf-8') as wlf:
-            for line in wlf:
-                thisword = line.strip()
-                if regexp.match(thisword) is not None:
-                    words.add(thisword)
+    wordfiles = [locate_wordfile(wf) for wf in wordfile.split(',')]
+    if compressed.STDIN in wordfiles:
+        # standard input can be read only once and has no signature
+        cache = None
+
+    key = None
+    if cache is not None:
+        key = (tuple(wordfile_signature(wf) for wf in wordfiles),
+               min_length, max_length, valid_chars, compact,
+               substrings_key(exclude_substrings))
+        cached = cache.get(key)
+        if cached is not None:
+            if STATS is not None:
+                STATS.count("wordlist_cache_hits")
+            return cached if compact else Wordlist(cached, cached)
+
+    windows = []
+    stats = STATS
+    for scanned, buckets in _load_windows(wordfiles, min_length, max_length,
+                                          valid_chars, cache is not None,
+                                          workers, executor,
+                                          exclude_substrings):
+        windows.append(buckets)
+        if stats is not None:
+            accepted = sum(len(bucket) for _, bucket in buckets)
+            stats.count("words_scanned", scanned)
+            stats.count("words_accepted", accepted)
+            stats.count("words_rejected", scanned - accepted)
+
+    # deduplicate across files, keeping the canonical order
+    if stats is not None:
+        start = _clock()
+    words = _merge_windows(windows)
+    if stats is not None and len(windows) > 1:
+        stats.add_time("merge", _clock() - start)
+
     if len(words):
-        return list(words)  # deduplicate, just in case
+        if compact:
+            words = CompactWordlist(words)
+            if cache is not None:
+                cache.put(key, words)
+            return words
+        if cache is None:
+            return words
+        words = tuple(words)
+        cache.put(key, words)
+        return Wordlist(words, words)
     else:
         raise SystemExit("Error: Provided arguments result in emtpy wordlist. (Probably because there aren't any words that match your --min and --max options) Exiting.")
 
 
+class SourcedWordlist(tuple):
+    """
+    The distinct words of several wordfiles, the sources, as a read-only
+    wordlist that remembers which sources each word came from: members[j]
+    is an array('I') of the indices of the words of source names[j].
+    Words can then be drawn per source; see `source_sampler()`.
+
+    Words are kept in the order their sources were added, so that
+    `with_source()` appends a source without touching the words and
+    indices of the existing ones.
+    """
+
+    def __new__(cls, words=()):
+        return tuple.__new__(cls, words)
+
+    def __init__(self, words=()):
+        self.names = []
+        self.members = []
+        self._positions = {}
+
+    def with_source(self, name, words):
+        """
+        Return a new SourcedWordlist with the (distinct) words of source
+        name added. The index arrays of the existing sources are shared,
+        not rebuilt.
+        """
+        positions = dict(self._positions)
+        added = []
+        members = array("I")
+        for word in words:
+            i = positions.get(word)
+            if i is None:
+                i = positions[word] = len(self) + len(added)
+                added.append(word)
+            members.append(i)
+        result = SourcedWordlist(self + tuple(added))
+        result.names = self.names + [name]
+        result.members = self.members + [members]
+        result._positions = positions
+        return result
+
+    def __contains__(self, word):
+        return word in self._positions
+
+    def source_index(self, source):
+        """
+        Return the index of a source given by name or 1-based number.
+        """
+        if source in self.names:
+            return self.names.index(source)
+        if str(source).isdigit() and 1 <= int(source) <= len(self.names):
+            return int(source) - 1
+        raise ValueError("Unknown source: {0}".format(source))
+
+    def source_weights(self, balanced=False):
+        """
+        Return the probability weights of the words when a source is
+        picked in proportion to its size (or uniformly if balanced) and
+        then a word uniformly from that source.
+        """
+        weights = [0.0] * len(self)
+        for members in self.members:
+            if not members:
+                continue
+            share = 1.0 / len(members) if balanced else 1.0
+            for i in members:
+                weights[i] += share
+        return weights
+
+    def __repr__(self):
+        return "<SourcedWordlist of {0} words from {1}>".format(
+            len(self), ", ".join(self.names))
+
+
+def sourced_wordlist(wordfile=None,
+                     min_length=5,
+                     max_length=9,
+                     valid_chars='.',
+                     cache=WORDLIST_CACHE,
+                     workers=1,
+                     executor="thread",
+                     exclude_substrings=None):
+    """
+    Like `generate_wordlist()`, but return a SourcedWordlist keeping the
+    words of each comma-separated wordfile apart. The result is shared
+    and must not be modified.
+
+    The wordlist of every leading run of the wordfiles is cached, so
+    adding a wordfile to a set already loaded reads and indexes only the
+    new one.
+    """
+    if wordfile is None:
+        wordfile = DEFAULT_WORDFILE
+    names = wordfile.split(',')
+    wordfiles = [locate_wordfile(name) for name in names]
+    if compressed.STDIN in wordfiles:
+        cache = None
+
+    keys = [None] * (len(names) + 1)
+    wordlist = SourcedWordlist()
+    loaded = 0
+    if cache is not None:
+        signatures = [wordfile_signature(wf) for wf in wordfiles]
+        options = (min_length, max_length, valid_chars,
+                   substrings_key(exclude_substrings))
+        keys = [("sourced", tuple(zip(names[:n], signatures[:n]))) + options
+                for n in xrange(len(names) + 1)]
+        for n in xrange(len(names), 0, -1):
+            cached = cache.get(keys[n])
+            if cached is not None:
+                if STATS is not None:
+                    STATS.count("wordlist_cache_hits")
+                wordlist, loaded = cached, n
+                break
+
+    stats = STATS
+    windows = _load_windows(wordfiles[loaded:], min_length, max_length,
+                            valid_chars, cache is not None, workers,
+                            executor, exclude_substrings)
+    for n, (scanned, buckets) in enumerate(windows, loaded + 1):
+        words = _merge_windows([buckets])
+        if stats is not None:
+            stats.count("words_scanned", scanned)
+            stats.count("words_accepted", len(words))
+            stats.count("words_rejected", scanned - len(words))
+        wordlist = wordlist.with_source(names[n - 1], words)
+        if cache is not None:
+            cache.put(keys[n], wordlist)
+
+    if not len(wordlist):
+        raise SystemExit("Error: Provided arguments result in emtpy wordlist. (Probably because there aren't any words that match your --min and --max options) Exiting.")
+    return wordlist
+
+
 def wordlist_to_worddict(wordlist):
     """
     Takes a wordlist and returns a dictionary keyed by the first letter of
@@ -153,30 +1261,228 @@ def wordlist_to_worddict(wordlist):
     return worddict
 
 
+class Wordlist(list):
+    """
+    A list of words returned by `generate_wordlist()`, which remembers the
+    cached tuple it was copied from (source). Structures derived from it
+    (see `wordlist_derived()`) are shared by every copy of that tuple.
+    """
+
+    def __init__(self, words=(), source=None):
+        list.__init__(self, words)
+        self.source = source
+
+    def __reduce__(self):
+        # worker processes get a plain list, not a second copy of the words
+        return (list, (list(self),))
+
+
+def wordlist_derived(wordlist, kind, build=None):
+    """
+    Return build(wordlist), computed once per wordlist object and kind of
+    structure and kept in DERIVED_CACHE. Only read-only wordlists (tuples,
+    CompactWordlists and compiled wordlists) are cached: lists may be
+    changed in place, so their structures are built on every call. A
+    `Wordlist` counts as the cached tuple it was copied from as long as it
+    holds the same words, so the structure outlives the copy instead of
+    being rebuilt for each `generate_wordlist()` call. Without build,
+    return None unless the structure is already cached.
+    """
+    source = getattr(wordlist, "source", None)
+    if source is not None and tuple(wordlist) == source:
+        wordlist = source
+    if not isinstance(wordlist, (tuple, CompactWordlist,
+                                 compiled.CompiledWordlist)):
+        return None if build is None else build(wordlist)
+    key = (kind, id(wordlist))
+    entry = DERIVED_CACHE.get(key)
+    if entry is not None and entry[0] is wordlist:
+        return entry[1]
+    if build is None:
+        return None
+    value = build(wordlist)
+    DERIVED_CACHE.put(key, (wordlist, value))
+    return value
+
+
+class PrefixIndex(object):
+    """
+    The words of a wordlist in sorted order, so that the words starting
+    with any prefix form a contiguous range found by bisection. Used for
+    acrostic pass phrase generation
+    """
+
+    def __init__(self, wordlist):
+        self.words = sorted(wordlist)
+
+    def range(self, prefix):
+        """
+        Return the (start, stop) range of words starting with prefix.
+        """
+        start = bisect_left(self.words, prefix)
+        try:
+            # the first string sorting after every word with this prefix
+            bound = prefix[:-1] + unichr(ord(prefix[-1]) + 1)
+        except (IndexError, ValueError):
+            return start, len(self.words)
+        return start, bisect_left(self.words, bound, start)
+
+    def count(self, prefix):
+        """
+        Return the number of words starting with prefix.
+        """
+        start, stop = self.range(prefix)
+        return stop - start
+
+    def candidates(self, prefix):
+        """
+        Return the words starting with prefix.
+        """
+        start, stop = self.range(prefix)
+        return self.words[start:stop]
+
+
+def prefix_index(wordlist):
+    """
+    Return the (cached) PrefixIndex of wordlist.
+    """
+    return wordlist_derived(wordlist, "prefix", PrefixIndex)
+
+
+def acrostic_prefixes(acrostic):
+    """
+    Split an acrostic into the prefixes the words must start with: the
+    letters of a string, the comma separated parts of a string containing
+    commas (e.g. "th,e,qu"), or the items of a list.
+    """
+    if not isinstance(acrostic, (list, tuple)):
+        if ',' in acrostic:
+            return acrostic.split(',')
+        return list(acrostic)
+    return list(acrostic)
+
+
+def acrostic_ranges(prefixes, index):
+    """
+    Return the PrefixIndex range of candidate words for each prefix,
+    exiting with an error if there are none for one of them.
+    """
+    ranges = [index.range(prefix) for prefix in prefixes]
+    for prefix, (start, stop) in zip(prefixes, ranges):
+        if start == stop:
+            sys.stderr.write("No words found starting with " + prefix + "\n")
+            sys.exit(1)
+    return ranges
+
+
+def word_length_counts(wordlist, options):
+    """
+    Return a {length: number of words} mapping for wordlist. When the
+    wordlist comes straight from a single wordfile's length window, the
+    counts are read from the cached length index rather than the words.
+    """
+    wordfile = getattr(options, "wordfile", None) or DEFAULT_WORDFILE
+    valid_chars = getattr(options, "valid_chars", ".")
+    if ',' not in wordfile and valid_chars == '.' and \
+       hasattr(options, "min_length") and hasattr(options, "max_length"):
+        path = locate_wordfile(wordfile)
+        # standard input has no index to read
+        if path is not None and path != compressed.STDIN:
+            counts = wordfile_index(path).length_counts(options.min_length,
+                                                        options.max_length)
+            if sum(counts.values()) == len(wordlist):
+                return counts
+
+    counts = {}
+    for word in wordlist:
+        counts[len(word)] = counts.get(len(word), 0) + 1
+    return counts
+
+
 def verbose_reports(wordlist, options):
     """
     Report entropy metrics based on word list and requested password size"
     """
 
     if options.acrostic:
-        worddict = wordlist_to_worddict(wordlist)
-        numwords = len(options.acrostic)
-        length = 0
-        for char in options.acrostic:
-            length += len(worddict.get(char, []))
+        index = prefix_index(wordlist)
+        prefixes = acrostic_prefixes(options.acrostic)
+        numwords = len(prefixes)
+        length = sum(index.count(prefix) for prefix in prefixes)
     else:
         length = len(wordlist)
         numwords = options.numwords
+    sources = getattr(options, "sources", None)
 
     bits = math.log(length, 2)
 
     print("With the current options, your word list contains {0} words."
           .format(length))
-
-    print("A {0} word password from this list will have roughly "
-          "{1} ({2:.2f} * {3}) bits of entropy,"
-          "".format(numwords, int(bits * numwords), bits, numwords))
-    print("assuming truly random word selection.\n")
+    if not options.acrostic:
+        counts = word_length_counts(wordlist, options)
+        print("Words by length: " + ", ".join(
+            "{0}: {1}".format(n, counts[n]) for n in sorted(counts)))
+    if isinstance(wordlist, SourcedWordlist):
+        print("Words by source: " + ", ".join(
+            "{0}: {1}".format(name, len(members))
+            for name, members in zip(wordlist.names, wordlist.members)))
+
+    if getattr(options, "weights", None) and not options.acrostic:
+        table = alias_table(wordlist, load_weights(options.weights))
+        shannon, min_entropy = table.shannon_entropy(), table.min_entropy()
+        print("With the word weights from {0}, a {1} word password from "
+              "this list will have {2:.2f} ({3:.2f} * {1}) bits of Shannon "
+              "entropy".format(options.weights, numwords,
+                               shannon * numwords, shannon))
+        print("and {0:.2f} ({1:.2f} * {2}) bits of min-entropy, against "
+              "{3:.2f} for a uniform choice.\n".format(
+                  min_entropy * numwords, min_entropy, numwords,
+                  bits * numwords))
+    elif source_policy(sources) not in (None, "merged") and \
+            not options.acrostic:
+        numwords = source_numwords(sources, numwords)
+        shannon, min_entropy = passphrase_entropy(wordlist, numwords,
+                                                  sources=sources)
+        print("Choosing words by source ({0}), a {1} word password from "
+              "this list will have {2:.2f} bits of Shannon entropy".format(
+                  sources, numwords, shannon))
+        print("and {0:.2f} bits of min-entropy, against {1:.2f} for a "
+              "uniform choice.\n".format(min_entropy, bits * numwords))
+    else:
+        print("A {0} word password from this list will have roughly "
+              "{1} ({2:.2f} * {3}) bits of entropy,"
+              "".format(numwords, int(bits * numwords), bits, numwords))
+        print("assuming truly random word selection.\n")
+
+    min_total = getattr(options, "min_total_length", None)
+    max_total = getattr(options, "max_total_length", None)
+    if min_total is not None or max_total is not None:
+        valid_delimiters = (list(options.valid_delimiters)
+                            if getattr(options, "valid_delimiters", "")
+                            else DEFAULT_DELIMITERS)
+        limits = dict(
+            numwords=options.numwords, acrostic=options.acrostic,
+            delimiter=getattr(options, "delimiter", " "),
+            random_delimiters=getattr(options, "random_delimiters", False),
+            valid_delimiters=valid_delimiters,
+            case=getattr(options, "case", "lower"),
+            pad_digits=getattr(options, "pad_digits", 0) or 0,
+            pad_symbols=getattr(options, "pad_symbols", 0) or 0)
+        padding = limits["pad_digits"] + limits["pad_symbols"]
+        sampler = total_length_sampler(
+            wordlist, limits["numwords"], limits["acrostic"],
+            limits["delimiter"], limits["random_delimiters"],
+            valid_delimiters, _unpadded(min_total, padding),
+            _unpadded(max_total, padding), limits["case"])
+        keyspace = passphrase_keyspace(
+            wordlist, min_total_length=min_total, max_total_length=max_total,
+            **limits)
+        print("Limited to {0} to {1} characters in total, there are {2} "
+              "possible passphrases, all equally likely: exactly {3:.2f} "
+              "bits of entropy.\n".format(
+                  sampler.totals[0][0] + padding,
+                  sampler.totals[-1][0] + padding,
+                  keyspace, math.log(keyspace, 2)))
 
 
 def find_acrostic(acrostic, worddict):
@@ -190,19 +1496,267 @@ def find_acrostic(acrostic, worddict):
 
     for letter in acrostic:
         try:
-            words.append(rng().choice(worddict[letter]))
+            words.append(entropy_pool().choice(worddict[letter]))
         except KeyError:
             sys.stderr.write("No words found starting with " + letter + "\n")
             sys.exit(1)
     return words
 
 
-def choose_words(wordlist, numwords):
+WEIGHTS_CACHE = WordlistCache(maxsize=8)
+
+
+def load_weights(path, cache=WEIGHTS_CACHE):
+    """
+    Read a weights file: a word and its weight (any non-negative number),
+    separated by whitespace, on each line. Returns a {word: weight}
+    dictionary, memoized in cache by the file's signature.
+    """
+    key = None
+    if cache is not None:
+        key = wordfile_signature(path)
+        weights = cache.get(key)
+        if weights is not None:
+            return weights
+
+    weights = {}
+    with compressed.open_wordfile(path) as f:
+        for number, line in enumerate(f, 1):
+            fields = line.rsplit(None, 1)
+            if not fields:
+                continue
+            try:
+                weight = float(fields[-1])
+            except ValueError:
+                weight = None
+            if len(fields) != 2 or weight is None or \
+               not 0 <= weight < float("inf"):
+                raise SystemExit("Error: Invalid weight on line {0} of {1}.\n"
+                                 .format(number, path))
+            weights[fields[0].strip()] = weight
+    if not any(weights.values()):
+        raise SystemExit("Error: No word has a positive weight in {0}.\n"
+                         .format(path))
+
+    if cache is not None:
+        cache.put(key, weights)
+    return weights
+
+
+def word_weights(wordlist, weights):
+    """
+    Return the weights of the words in wordlist as a list. weights is a
+    sequence of per-word weights, or a mapping from words to weights in
+    which unlisted words get the smallest positive listed weight.
+    """
+    if hasattr(weights, "get"):
+        default = min([w for w in weights.values() if w > 0] or [0])
+        return [weights.get(word, default) for word in wordlist]
+    weights = list(weights)
+    if len(weights) != len(wordlist):
+        raise ValueError("Expected {0} weights, got {1}".format(
+            len(wordlist), len(weights)))
+    return weights
+
+
+# coins of the alias method are 32 bit integers
+_COIN_TYPECODE = dict(_DRAW_TYPECODES)[32]
+_COIN_ONE = 1 << 32
+
+
+class AliasTable(object):
+    """
+    Walker's alias method: after an O(n) setup, each weighted draw of an
+    index takes one uniform column and one coin, whatever the weights.
+
+    Column i is kept if its coin (32 random bits) is below threshold[i]
+    and replaced by alias[i] otherwise. Columns and coins for a whole batch
+    are drawn from an EntropyPool in bulk.
+    """
+
+    def __init__(self, weights):
+        weights = [float(w) for w in weights]
+        total = sum(weights)
+        if not weights or total <= 0 or min(weights) < 0:
+            raise ValueError("Weights must be non-negative with a positive sum")
+        n = len(weights)
+        self.probabilities = [w / total for w in weights]
+
+        # Vose's construction: pair each column short of the average
+        # probability with one above it that makes up the difference
+        scaled = [p * n for p in self.probabilities]
+        self._threshold = [_COIN_ONE] * n
+        self._alias = list(xrange(n))
+        small = [i for i, x in enumerate(scaled) if x < 1.0]
+        large = [i for i, x in enumerate(scaled) if x >= 1.0]
+        while small and large:
+            short, tall = small.pop(), large.pop()
+            self._threshold[short] = int(scaled[short] * _COIN_ONE)
+            self._alias[short] = tall
+            scaled[tall] -= 1.0 - scaled[short]
+            (small if scaled[tall] < 1.0 else large).append(tall)
+        # columns left over (only through rounding) always keep themselves
+
+    def __len__(self):
+        return len(self._alias)
+
+    def sample_many(self, pool, k):
+        """
+        Return a list of k indices drawn with the table's weights.
+        """
+        columns = pool.randbelow_many(len(self._alias), k)
+        coins = array(_COIN_TYPECODE)
+        _array_frombytes(coins, pool.read(coins.itemsize * k))
+        threshold, alias = self._threshold, self._alias
+        return [i if coin < threshold[i] else alias[i]
+                for i, coin in zip(columns, coins)]
+
+    def shannon_entropy(self):
+        """
+        Return the Shannon entropy of one draw, in bits.
+        """
+        return -sum(p * math.log(p, 2) for p in self.probabilities if p)
+
+    def min_entropy(self):
+        """
+        Return the min-entropy of one draw, in bits: the guessing
+        difficulty of the most likely outcome.
+        """
+        return -math.log(max(self.probabilities), 2)
+
+
+def alias_table(wordlist, weights):
+    """
+    Return the AliasTable drawing words from wordlist with the given
+    weights (see `word_weights()`), built once per wordlist and weights
+    object. Like wordlists, weights are expected not to be modified.
+    """
+    def build(wordlist):
+        # keeping weights alive keeps its id from being reused
+        return weights, AliasTable(word_weights(wordlist, weights))
+    return wordlist_derived(wordlist, ("alias", id(weights)), build)[1]
+
+
+SOURCE_POLICIES = ("merged", "proportional", "balanced")
+
+
+def source_policy(sources):
+    """
+    Normalize a choice of words by source: None or one of SOURCE_POLICIES,
+    or a pattern of sources, one per word, given by name or 1-based number
+    as a list or comma-separated string and returned as a tuple.
+
+    - merged: every distinct word is equally likely, whatever its source
+    - proportional: a source is picked in proportion to its size, then a
+      word from it
+    - balanced: every source is equally likely, then a word from it
+    """
+    if sources is None or sources in SOURCE_POLICIES:
+        return sources
+    if not isinstance(sources, (list, tuple)):
+        sources = sources.split(",")
+    return tuple(sources)
+
+
+def source_numwords(sources, numwords):
+    """
+    Return the number of words of a passphrase: the length of a pattern
+    of sources, or numwords.
+    """
+    sources = source_policy(sources)
+    if isinstance(sources, tuple):
+        return len(sources)
+    return numwords
+
+
+class SourcePattern(object):
+    """
+    Draws the words of each position of a passphrase uniformly from the
+    source given for it, with the interface of `AliasTable`.
+    """
+
+    def __init__(self, wordlist, pattern):
+        self.members = []
+        for source in pattern:
+            members = wordlist.members[wordlist.source_index(source)]
+            if not members:
+                raise ValueError("Source {0} has no words".format(source))
+            self.members.append(members)
+        self.sizes = [len(members) for members in self.members]
+
+    def __len__(self):
+        return len(self.members)
+
+    def sample_many(self, pool, k):
+        """
+        Return the word indices of k // len(self) rows of the pattern.
+        """
+        numwords = len(self.members)
+        indices = [None] * (k - k % numwords)
+        for i, members in enumerate(self.members):
+            indices[i::numwords] = [members[j] for j in pool.randbelow_many(
+                len(members), k // numwords)]
+        return indices
+
+
+def source_sampler(wordlist, sources):
     """
-    Choose numwords randomly from wordlist
+    Return the sampler drawing words by source: None for the merged
+    policy, an AliasTable for proportional and balanced and a
+    SourcePattern for a pattern. wordlist must be a SourcedWordlist
+    unless the policy is merged.
     """
+    sources = source_policy(sources)
+    if sources is None or sources == "merged":
+        return None
+    if not isinstance(wordlist, SourcedWordlist):
+        raise ValueError("Choosing words by source needs a wordlist from "
+                         "sourced_wordlist()")
+
+    def build(wordlist):
+        if isinstance(sources, tuple):
+            return SourcePattern(wordlist, sources)
+        return AliasTable(wordlist.source_weights(sources == "balanced"))
+    return wordlist_derived(wordlist, ("sources", sources), build)
 
-    return [rng().choice(wordlist) for i in xrange(numwords)]
+
+def passphrase_entropy(wordlist, numwords, weights=None, sources=None):
+    """
+    Return the (Shannon entropy, min-entropy) in bits of the choice of the
+    words of a passphrase, uniformly, with weights or by source. The two
+    are equal for uniform choices.
+    """
+    if weights is not None:
+        sampler = alias_table(wordlist, weights)
+    else:
+        sampler = source_sampler(wordlist, sources)
+    if isinstance(sampler, SourcePattern):
+        bits = sum(math.log(size, 2) for size in sampler.sizes)
+        return bits, bits
+    numwords = source_numwords(sources, numwords)
+    if sampler is None:
+        bits = math.log(len(wordlist), 2) * numwords
+        return bits, bits
+    return (sampler.shannon_entropy() * numwords,
+            sampler.min_entropy() * numwords)
+
+
+def choose_words(wordlist, numwords, weights=None, sources=None):
+    """
+    Choose numwords randomly from wordlist, with the given weights (see
+    `word_weights()`) or by source (see `source_policy()`) if any
+    """
+    pool = entropy_pool()
+    sampler = None
+    if weights is not None:
+        sampler = alias_table(wordlist, weights)
+    elif sources is not None:
+        sampler = source_sampler(wordlist, sources)
+    if sampler is not None:
+        indices = sampler.sample_many(pool, numwords)
+    else:
+        indices = pool.randbelow_many(len(wordlist), numwords)
+    return [wordlist[i] for i in indices]
 
 
 def try_input(prompt, validate):
@@ -235,8 +1789,8 @@ def alternating_case(words):
     """
     return [word.upper()
             if i % 2 == 0
-            else word
-            for i, word in enumerate(lower_case(words))]
+            else word.lower()
+            for i, word in enumerate(words)]
 
 
 def upper_case(words):
@@ -271,17 +1825,27 @@ def random_case(words, testing=False):
     """
     Set RANDOM words to UPPER case.
     """
-    def make_upper(word):
-        """Return 'word.upper()' on a random basis."""
-        if testing:
+    if testing:
+        # reproducible choices, seeded by each word
+        def make_upper(word):
             random.seed(word)
+            return random.choice([True, False])
+
+        flips = [make_upper(word.lower()) for word in words]
+    else:
+        flips = entropy_pool().randbelow_many(2, len(words))
+
+    return [word.upper() if flip else word.lower()
+            for word, flip in zip(words, flips)]
 
-        if random.choice([True, False]):
-            return word.upper()
-        else:
-            return word
 
-    return [make_upper(word) for word in lower_case(words)]
+def random_char_case(words):
+    """
+    Set RANDOM characters of each word to UPPER case.
+    """
+    flips = iter(entropy_pool().randbelow_many(2, sum(map(len, words))))
+    return ["".join([c.upper() if next(flips) else c.lower() for c in word])
+            for word in words]
 
 
 CASE_METHODS = {
@@ -291,7 +1855,8 @@ CASE_METHODS = {
     "first": first_upper_case,
     "capitalize": capitalize_case,
     "alternating": alternating_case,
-    "random": random_case
+    "random": random_case,
+    "random-chars": random_char_case,
 }
 
 
@@ -305,7 +1870,8 @@ def set_case(words, method="lower", testing=False):
         words (list):   word list generated by `choose_words()` or
                         `find_acrostic()`.
         method (str):   one of {"as-is", "lower", "upper", "first",
-                        "capitalize", "alternating", "random"}.
+                        "capitalize", "alternating", "random",
+                        "random-chars"}.
         testing (bool): only affects method="random".
                         If True: the random seed will be set to each word
                         prior to choosing True or False before setting the
@@ -318,6 +1884,456 @@ def set_case(words, method="lower", testing=False):
         return CASE_METHODS[method](words)
 
 
+# cases looked up in the tables of case_variants()
+VARIANT_CASES = {
+    "lower": "lower",
+    "upper": "upper",
+    "first": "capitalize",
+    "capitalize": "capitalize",
+    "alternating": None,
+    "random": "random",
+}
+
+
+def _build_case_variants(wordlist):
+    lower = [w.lower() for w in wordlist]
+    upper = [w.upper() for w in wordlist]
+    return {
+        "lower": lower,
+        "upper": upper,
+        "capitalize": [w.capitalize() for w in wordlist],
+        # the lower case forms followed by the upper case ones, so that a
+        # single draw picks both a word and its case
+        "random": lower + upper,
+    }
+
+
+def case_variants(wordlist):
+    """
+    Return the lower, upper and capitalized forms of the words in
+    wordlist, as a dictionary of lists indexed like wordlist, built once
+    per wordlist (see `wordlist_derived()`).
+    """
+    return wordlist_derived(wordlist, "case_variants", _build_case_variants)
+
+
+# substitutions made by --leet, applied after the case
+LEET_SUBSTITUTIONS = {"a": u"4", "e": u"3", "i": u"1", "o": u"0", "s": u"5",
+                      "t": u"7"}
+
+# characters drawn for --pad-digits and --pad-symbols
+PADDING_DIGITS = "0123456789"
+PADDING_SYMBOLS = "!@#$%^&*?"
+
+
+class PassphrasePipeline(object):
+    """
+    The steps turning chosen words into a passphrase: case, leetspeak,
+    delimiters and padding, compiled once from the options.
+
+    `apply_batch()` draws the randomness for a whole batch from an
+    EntropyPool up front and builds each passphrase with a single join,
+    instead of copying the word list once per step.
+    """
+
+    def __init__(self,
+                 case="lower",
+                 delimiter=" ",
+                 random_delimiters=False,
+                 valid_delimiters=DEFAULT_DELIMITERS,
+                 leet=False,
+                 pad_digits=0,
+                 pad_symbols=0):
+        if case not in CASE_METHODS:
+            raise ValueError("Unknown case: {0}".format(case))
+        self.case = case
+        self.delimiter = delimiter
+        self.random_delimiters = random_delimiters
+        self.valid_delimiters = list(valid_delimiters)
+        self.pad_digits = pad_digits
+        self.pad_symbols = pad_symbols
+        self.padding = pad_digits + pad_symbols
+
+        self._leet = None
+        if leet:
+            self._leet = dict(
+                (ord(c), sub) for letter, sub in LEET_SUBSTITUTIONS.items()
+                for c in (letter, letter.upper()))
+
+    @property
+    def numpy_compatible(self):
+        """ True if the NumPy backend implements every step. """
+        return (self.case != "random-chars" and self._leet is None and
+                not self.padding)
+
+    def apply(self, words, pool=None, delimiters=None, cased=False):
+        """
+        Return the passphrase for a list of chosen words.
+        """
+        return self.apply_batch(
+            [words], pool, None if delimiters is None else [delimiters],
+            cased)[0]
+
+    def choose_rows(self, wordlist, numwords, count, pool=None, alias=None):
+        """
+        Draw count rows of numwords words from wordlist, uniformly or with
+        an AliasTable (or a SourcePattern). Returns the rows and whether they are already in
+        the case of the pipeline, which they are when the words are looked
+        up in the `case_variants()` of wordlist. Only lists get variant
+        tables: views of compiled or shared wordlists would have every
+        word decoded into memory. The tables are built only for draws of
+        at least as many words as the wordlist holds; smaller ones are
+        cheaper to case word by word, unless the tables already exist.
+        """
+        if pool is None:
+            pool = entropy_pool()
+        size = count * numwords
+        variant = VARIANT_CASES.get(self.case, False)
+        cased = (variant is not False and
+                 isinstance(wordlist, (list, tuple)) and
+                 (size >= len(wordlist) or wordlist_derived(
+                     wordlist, "case_variants") is not None))
+        if cased and variant == "random" and alias is None:
+            # a single uniform draw picks both the word and its case
+            table = case_variants(wordlist)["random"]
+            words = [table[i] for i in pool.randbelow_many(len(table), size)]
+            return ([words[i:i + numwords]
+                     for i in xrange(0, size, numwords)], cased)
+
+        if alias is not None:
+            indices = alias.sample_many(pool, size)
+        else:
+            indices = pool.randbelow_many(len(wordlist), size)
+        if not cased:
+            words = [wordlist[i] for i in indices]
+        elif variant is None:
+            # alternating: upper case at even positions, lower at odd ones
+            variants = case_variants(wordlist)
+            words = [None] * size
+            for i in xrange(numwords):
+                table = variants["lower" if i % 2 else "upper"]
+                words[i::numwords] = [table[j] for j in indices[i::numwords]]
+        elif variant == "random":
+            table, n = case_variants(wordlist)["random"], len(wordlist)
+            words = [table[i + n] if flip else table[i] for i, flip in
+                     zip(indices, pool.randbelow_many(2, size))]
+        else:
+            table = case_variants(wordlist)[variant]
+            words = [table[i] for i in indices]
+        rows = [words[i:i + numwords] for i in xrange(0, size, numwords)]
+        return rows, cased
+
+    def apply_batch(self, rows, pool=None, delimiters=None, cased=False):
+        """
+        Return the passphrases for a list of rows of chosen words. If
+        delimiters is given, it holds the delimiters between the words of
+        each row, replacing the pipeline's delimiter policy. If cased is
+        True, the words are already in the case of the pipeline.
+        """
+        if pool is None:
+            pool = entropy_pool()
+        case = self.case
+
+        # the words of all rows in one list, transformed a step at a time
+        if cased or case == "as-is":
+            words = [word for row in rows for word in row]
+        elif case == "lower":
+            words = [word.lower() for row in rows for word in row]
+        elif case == "upper":
+            words = [word.upper() for row in rows for word in row]
+        elif case in ("first", "capitalize"):
+            words = [word.capitalize() for row in rows for word in row]
+        elif case == "alternating":
+            words = [word.lower() if i % 2 else word.upper()
+                     for row in rows for i, word in enumerate(row)]
+        elif case == "random":
+            words = [word for row in rows for word in row]
+            flips = pool.randbelow_many(2, len(words))
+            words = [word.upper() if flip else word.lower()
+                     for word, flip in zip(words, flips)]
+        elif case == "random-chars":
+            lower = "\n".join([word for row in rows for word in row]).lower()
+            upper = lower.upper()
+            flips = pool.randbelow_many(2, len(lower))
+            if len(upper) == len(lower):
+                text = "".join([u if flip else c for c, u, flip
+                                in zip(lower, upper, flips)])
+            else:
+                # some characters change length in upper case
+                text = "".join([c.upper() if flip else c
+                                for c, flip in zip(lower, flips)])
+            words = text.split("\n") if rows else []
+        else:
+            words = [word for row in rows for word in row]
+        if self._leet is not None and words:
+            # one translate call per batch; words never contain newlines.
+            # A unicode join, as byte strings take no mapping on Python 2
+            words = u"\n".join(words).translate(self._leet).split(u"\n")
+
+        # the delimiters between the words of all rows in one list
+        gaps = None
+        if delimiters is not None:
+            gaps = [delim for row in delimiters for delim in row]
+        elif self.random_delimiters:
+            valid = self.valid_delimiters
+            gaps = [valid[i] for i in pool.randbelow_many(
+                len(valid), sum(max(len(row) - 1, 0) for row in rows))]
+
+        size = len(rows[0]) if rows else 0
+        if gaps is None and all(len(row) == size for row in rows):
+            passwds = [self.delimiter.join(words[i:i + size])
+                       for i in xrange(0, len(words), size or 1)]
+        elif size > 1 and all(len(row) == size for row in rows):
+            # interleave the words and delimiters of all rows at once
+            width = 2 * size - 1
+            parts = [None] * (len(rows) * width)
+            for i in xrange(size):
+                parts[2 * i::width] = words[i::size]
+            for i in xrange(size - 1):
+                parts[2 * i + 1::width] = gaps[i::size - 1]
+            passwds = ["".join(parts[i:i + width])
+                       for i in xrange(0, len(parts), width)]
+        else:
+            passwds = []
+            position = gap = 0
+            for row in rows:
+                parts = words[position:position + 1]
+                for i in xrange(1, len(row)):
+                    parts.append(self.delimiter if gaps is None
+                                 else gaps[gap])
+                    parts.append(words[position + i])
+                    gap += gaps is not None
+                position += len(row)
+                passwds.append("".join(parts))
+
+        if self.padding:
+            d, y = self.pad_digits, self.pad_symbols
+            digits = "".join([PADDING_DIGITS[i] for i in pool.randbelow_many(
+                len(PADDING_DIGITS), len(rows) * d)])
+            symbols = "".join([PADDING_SYMBOLS[i] for i in pool.randbelow_many(
+                len(PADDING_SYMBOLS), len(rows) * y)])
+            passwds = [passwd + digits[n * d:(n + 1) * d] +
+                       symbols[n * y:(n + 1) * y]
+                       for n, passwd in enumerate(passwds)]
+        return passwds
+
+    def keyspace_factor(self, numwords):
+        """
+        Return the number of outcomes the random steps add to a choice of
+        numwords words: random case and padding (random delimiters are
+        counted by `passphrase_keyspace()`). For "random-chars", one
+        choice per word is counted, a lower bound.
+        """
+        factor = (len(PADDING_DIGITS) ** self.pad_digits *
+                  len(PADDING_SYMBOLS) ** self.pad_symbols)
+        if self.case in ("random", "random-chars"):
+            factor *= 2 ** numwords
+        return factor
+
+
+def _length_buckets(words):
+    buckets = {}
+    for word in words:
+        buckets.setdefault(len(word), []).append(word)
+    return buckets
+
+
+def _distinct_cased(words, case):
+    """
+    Return the distinct forms of words in case, in order of first
+    occurrence; for "random", the lower case forms then the upper case
+    ones.
+    """
+    if case == "random":
+        words = lower_case(words) + upper_case(words)
+    else:
+        words = CASE_METHODS[case](words)
+    seen = set()
+    add = seen.add
+    return [w for w in words if not (w in seen or add(w))]
+
+
+def _cased_columns(wordlist, columns, case):
+    """
+    Return the distinct words of each column in the case of its position
+    (see `_distinct_cased()`). Columns that are the whole wordlist are
+    cased once per wordlist (see `wordlist_derived()`).
+    """
+    cased = {}
+    result = []
+    for position, column in enumerate(columns):
+        form = case
+        if case == "alternating":
+            form = "lower" if position % 2 else "upper"
+        if (id(column), form) not in cased:
+            if column is wordlist:
+                cased[id(column), form] = wordlist_derived(
+                    wordlist, ("distinct_cased", form),
+                    lambda words: _distinct_cased(words, form))
+            else:
+                cased[id(column), form] = _distinct_cased(column, form)
+        result.append(cased[id(column), form])
+    return result
+
+
+def _case_stable(words):
+    # words whose length doesn't depend on the case of their characters
+    # ("straße".upper() is "STRASSE")
+    return [w for w in words if len(w.upper()) == len(w) == len(w.lower())]
+
+
+class TotalLengthSampler(object):
+    """
+    Uniform sampler over sequences of strings, one from each slot, whose
+    total length lies between min_total and max_total inclusive (None for
+    no limit). Each slot is a {length: strings} mapping; a passphrase is
+    its words in alternation with slots for the delimiters.
+
+    suffix[s][t] counts the ways slots s onwards add up to exactly t
+    characters, so `count` is exact and a single random integer below it
+    decodes into one sequence, with no rejected draws.
+    """
+
+    def __init__(self, slots, min_total=None, max_total=None):
+        self.slots = [sorted(slot.items()) for slot in slots]
+        longest = sum(slot[-1][0] for slot in self.slots if slot)
+        low = 0 if min_total is None else max(0, min_total)
+        high = longest if max_total is None else min(max_total, longest)
+
+        suffix = [[1] + [0] * high]
+        for slot in reversed(self.slots):
+            after = suffix[-1]
+            ways = [0] * (high + 1)
+            for length, strings in slot:
+                n = len(strings)
+                for t in xrange(length, high + 1):
+                    if after[t - length]:
+                        ways[t] += n * after[t - length]
+            suffix.append(ways)
+        suffix.reverse()
+        self._suffix = suffix
+
+        self.totals = [(t, suffix[0][t]) for t in xrange(low, high + 1)
+                       if suffix[0][t]]
+        self.count = sum(n for t, n in self.totals)
+
+    def decode(self, r):
+        """
+        Return the sequence numbered r, for 0 <= r < count.
+        """
+        for total, n in self.totals:
+            if r < n:
+                break
+            r -= n
+
+        parts = []
+        suffix = self._suffix
+        for s, slot in enumerate(self.slots):
+            after = suffix[s + 1]
+            for length, strings in slot:
+                if length > total or not after[total - length]:
+                    continue
+                rest = after[total - length]
+                if r < len(strings) * rest:
+                    i, r = divmod(r, rest)
+                    parts.append(strings[i])
+                    total -= length
+                    break
+                r -= len(strings) * rest
+        return parts
+
+    def sample_many(self, pool, k):
+        """
+        Return k sequences drawn uniformly from an EntropyPool.
+        """
+        decode = self.decode
+        return [decode(r) for r in pool.randbelow_many(self.count, k)]
+
+
+def _unpadded(total_length, padding):
+    # total length limits apply to the passphrase including its padding
+    return None if total_length is None else total_length - padding
+
+
+def total_length_sampler(wordlist,
+                         numwords=6,
+                         acrostic=False,
+                         delimiter=" ",
+                         random_delimiters=False,
+                         valid_delimiters=DEFAULT_DELIMITERS,
+                         min_total_length=None,
+                         max_total_length=None,
+                         case="as-is"):
+    """
+    Return the TotalLengthSampler for passphrases with these options,
+    built once per wordlist and options. Exits if no passphrase fits.
+
+    Words are counted by the length of their form in case, which may
+    differ from their own ("straße" is "STRASSE" in upper case), so the
+    sampler draws words already in case: the distinct forms of each
+    position, both the lower and upper case ones for "random" (see
+    `_cased_columns()`). For "random-chars", whose case is drawn
+    afterwards, words whose length depends on it are left out.
+    """
+    if acrostic:
+        index = prefix_index(wordlist)
+        ranges = acrostic_ranges(acrostic_prefixes(acrostic), index)
+    else:
+        ranges = None
+    if random_delimiters:
+        valid_delimiters = tuple(valid_delimiters)
+
+    def build(wordlist):
+        if ranges is None:
+            columns = [wordlist] * numwords
+        else:
+            columns = [index.words[first:last] for first, last in ranges]
+        if case == "random-chars":
+            stable = {}
+            for column in columns:
+                if id(column) not in stable:
+                    stable[id(column)] = _case_stable(column)
+            columns = [stable[id(column)] for column in columns]
+        else:
+            columns = _cased_columns(wordlist, columns, case)
+        buckets = {}
+        for column in columns:
+            if id(column) not in buckets:
+                buckets[id(column)] = _length_buckets(column)
+        word_slots = [buckets[id(column)] for column in columns]
+        if random_delimiters:
+            delimiters = _length_buckets(valid_delimiters)
+        else:
+            delimiters = {len(delimiter): [delimiter]}
+
+        slots = [word_slots[0]]
+        for word_slot in word_slots[1:]:
+            slots.append(delimiters)
+            slots.append(word_slot)
+        return TotalLengthSampler(slots, min_total_length, max_total_length)
+
+    sampler = wordlist_derived(
+        wordlist,
+        ("total_length", numwords, acrostic, delimiter, random_delimiters,
+         valid_delimiters if random_delimiters else None,
+         min_total_length, max_total_length, case),
+        build)
+    if not sampler.count:
+        raise SystemExit("Error: No passphrase fits between --min-total-length "
+                         "and --max-total-length with the current options.")
+    return sampler
+
+
+def _check_weighted(weights, acrostic, sampler, sources=None):
+    if weights is not None and (acrostic or sampler is not None):
+        raise ValueError("Weighted word choice can't be combined with "
+                         "acrostics or total length limits")
+    if source_policy(sources) not in (None, "merged") and \
+       (weights is not None or acrostic or sampler is not None):
+        raise ValueError("Choosing words by source can't be combined with "
+                         "weights, acrostics or total length limits")
+
+
 def generate_xkcdpassword(wordlist,
                           numwords=6,
                           interactive=False,
@@ -325,26 +2341,86 @@ def generate_xkcdpassword(wordlist,
                           delimiter=" ",
                           random_delimiters=False,
                           valid_delimiters=DEFAULT_DELIMITERS,
-                          case="lower"):
+                          case="lower",
+                          min_total_length=None,
+                          max_total_length=None,
+                          leet=False,
+                          pad_digits=0,
+                          pad_symbols=0,
+                          denylist=None,
+                          weights=None,
+                          sources=None):
     """
     Generate an XKCD-style password from the words in wordlist.
+
+    With min_total_length and/or max_total_length, the password is drawn
+    uniformly from those whose length (delimiters included) lies within
+    the limits; see `total_length_sampler()`.
+
+    leet substitutes digits for some letters, and pad_digits and
+    pad_symbols append that many random digits and symbols; see
+    `PassphrasePipeline`.
+
+    Passwords found in denylist (a `denylists.Denylist`, or any container
+    of passwords) are rejected and generated again.
+
+    With weights (see `word_weights()`), words are drawn with those
+    relative weights rather than uniformly, using an `AliasTable`. With
+    sources, words are drawn from the sources of a SourcedWordlist
+    following a policy or a pattern; see `source_policy()`.
     """
 
     passwd = None
 
-    # generate the worddict if we are looking for acrostics
-    if acrostic:
-        worddict = wordlist_to_worddict(wordlist)
-
-    def gen_passwd():
-        if not acrostic:
-            words = choose_words(wordlist, numwords)
+    pipeline = PassphrasePipeline(case, delimiter, random_delimiters,
+                                  valid_delimiters, leet, pad_digits,
+                                  pad_symbols)
+    sampler = None
+    if min_total_length is not None or max_total_length is not None:
+        sampler = total_length_sampler(
+            wordlist, numwords, acrostic, delimiter, random_delimiters,
+            valid_delimiters,
+            _unpadded(min_total_length, pipeline.padding),
+            _unpadded(max_total_length, pipeline.padding), case)
+    # look up the candidate words if we are looking for acrostics
+    elif acrostic:
+        index = prefix_index(wordlist)
+        ranges = acrostic_ranges(acrostic_prefixes(acrostic), index)
+    _check_weighted(weights, acrostic, sampler, sources)
+    numwords = source_numwords(sources, numwords)
+
+    def make_passwd():
+        stats = STATS
+        if stats is not None:
+            start = _clock()
+        if sampler is not None:
+            parts = sampler.sample_many(entropy_pool(), 1)[0]
+            words = parts[::2]
+        elif not acrostic:
+            words = choose_words(wordlist, numwords, weights, sources)
         else:
-            words = find_acrostic(acrostic, worddict)
+            pool = entropy_pool()
+            words = [index.words[first + pool.randbelow(last - first)]
+                     for first, last in ranges]
+        if stats is not None:
+            stats.add_time("choose", _clock() - start)
+            start = _clock()
+
+        passwd = pipeline.apply(
+            words, delimiters=parts[1::2] if sampler is not None else None,
+            cased=sampler is not None and case != "random-chars")
+        if stats is not None:
+            stats.add_time("transform", _clock() - start)
+        return passwd
 
-        if not random_delimiters:
-            return delimiter.join(set_case(words, method=case))
-        return randomized_delimiter_join(set_case(words, method=case), valid_delimiters)
+    def gen_passwd():
+        for attempt in xrange(DENYLIST_MAX_ATTEMPTS):
+            passwd = make_passwd()
+            if denylist is None or passwd not in denylist:
+                return passwd
+            if STATS is not None:
+                STATS.count("passphrases_denied")
+        _denylist_exhausted()
 
     # useful if driving the logic from other code
     if not interactive:
@@ -367,22 +2443,782 @@ def generate_xkcdpassword(wordlist,
         return passwd
 
 
+_FINGERPRINT_TYPECODE = _DRAW_TYPECODES[-1][1]
+_FINGERPRINT_MASK = (1 << _DRAW_TYPECODES[-1][0]) - 1
+
+
+class FingerprintSet(object):
+    """
+    Set of 64-bit fingerprints of strings, stored in an open addressing
+    table held in a single array instead of as string objects: 11 to 22
+    bytes per entry, against well over 100 for a set of passphrases.
+
+    Fingerprints are the strings' hash(), which is keyed per process.
+    Two different strings sharing a fingerprint are treated as equal; at
+    10**8 entries that happens with a probability below 1 in 3000 and only
+    causes a passphrase to be redrawn.
+    """
+
+    # the table doubles in size once it is this full
+    MAX_LOAD = 0.75
+
+    def __init__(self, capacity=1 << 16):
+        size = 16
+        while size * self.MAX_LOAD < capacity:
+            size *= 2
+        self._resize(size)
+        self._used = 0
+
+    def _resize(self, size):
+        old = getattr(self, "_table", ())
+        self._table = array(_FINGERPRINT_TYPECODE, [0]) * size
+        self._mask = size - 1
+        self._limit = int(size * self.MAX_LOAD)
+        for fingerprint in old:
+            if fingerprint:
+                self._insert(fingerprint)
+
+    def _insert(self, fingerprint):
+        table = self._table
+        mask = self._mask
+        i = fingerprint & mask
+        while True:
+            slot = table[i]
+            if not slot:
+                table[i] = fingerprint
+                return True
+            if slot == fingerprint:
+                return False
+            i = (i + 1) & mask
+
+    def __len__(self):
+        return self._used
+
+    def __contains__(self, item):
+        table = self._table
+        mask = self._mask
+        fingerprint = (hash(item) & _FINGERPRINT_MASK) or 1
+        i = fingerprint & mask
+        while table[i]:
+            if table[i] == fingerprint:
+                return True
+            i = (i + 1) & mask
+        return False
+
+    def add(self, item):
+        """
+        Add item, returning False if it was already present.
+        """
+        return bool(self.new_items([item]))
+
+    def new_items(self, items):
+        """
+        Add items, returning a list of those that were not yet present.
+        """
+        new = []
+        table = self._table
+        mask = self._mask
+        for item in items:
+            fingerprint = (hash(item) & _FINGERPRINT_MASK) or 1
+            i = fingerprint & mask
+            while True:
+                slot = table[i]
+                if not slot:
+                    table[i] = fingerprint
+                    new.append(item)
+                    self._used += 1
+                    if self._used > self._limit:
+                        self._resize(2 * len(table))
+                        table = self._table
+                        mask = self._mask
+                    break
+                if slot == fingerprint:
+                    break
+                i = (i + 1) & mask
+        return new
+
+    @property
+    def nbytes(self):
+        """ Memory used by the table, in bytes. """
+        return len(self._table) * self._table.itemsize
+
+
+# --unique warns when the count exceeds this fraction of the keyspace,
+# where redrawing duplicates starts to dominate the run time
+UNIQUE_WARN_FRACTION = 0.5
+
+# consecutive duplicates, as a multiple of the keyspace, before --unique
+# gives up: while any passphrase remains unseen, a run that long has odds
+# of about e ** -20, so the keyspace must hold fewer distinct passphrases
+# than counted (e.g. words that only differ in case)
+UNIQUE_STALL_FACTOR = 20
+
+
+def passphrase_keyspace(wordlist,
+                        numwords=6,
+                        acrostic=False,
+                        random_delimiters=False,
+                        valid_delimiters=DEFAULT_DELIMITERS,
+                        case="lower",
+                        min_total_length=None,
+                        max_total_length=None,
+                        delimiter=" ",
+                        leet=False,
+                        pad_digits=0,
+                        pad_symbols=0,
+                        weights=None,
+                        sources=None):
+    """
+    Return the number of equally likely outcomes of drawing a passphrase
+    with these options: the word count raised to numwords as in
+    `verbose_reports()`, times the choices of random delimiters, random
+    case and padding. Passphrases that happen to read the same (e.g.
+    words containing the delimiter) make this an upper bound.
+
+    With total length limits, the count of the constrained space comes
+    from `total_length_sampler()`. With weights, only words of positive
+    weight count, although the passphrases are not equally likely, and
+    the same goes for the proportional and balanced source policies. With
+    a pattern of sources, each word counts the words of its source.
+    """
+    pipeline = PassphrasePipeline(case, pad_digits=pad_digits,
+                                  pad_symbols=pad_symbols)
+    if min_total_length is not None or max_total_length is not None:
+        sampler = total_length_sampler(
+            wordlist, numwords, acrostic, delimiter, random_delimiters,
+            valid_delimiters,
+            _unpadded(min_total_length, pipeline.padding),
+            _unpadded(max_total_length, pipeline.padding), case)
+        numwords = (len(sampler.slots) + 1) // 2
+        factor = pipeline.keyspace_factor(numwords)
+        if case == "random":
+            # the sampler draws words in both cases
+            factor //= 2 ** numwords
+        return sampler.count * factor
+    pattern = source_sampler(wordlist, sources)
+    if acrostic:
+        ranges = acrostic_ranges(acrostic_prefixes(acrostic),
+                                 prefix_index(wordlist))
+        keyspace = 1
+        for first, last in ranges:
+            keyspace *= last - first
+        numwords = len(ranges)
+    elif weights is not None:
+        keyspace = sum(1 for w in word_weights(wordlist, weights)
+                       if w > 0) ** numwords
+    elif isinstance(pattern, SourcePattern):
+        keyspace = 1
+        for size in pattern.sizes:
+            keyspace *= size
+        numwords = len(pattern)
+    else:
+        keyspace = len(wordlist) ** numwords
+    if random_delimiters and numwords > 1:
+        keyspace *= len(valid_delimiters) ** (numwords - 1)
+    return keyspace * pipeline.keyspace_factor(numwords)
+
+
+def check_unique_count(count, keyspace):
+    """
+    Raise ValueError if count unique passphrases cannot be drawn from
+    keyspace, and warn if count comes close to it.
+    """
+    if count is not None and count > keyspace:
+        raise ValueError(
+            "Cannot generate {0} unique passphrases: there are at most {1} "
+            "with the current options".format(count, keyspace))
+    if count is not None and count > keyspace * UNIQUE_WARN_FRACTION:
+        sys.stderr.write(
+            "WARNING: {0} unique passphrases are {1:.0%} of the {2} "
+            "possible with the current options; generation will slow "
+            "down as duplicates are redrawn.\n".format(
+                count, float(count) / keyspace, keyspace))
+
+
+# the options of passphrase_keyspace() among those of the batch API
+_KEYSPACE_OPTIONS = ("numwords", "acrostic", "random_delimiters",
+                     "valid_delimiters", "case", "min_total_length",
+                     "max_total_length", "delimiter", "leet", "pad_digits",
+                     "pad_symbols", "weights", "sources")
+
+
+def _unique_batches(batches, count, keyspace):
+    """
+    Yield the passphrases of batches not seen before, count in total (or
+    until keyspace is exhausted if count is None).
+    """
+    seen = FingerprintSet(min(count or BATCH_SIZE, keyspace))
+    remaining = keyspace if count is None else count
+    stalled = 0
+    for batch in batches:
+        new = seen.new_items(batch)[:remaining]
+        stalled = stalled + len(batch) if not new else 0
+        if stalled >= UNIQUE_STALL_FACTOR * keyspace:
+            _unique_exhausted(len(seen))
+        remaining -= len(new)
+        if new:
+            yield new
+        if not remaining:
+            break
+
+
+def _unique_exhausted(found):
+    raise SystemExit(
+        "Error: Found only {0} distinct passphrases with the current "
+        "options, as some are alike (e.g. words that only differ in case). "
+        "Exiting.\n".format(found))
+
+
+def _denylist_exhausted():
+    raise SystemExit(
+        "Error: The last {0} passphrases generated were all on the "
+        "denylist. Exiting.\n".format(DENYLIST_MAX_ATTEMPTS))
+
+
+def _allowed_batches(batches, count, denylist):
+    """
+    Yield the passphrases of batches not found in denylist, count in total
+    (or without end if count is None).
+    """
+    remaining = count
+    denied = 0
+    for batch in batches:
+        allowed = [passwd for passwd in batch if passwd not in denylist]
+        if len(allowed) < len(batch):
+            if STATS is not None:
+                STATS.count("passphrases_denied", len(batch) - len(allowed))
+            denied = 0 if allowed else denied + len(batch)
+            if denied >= DENYLIST_MAX_ATTEMPTS:
+                _denylist_exhausted()
+        if remaining is not None:
+            allowed = allowed[:remaining]
+            remaining -= len(allowed)
+        if allowed:
+            yield allowed
+        if remaining == 0:
+            break
+
+
+def _passphrase_batches(wordlist,
+                        count,
+                        numwords=6,
+                        acrostic=False,
+                        delimiter=" ",
+                        random_delimiters=False,
+                        valid_delimiters=DEFAULT_DELIMITERS,
+                        case="lower",
+                        backend="python",
+                        unique=False,
+                        min_total_length=None,
+                        max_total_length=None,
+                        leet=False,
+                        pad_digits=0,
+                        pad_symbols=0,
+                        denylist=None,
+                        weights=None,
+                        sources=None):
+    """
+    Yield lists of up to BATCH_SIZE passphrases, count in total (or
+    without end if count is None), drawing the word and delimiter indices
+    for a whole batch at once.
+
+    With backend="numpy", non-acrostic batches are generated with
+    vectorized NumPy operations when NumPy is installed. With unique=True,
+    passphrases already generated are dropped and redrawn, and so are
+    passphrases found in denylist. With weights, words are drawn from an
+    `AliasTable`, and with sources, from the `source_sampler()`.
+    """
+    if backend not in BACKENDS:
+        raise ValueError("Unknown backend: {0}".format(backend))
+
+    if unique:
+        keyspace = passphrase_keyspace(wordlist, numwords, acrostic,
+                                       random_delimiters, valid_delimiters,
+                                       case, min_total_length,
+                                       max_total_length, delimiter, leet,
+                                       pad_digits, pad_symbols, weights,
+                                       sources)
+        check_unique_count(count, keyspace)
+        batches = _passphrase_batches(wordlist, None, numwords, acrostic,
+                                      delimiter, random_delimiters,
+                                      valid_delimiters, case, backend,
+                                      min_total_length=min_total_length,
+                                      max_total_length=max_total_length,
+                                      leet=leet,
+                                      pad_digits=pad_digits,
+                                      pad_symbols=pad_symbols,
+                                      denylist=denylist,
+                                      weights=weights,
+                                      sources=sources)
+        for batch in _unique_batches(batches, count, keyspace):
+            yield batch
+        return
+
+    if denylist is not None:
+        batches = _passphrase_batches(wordlist, None, numwords, acrostic,
+                                      delimiter, random_delimiters,
+                                      valid_delimiters, case, backend,
+                                      min_total_length=min_total_length,
+                                      max_total_length=max_total_length,
+                                      leet=leet,
+                                      pad_digits=pad_digits,
+                                      pad_symbols=pad_symbols,
+                                      weights=weights,
+                                      sources=sources)
+        for batch in _allowed_batches(batches, count, denylist):
+            yield batch
+        return
+
+    pipeline = PassphrasePipeline(case, delimiter, random_delimiters,
+                                  valid_delimiters, leet, pad_digits,
+                                  pad_symbols)
+    sampler = None
+    if min_total_length is not None or max_total_length is not None:
+        sampler = total_length_sampler(
+            wordlist, numwords, acrostic, delimiter, random_delimiters,
+            valid_delimiters,
+            _unpadded(min_total_length, pipeline.padding),
+            _unpadded(max_total_length, pipeline.padding), case)
+
+    _check_weighted(weights, acrostic, sampler, sources)
+    alias = None
+    if weights is not None:
+        alias = alias_table(wordlist, weights)
+    elif sources is not None:
+        alias = source_sampler(wordlist, sources)
+        numwords = source_numwords(sources, numwords)
+
+    pool = entropy_pool()
+    if backend == "numpy" and not acrostic and sampler is None and \
+       alias is None and pipeline.numpy_compatible and \
+       numpy_backend.available():
+        for batch in numpy_backend.passphrase_batches(
+                wordlist, count, pool,
+                numwords=numwords,
+                delimiter=delimiter,
+                random_delimiters=random_delimiters,
+                valid_delimiters=valid_delimiters,
+                case=case):
+            yield batch
+        return
+
+    if acrostic and sampler is None:
+        index = prefix_index(wordlist)
+        ranges = acrostic_ranges(acrostic_prefixes(acrostic), index)
+        numwords = len(ranges)
+
+    stats = STATS
+    delimiters = None
+    cased = False
+    while count is None or count > 0:
+        batch = BATCH_SIZE if count is None else min(count, BATCH_SIZE)
+        if count is not None:
+            count -= batch
+
+        if stats is not None:
+            start = _clock()
+        if sampler is not None:
+            sequences = sampler.sample_many(pool, batch)
+            rows = [parts[::2] for parts in sequences]
+            delimiters = [parts[1::2] for parts in sequences]
+            cased = case != "random-chars"
+        elif acrostic:
+            words = index.words
+            rows = [[words[first + pool.randbelow(last - first)]
+                     for first, last in ranges]
+                    for i in xrange(batch)]
+        else:
+            rows, cased = pipeline.choose_rows(wordlist, numwords, batch, pool,
+                                               alias)
+        if stats is not None:
+            stats.add_time("choose", _clock() - start)
+            start = _clock()
+
+        passwds = pipeline.apply_batch(rows, pool, delimiters, cased)
+        if stats is not None:
+            stats.add_time("transform", _clock() - start)
+        yield passwds
+
+
+def iter_xkcdpasswords(wordlist,
+                       count=None,
+                       numwords=6,
+                       acrostic=False,
+                       delimiter=" ",
+                       random_delimiters=False,
+                       valid_delimiters=DEFAULT_DELIMITERS,
+                       case="lower",
+                       backend="python",
+                       unique=False,
+                       min_total_length=None,
+                       max_total_length=None,
+                       leet=False,
+                       pad_digits=0,
+                       pad_symbols=0,
+                       denylist=None,
+                       weights=None,
+                       sources=None):
+    """
+    Lazily generate count XKCD-style passwords, or an endless stream of
+    them if count is None. Takes the options of `generate_xkcdpasswords()`.
+    """
+    for batch in _passphrase_batches(wordlist, count,
+                                     numwords=numwords,
+                                     acrostic=acrostic,
+                                     delimiter=delimiter,
+                                     random_delimiters=random_delimiters,
+                                     valid_delimiters=valid_delimiters,
+                                     case=case,
+                                     backend=backend,
+                                     unique=unique,
+                                     min_total_length=min_total_length,
+                                     max_total_length=max_total_length,
+                                     leet=leet,
+                                     pad_digits=pad_digits,
+                                     pad_symbols=pad_symbols,
+                                     denylist=denylist,
+                                     weights=weights,
+                                     sources=sources):
+        for passwd in batch:
+            yield passwd
+
+
+def generate_xkcdpasswords(wordlist,
+                           count,
+                           numwords=6,
+                           acrostic=False,
+                           delimiter=" ",
+                           random_delimiters=False,
+                           valid_delimiters=DEFAULT_DELIMITERS,
+                           case="lower",
+                           backend="python",
+                           unique=False,
+                           min_total_length=None,
+                           max_total_length=None,
+                           leet=False,
+                           pad_digits=0,
+                           pad_symbols=0,
+                           denylist=None,
+                           weights=None,
+                           sources=None):
+    """
+    Generate a list of count XKCD-style passwords from the words in
+    wordlist. Takes the same options as `generate_xkcdpassword()`, but
+    draws the randomness for many passwords at once.
+
+    backend is one of BACKENDS; "numpy" falls back to pure Python when
+    NumPy is not installed.
+
+    Passwords found in denylist are rejected and generated again, and
+    weights and sources bias the choice of words as in
+    `generate_xkcdpassword()`.
+
+    With unique=True, no password is repeated; duplicates are tracked in
+    a FingerprintSet. A ValueError is raised if count exceeds the number
+    of possible passwords (see `passphrase_keyspace()`), and a warning is
+    printed when it comes close.
+    """
+    passwds = []
+    for batch in _passphrase_batches(wordlist, count,
+                                     numwords=numwords,
+                                     acrostic=acrostic,
+                                     delimiter=delimiter,
+                                     random_delimiters=random_delimiters,
+                                     valid_delimiters=valid_delimiters,
+                                     case=case,
+                                     backend=backend,
+                                     unique=unique,
+                                     min_total_length=min_total_length,
+                                     max_total_length=max_total_length,
+                                     leet=leet,
+                                     pad_digits=pad_digits,
+                                     pad_symbols=pad_symbols,
+                                     denylist=denylist,
+                                     weights=weights,
+                                     sources=sources):
+        passwds.extend(batch)
+    return passwds
+
+
+_worker_state = {}
+
+
+def _init_parallel_worker(wordlist, options):
+    # the wordlist is handed over once per worker, not once per task
+    _reset_entropy_pools()
+    _worker_state["wordlist"] = wordlist
+    _worker_state["options"] = options
+
+
+def _parallel_worker_chunk(count):
+    passwds = []
+    for batch in _passphrase_batches(_worker_state["wordlist"], count,
+                                     **_worker_state["options"]):
+        passwds.extend(batch)
+    return passwds
+
+
+def generate_xkcdpasswords_parallel(wordlist,
+                                    count,
+                                    jobs=None,
+                                    chunk_size=PARALLEL_CHUNK_SIZE,
+                                    ordered=True,
+                                    unique=False,
+                                    **options):
+    """
+    Yield lists of passwords, count in total, generated by a pool of jobs
+    worker processes (default: one per CPU). Each worker draws its own
+    randomness from the OS CSPRNG.
+
+    Takes the options of `generate_xkcdpasswords()`. Chunks of chunk_size
+    passwords are yielded as they complete, in submission order unless
+    ordered is False. With unique=True, duplicates are dropped as chunks
+    arrive and more chunks are requested to make up for them.
+    """
+    seen = None
+    stalled = 0
+    if unique:
+        keyspace = passphrase_keyspace(
+            wordlist, **dict((name, value) for name, value in options.items()
+                             if name in _KEYSPACE_OPTIONS))
+        check_unique_count(count, keyspace)
+        seen = FingerprintSet(count)
+
+    pool = multiprocessing.Pool(jobs or None, _init_parallel_worker,
+                                (wordlist, options))
+    try:
+        imap = pool.imap if ordered else pool.imap_unordered
+        remaining = count
+        while remaining > 0:
+            chunks = [chunk_size] * (remaining // chunk_size)
+            if remaining % chunk_size:
+                chunks.append(remaining % chunk_size)
+            for chunk in imap(_parallel_worker_chunk, chunks):
+                if seen is not None:
+                    size, chunk = len(chunk), seen.new_items(chunk)
+                    stalled = stalled + size if not chunk else 0
+                    if stalled >= UNIQUE_STALL_FACTOR * keyspace:
+                        _unique_exhausted(len(seen))
+                remaining -= len(chunk)
+                if chunk:
+                    yield chunk
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+class KeyspaceLayout(object):
+    """
+    The passphrases drawn with a set of options numbered as mixed-radix
+    integers: one digit for each word, then for each random delimiter and
+    each padding character. `decode()` turns numbers into passphrases, so
+    that each number below `size` gives a different choice of words,
+    delimiters, case and padding.
+
+    The words of each position are put in their case up front and
+    deduplicated (see `_distinct_cased()`), so that words only differing
+    in case count once; with random case, a digit picks both a word and
+    its case.
+    """
+
+    def __init__(self,
+                 wordlist,
+                 numwords=6,
+                 acrostic=False,
+                 delimiter=" ",
+                 random_delimiters=False,
+                 valid_delimiters=DEFAULT_DELIMITERS,
+                 case="lower",
+                 leet=False,
+                 pad_digits=0,
+                 pad_symbols=0,
+                 sources=None):
+        if case == "random-chars":
+            raise ValueError("The keyspace can't be numbered with case "
+                             "random-chars")
+        pattern = source_sampler(wordlist, sources)
+        if pattern is not None and not isinstance(pattern, SourcePattern):
+            raise ValueError("The keyspace can only be numbered with the "
+                             "merged source policy or a pattern")
+
+        # the candidate words of each position
+        if acrostic:
+            index = prefix_index(wordlist)
+            self.columns = [
+                index.words[first:last] for first, last in
+                acrostic_ranges(acrostic_prefixes(acrostic), index)]
+        elif pattern is not None:
+            self.columns = [[wordlist[i] for i in members]
+                            for members in pattern.members]
+        else:
+            self.columns = [wordlist] * numwords
+        numwords = len(self.columns)
+
+        self.columns = _cased_columns(wordlist, self.columns, case)
+
+        self.valid_delimiters = list(valid_delimiters)
+        self.radices = [len(column) for column in self.columns]
+        if random_delimiters and numwords > 1:
+            self.radices += [len(valid_delimiters)] * (numwords - 1)
+        self.radices += ([len(PADDING_DIGITS)] * pad_digits +
+                         [len(PADDING_SYMBOLS)] * pad_symbols)
+        self.random_delimiters = random_delimiters and numwords > 1
+        # the characters each padding digit picks from
+        self.padding = ([PADDING_DIGITS] * pad_digits +
+                        [PADDING_SYMBOLS] * pad_symbols)
+
+        self.size = 1
+        for radix in self.radices:
+            self.size *= radix
+        self.pipeline = PassphrasePipeline(case, delimiter,
+                                           valid_delimiters=valid_delimiters,
+                                           leet=leet)
+
+    def decode(self, numbers):
+        """
+        Return the passphrases numbered by numbers.
+        """
+        numwords = len(self.columns)
+        rows = []
+        delimiters = [] if self.random_delimiters else None
+        paddings = []
+        for number in numbers:
+            digits = []
+            for radix in self.radices:
+                number, digit = divmod(number, radix)
+                digits.append(digit)
+            row = [column[d] for column, d in zip(self.columns, digits)]
+            position = numwords
+            if self.random_delimiters:
+                delimiters.append([self.valid_delimiters[d] for d in
+                                   digits[position:position + numwords - 1]])
+                position += numwords - 1
+            rows.append(row)
+            if self.padding:
+                paddings.append("".join(
+                    chars[d] for chars, d in zip(self.padding,
+                                                 digits[position:])))
+
+        passwds = self.pipeline.apply_batch(rows, delimiters=delimiters,
+                                            cased=True)
+        if self.padding:
+            passwds = [passwd + padding
+                       for passwd, padding in zip(passwds, paddings)]
+        return passwds
+
+
+def _permuted_batches(wordlist, key, count=None, shard=(1, 1), start=0,
+                      **options):
+    """
+    Yield lists of up to BATCH_SIZE passphrases, count in total (or the
+    rest of the shard if count is None), walking a KeyspaceLayout in the
+    order of a KeyspacePermutation keyed by key.
+    """
+    denylist = options.pop("denylist", None)
+    layout = KeyspaceLayout(wordlist, **options)
+    order = permutation.KeyspacePermutation(layout.size, key)
+    number, shards = shard
+    available = permutation.shard_size(layout.size, shard) - start
+    if start < 0:
+        raise ValueError("The start of a shard can't be negative")
+    if count is not None and count > max(available, 0):
+        raise ValueError(
+            "Cannot generate {0} passphrases from shard {1}/{2} starting at "
+            "{3}: it holds {4} with the current options".format(
+                count, number, shards, start, available + start))
+    end = start + available
+    if count is not None and denylist is None:
+        end = start + count
+
+    def batches():
+        stats = STATS
+        position = start
+        while position < end:
+            batch = min(BATCH_SIZE, end - position)
+            if stats is not None:
+                started = _clock()
+            numbers = [order[number - 1 + shards * i]
+                       for i in xrange(position, position + batch)]
+            position += batch
+            if stats is not None:
+                stats.add_time("choose", _clock() - started)
+                started = _clock()
+            passwds = layout.decode(numbers)
+            if stats is not None:
+                stats.add_time("transform", _clock() - started)
+            yield passwds
+
+    if denylist is not None:
+        # denied passphrases are made up for from the rest of the shard
+        return _allowed_batches(batches(), count, denylist)
+    return batches()
+
+
+def iter_permuted_xkcdpasswords(wordlist,
+                                key,
+                                count=None,
+                                shard=(1, 1),
+                                start=0,
+                                numwords=6,
+                                acrostic=False,
+                                delimiter=" ",
+                                random_delimiters=False,
+                                valid_delimiters=DEFAULT_DELIMITERS,
+                                case="lower",
+                                leet=False,
+                                pad_digits=0,
+                                pad_symbols=0,
+                                sources=None,
+                                denylist=None):
+    """
+    Lazily generate count XKCD-style passwords that never repeat, or all
+    of those of the shard if count is None, without keeping track of the
+    passwords generated.
+
+    The passwords possible with the options are numbered (see
+    `KeyspaceLayout`), and numbers are taken in the pseudorandom order of
+    a `permutation.KeyspacePermutation` keyed by key (bytes, as secret as
+    the passwords). shard is a (K, N) tuple: only the positions congruent
+    to K - 1 modulo N are used, starting with the start-th of them, so
+    that processes sharing the key, wordlist and options but taking
+    different shards never generate the same password.
+
+    Passwords found in denylist are skipped. Words that only differ in
+    case within the wordlist make case-changing options repeat passwords.
+    """
+    for batch in _permuted_batches(wordlist, key, count, shard, start,
+                                   numwords=numwords,
+                                   acrostic=acrostic,
+                                   delimiter=delimiter,
+                                   random_delimiters=random_delimiters,
+                                   valid_delimiters=valid_delimiters,
+                                   case=case,
+                                   leet=leet,
+                                   pad_digits=pad_digits,
+                                   pad_symbols=pad_symbols,
+                                   sources=sources,
+                                   denylist=denylist):
+        for passwd in batch:
+            yield passwd
+
+
 def randomized_delimiter_join(words, delimiters=DEFAULT_DELIMITERS):
     """
     Join the words into a password with random delimiters between each word
     """
-
-    final_passwd = words[0]
-    for word in words[1:]:
-        final_passwd += choose_delimiter(delimiters) + word
-    return final_passwd
+    parts = [words[0]]
+    picks = entropy_pool().randbelow_many(len(delimiters), len(words) - 1)
+    for word, i in zip(words[1:], picks):
+        parts.append(delimiters[i])
+        parts.append(word)
+    return "".join(parts)
 
 
 def choose_delimiter(delimiters):
     """
     Choose a random delimiter from the list
     """
-    return rng().choice(delimiters)
+    return entropy_pool().choice(delimiters)
 
 
 def initialize_interactive_run(options):
@@ -406,7 +3242,48 @@ def initialize_interactive_run(options):
         n_words_prompt = ("Enter number of words (default {0}):\n".format(options.numwords))
         options.numwords = try_input(n_words_prompt, n_words_validator)
     else:
-        options.numwords = len(options.acrostic)
+        options.numwords = len(acrostic_prefixes(options.acrostic))
+
+
+def write_passwords(batches, stream, separator="\n", max_bytes=None):
+    """
+    Write batches (lists) of passwords to stream, each followed by
+    separator, with one write and flush per batch. If max_bytes is given,
+    stop before the UTF-8 encoded output would exceed it.
+    Returns the number of passwords written.
+    """
+    written = 0
+    remaining = max_bytes
+    for batch in batches:
+        if STATS is not None:
+            start = _clock()
+        text = separator.join(batch) + separator if batch else ""
+        if remaining is not None:
+            size = len(text.encode("utf-8"))
+            if size > remaining:
+                # write the passwords of this batch that still fit
+                fitting = []
+                for passwd in batch:
+                    size = len((passwd + separator).encode("utf-8"))
+                    if size > remaining:
+                        break
+                    fitting.append(passwd)
+                    remaining -= size
+                if fitting:
+                    stream.write(separator.join(fitting) + separator)
+                    stream.flush()
+                if STATS is not None:
+                    STATS.add_time("output", _clock() - start)
+                    STATS.count("passphrases_emitted", len(fitting))
+                return written + len(fitting)
+            remaining -= size
+        stream.write(text)
+        stream.flush()
+        written += len(batch)
+        if STATS is not None:
+            STATS.add_time("output", _clock() - start)
+            STATS.count("passphrases_emitted", len(batch))
+    return written
 
 
 def emit_passwords(wordlist, options):
@@ -416,20 +3293,124 @@ def emit_passwords(wordlist, options):
         valid_delimiters = list(options.valid_delimiters)
     else:
         valid_delimiters = DEFAULT_DELIMITERS
-    while count > 0:
-        print(
-            generate_xkcdpassword(
-                wordlist,
-                interactive=options.interactive,
-                numwords=options.numwords,
-                acrostic=options.acrostic,
-                delimiter=options.delimiter,
-                random_delimiters=options.random_delimiters,
-                valid_delimiters=valid_delimiters,
-                case=options.case,
-            ),
-            end=options.separator)
-        count -= 1
+
+    denylist = None
+    if getattr(options, "denylist", None):
+        try:
+            denylist = denylists.load_denylist(options.denylist)
+        except (IOError, OSError) as e:
+            raise SystemExit("Error: Can't index the denylist {0}: {1}\n"
+                             .format(options.denylist, e))
+    weights = None
+    if getattr(options, "weights", None):
+        weights = load_weights(options.weights)
+
+    if options.interactive:
+        while count > 0:
+            print(
+                generate_xkcdpassword(
+                    wordlist,
+                    interactive=options.interactive,
+                    numwords=options.numwords,
+                    acrostic=options.acrostic,
+                    delimiter=options.delimiter,
+                    random_delimiters=options.random_delimiters,
+                    valid_delimiters=valid_delimiters,
+                    case=options.case,
+                    min_total_length=getattr(options, "min_total_length",
+                                             None),
+                    max_total_length=getattr(options, "max_total_length",
+                                             None),
+                    leet=getattr(options, "leet", False),
+                    pad_digits=getattr(options, "pad_digits", 0),
+                    pad_symbols=getattr(options, "pad_symbols", 0),
+                    denylist=denylist,
+                    weights=weights,
+                    sources=getattr(options, "sources", None),
+                ),
+                end=options.separator)
+            count -= 1
+        return
+
+    generate_options = dict(
+        numwords=options.numwords,
+        acrostic=options.acrostic,
+        delimiter=options.delimiter,
+        random_delimiters=options.random_delimiters,
+        valid_delimiters=valid_delimiters,
+        case=options.case,
+        backend=getattr(options, "backend", "python"),
+        min_total_length=getattr(options, "min_total_length", None),
+        max_total_length=getattr(options, "max_total_length", None),
+        leet=getattr(options, "leet", False),
+        pad_digits=getattr(options, "pad_digits", 0),
+        pad_symbols=getattr(options, "pad_symbols", 0),
+        denylist=denylist,
+        weights=weights,
+        sources=getattr(options, "sources", None))
+
+    batches = None
+    key = getattr(options, "permutation_key", None)
+    if key:
+        if key == "new":
+            key = random_bytes(PERMUTATION_KEY_BYTES)
+            sys.stderr.write("Permutation key: {0}\n".format(
+                hexlify(key).decode("ascii")))
+        else:
+            key = unhexlify(key)
+        shard = permutation.parse_shard(getattr(options, "shard", "1/1"))
+        for name in ("backend", "min_total_length", "max_total_length",
+                     "weights"):
+            del generate_options[name]
+        try:
+            batches = _permuted_batches(
+                wordlist, key, count, shard,
+                getattr(options, "shard_start", 0), **generate_options)
+        except ValueError as exc:
+            raise SystemExit("Error: {0}.\n".format(exc))
+
+    unique = getattr(options, "unique", False)
+    if unique:
+        keyspace = passphrase_keyspace(
+            wordlist, **dict((name, value)
+                             for name, value in generate_options.items()
+                             if name in _KEYSPACE_OPTIONS))
+        if count > keyspace:
+            raise SystemExit(
+                "Error: Can't generate {0} unique passphrases, there are "
+                "at most {1} with the current options.\n".format(
+                    count, keyspace))
+
+    jobs = getattr(options, "jobs", 1)
+    if batches is None and jobs != 1 and count > 1:
+        batches = generate_xkcdpasswords_parallel(
+            wordlist, count, jobs=jobs,
+            ordered=not getattr(options, "unordered", False),
+            unique=unique,
+            **generate_options)
+    elif batches is None:
+        batches = _passphrase_batches(wordlist, count, unique=unique,
+                                      **generate_options)
+
+    output = getattr(options, "output", None)
+    max_bytes = getattr(options, "max_bytes", None)
+    try:
+        if output:
+            with open(output, "w", encoding="utf-8", newline="") as stream:
+                write_passwords(batches, stream, options.separator, max_bytes)
+        else:
+            write_passwords(batches, sys.stdout, options.separator, max_bytes)
+    except IOError as exc:
+        if exc.errno != errno.EPIPE or output:
+            raise
+        # the reader went away (e.g. piped into `head`): silence the
+        # final flush at exit instead of printing a traceback
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+    finally:
+        # stop any worker processes when the byte limit ends output early
+        if hasattr(batches, "close"):
+            batches.close()
 
 
 class XkcdPassArgumentParser(argparse.ArgumentParser):
@@ -453,7 +3434,9 @@ class XkcdPassArgumentParser(argparse.ArgumentParser):
                 " Provided wordfiles: eff-long (default), eff-short,"
                 " eff-special, legacy, spa-mich (Spanish), fin-kotus (Finnish),"
                 " fr-freelang (French), fr-corrected.txt (French), pt-ipublicis (Portuguese),"
-                " ita-wiki (Italian), ger-anlx (German), eff_large_de_sample.wordlist (German), nor-nb (Norwegian)"))
+                " ita-wiki (Italian), ger-anlx (German), eff_large_de_sample.wordlist (German), nor-nb (Norwegian)."
+                " Wordfiles may be compressed (.gz, .bz2, .xz, .zst); use - to"
+                " read the words from standard input."))
         self.add_argument(
             "--min",
             dest="min_length", type=int, default=5, metavar="MIN_LENGTH",
@@ -462,6 +3445,22 @@ class XkcdPassArgumentParser(argparse.ArgumentParser):
             "--max",
             dest="max_length", type=int, default=9, metavar="MAX_LENGTH",
             help="Generate passphrases containing words with at most MAX_LENGTH characters.")
+        self.add_argument(
+            "--min-total-length",
+            dest="min_total_length", type=int, default=None,
+            metavar="MIN_TOTAL_LENGTH",
+            help=(
+                "Generate passphrases with at least MIN_TOTAL_LENGTH "
+                "characters, delimiters included, drawn uniformly from all "
+                "that fit."))
+        self.add_argument(
+            "--max-total-length",
+            dest="max_total_length", type=int, default=None,
+            metavar="MAX_TOTAL_LENGTH",
+            help=(
+                "Generate passphrases with at most MAX_TOTAL_LENGTH "
+                "characters, delimiters included, drawn uniformly from all "
+                "that fit."))
         exclusive_group.add_argument(
             "-n", "--numwords",
             dest="numwords", type=int, default=6, metavar="NUM_WORDS",
@@ -469,7 +3468,10 @@ class XkcdPassArgumentParser(argparse.ArgumentParser):
         exclusive_group.add_argument(
             "-a", "--acrostic",
             dest="acrostic", default=False,
-            help="Generate passphrases with an acrostic matching ACROSTIC.")
+            help=(
+                "Generate passphrases with an acrostic matching ACROSTIC."
+                " Separate multi-letter prefixes with commas"
+                " (e.g. 'th,e,qu')."))
         self.add_argument(
             "-i", "--interactive",
             action="store_true", dest="interactive", default=False,
@@ -482,6 +3484,29 @@ class XkcdPassArgumentParser(argparse.ArgumentParser):
             help=(
                 "Limit passphrases to only include words matching the regex"
                 " pattern VALID_CHARS (e.g. '[a-z]')."))
+        self.add_argument(
+            "--weights",
+            dest="weights", default=None, metavar="FILE",
+            help=(
+                "Choose words with the relative weights listed in FILE, one"
+                " word and its weight per line (e.g. word frequencies), instead"
+                " of uniformly. Unlisted words get the smallest listed weight."))
+        self.add_argument(
+            "--sources",
+            dest="sources", default=None, metavar="POLICY",
+            help=(
+                "Keep comma-separated wordfiles apart and choose words by "
+                "source: 'merged' (every distinct word equally likely), "
+                "'proportional' (a source in proportion to its size, then "
+                "a word from it), 'balanced' (every source equally likely) "
+                "or a comma-separated pattern of one wordfile name or "
+                "number per word, e.g. 'ita-wiki,fin-kotus,ita-wiki'."))
+        self.add_argument(
+            "--exclude-substrings",
+            dest="exclude_substrings", default=None, metavar="FILE",
+            help=(
+                "Leave out words containing any of the substrings listed in"
+                " FILE, one per line, ignoring case."))
         self.add_argument(
             "-V", "--verbose",
             action="store_true", dest="verbose", default=False,
@@ -517,6 +3542,113 @@ class XkcdPassArgumentParser(argparse.ArgumentParser):
                 "Choices: {cap_meths} (default: 'lower').".format(
                     cap_meths=list(CASE_METHODS.keys())
                 )))
+        self.add_argument(
+            "--leet",
+            action="store_true", dest="leet", default=False,
+            help=(
+                "Substitute digits for some letters in each word "
+                "(a=4, e=3, i=1, o=0, s=5, t=7)."))
+        self.add_argument(
+            "--pad-digits",
+            dest="pad_digits", type=int, default=0, metavar="N",
+            help="Append N random digits to each passphrase.")
+        self.add_argument(
+            "--pad-symbols",
+            dest="pad_symbols", type=int, default=0, metavar="N",
+            help="Append N random symbols ({0}) to each passphrase.".format(
+                PADDING_SYMBOLS))
+        self.add_argument(
+            "-o", "--output",
+            dest="output", default=None, metavar="FILE",
+            help=(
+                "Write the passphrases to FILE instead of standard output. "
+                "Can't be combined with --interactive."))
+        self.add_argument(
+            "--max-bytes",
+            dest="max_bytes", type=int, default=None, metavar="BYTES",
+            help=(
+                "Stop before the output (including separators) exceeds "
+                "BYTES bytes."))
+        self.add_argument(
+            "-j", "--jobs",
+            dest="jobs", type=int, default=1, metavar="JOBS",
+            help=(
+                "Generate passphrases in JOBS worker processes "
+                "(0: one per CPU). Useful with a large --count."))
+        self.add_argument(
+            "--unique",
+            action="store_true", dest="unique", default=False,
+            help=(
+                "Never output the same passphrase twice. Fails if --count "
+                "exceeds the number of possible passphrases."))
+        self.add_argument(
+            "--denylist",
+            dest="denylist", default=None, metavar="FILE",
+            help=(
+                "Never output a passphrase listed in FILE, one per line "
+                "(compared ignoring case), or in an index built from such "
+                "a file by xkcdpass-denylist. A plain corpus is indexed "
+                "on first use into FILE" + denylists.DENYLIST_SUFFIX + ", a "
+                "file written next to it, or in memory for each run if its "
+                "directory is read-only."))
+        self.add_argument(
+            "--permutation-key",
+            dest="permutation_key", default=None, metavar="KEY",
+            help=(
+                "Walk the space of all passphrases possible with the other "
+                "options in a pseudorandom order keyed by KEY (hex, as "
+                "secret as the passphrases), so that none repeats without "
+                "keeping track of them. 'new' draws a key from the CSPRNG "
+                "and prints it to stderr."))
+        self.add_argument(
+            "--shard",
+            dest="shard", default="1/1", metavar="K/N",
+            help=(
+                "With --permutation-key, take passphrases only from the "
+                "K-th of N disjoint shards of the space: nodes sharing the "
+                "key, wordfiles and options but taking different shards "
+                "never generate the same passphrase."))
+        self.add_argument(
+            "--shard-start",
+            dest="shard_start", type=int, default=0, metavar="I",
+            help=(
+                "With --permutation-key, skip the first I passphrases of "
+                "the shard, e.g. those output by an earlier run."))
+        self.add_argument(
+            "--load-jobs",
+            dest="load_jobs", type=int, default=1, metavar="JOBS",
+            help=(
+                "Read and filter comma-separated wordfiles concurrently "
+                "in JOBS workers (0: one per wordfile)."))
+        self.add_argument(
+            "--load-executor",
+            dest="load_executor", type=str, metavar="EXECUTOR",
+            choices=list(LOAD_EXECUTORS), default="process",
+            help=(
+                "Run --load-jobs workers as processes or threads. "
+                "Choices: {executors} (default: 'process').".format(
+                    executors=list(LOAD_EXECUTORS))))
+        self.add_argument(
+            "--unordered",
+            action="store_true", dest="unordered", default=False,
+            help=(
+                "With --jobs, output chunks of passphrases as soon as "
+                "they are ready instead of in submission order."))
+        self.add_argument(
+            "--backend",
+            dest="backend", type=str, metavar="BACKEND",
+            choices=list(BACKENDS), default="python",
+            help=(
+                "Choose the implementation used to generate multiple "
+                "passphrases. Choices: {backends} (default: 'python'). "
+                "'numpy' requires NumPy and falls back to 'python' "
+                "without it.".format(backends=list(BACKENDS))))
+        self.add_argument(
+            "--stats",
+            action="store_true", dest="stats", default=False,
+            help=(
+                "Print a breakdown of the time spent in each stage and of "
+                "words, random bytes and passphrases processed to stderr."))
         self.add_argument(
             "--allow-weak-rng",
             action="store_true", dest="allow_weak_rng", default=False,
@@ -532,20 +3664,35 @@ def main(argv=None):
     if argv is None:
         argv = sys.argv
 
+    if len(argv) > 1 and argv[1] == "serve":
+        from xkcdpass import server
+        return server.main(argv)
+
     exit_status = 0
+    collecting = False
 
     try:
         program_name = os.path.basename(argv[0])
         parser = XkcdPassArgumentParser(prog=program_name)
 
         options = parser.parse_args(argv[1:])
+        if options.stats:
+            enable_stats()
+            collecting = True
+            started = _clock()
         validate_options(parser, options)
 
-        my_wordlist = generate_wordlist(
+        load_wordlist = generate_wordlist
+        if options.sources:
+            load_wordlist = sourced_wordlist
+        my_wordlist = load_wordlist(
             wordfile=options.wordfile,
             min_length=options.min_length,
             max_length=options.max_length,
-            valid_chars=options.valid_chars)
+            valid_chars=options.valid_chars,
+            workers=options.load_jobs,
+            executor=options.load_executor,
+            exclude_substrings=options.exclude_substrings)
 
         if options.interactive:
             initialize_interactive_run(options)
@@ -555,8 +3702,17 @@ def main(argv=None):
 
         emit_passwords(my_wordlist, options)
 
+        if options.stats:
+            stats = disable_stats()
+            stats.add_time("total", _clock() - started)
+            sys.stderr.write(stats.format_report())
+
     except SystemExit as exc:
         exit_status = exc.code
+    finally:
+        # don't leave the collector running after a run that stopped early
+        if collecting:
+            disable_stats()
 
     return exit_status
 